@@ -1,12 +1,21 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
 from app.services.firebase import init_firebase
+from app.services.registry import ServiceRegistry
+from app.services.upload_spool import MAX_REQUEST_SIZE, SpoolingRequest
 import structlog
 
 logger = structlog.get_logger(__name__)
 
 def create_app():
     app = Flask(__name__)
+
+    # Uploaded files are written to the spool directory as they are parsed,
+    # with the per-file and per-request limits enforced while reading
+    from app.services.image_service import ImageService
+    app.request_class = SpoolingRequest
+    app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_SIZE
+    app.config['MAX_UPLOAD_FILE_SIZE'] = ImageService.MAX_FILE_SIZE
     
     # Initialize CORS
     CORS(app, resources={
@@ -29,6 +38,11 @@ def create_app():
     except Exception as e:
         logger.error("firebase_initialization_failed", error=str(e))
         raise
+
+    # Shared clients and services, built lazily in each worker process
+    services = ServiceRegistry().init_app(app)
+    # Except the prompt templates: a missing or invalid one stops startup
+    services.prompts
     
     # Register blueprints
     from app.routes.webhook import webhook
@@ -0,0 +1,46 @@
+# app/models/ai_response.py
+
+from typing import List
+from pydantic import BaseModel, Field, TypeAdapter
+
+class ImageCaption(BaseModel):
+    """Copy generated for one version of a property image"""
+    version: str = Field(description="Requested version name")
+    image_title: str = Field(description="Brief, compelling title (max 80 chars)")
+    image_description: str = Field(description="Detailed, SEO-optimized description (max 300 chars)")
+
+class PropertyCopy(BaseModel):
+    """Copy generated for one version of a property listing"""
+    version: str = Field(description="Requested version name")
+    title: str = Field(description="Compelling, location-specific title (max 80 chars)")
+    description: str = Field(description="Flowing description of the property (max 2000 chars)")
+    excerpt: str = Field(description="Concise, keyword-rich summary (max 300 chars)")
+
+class ResponseSchema:
+    """
+    One generation flow's response: a JSON array of item objects.
+
+    The same model is sent to Gemini as the structured-output schema and
+    used to validate what comes back, so the two cannot drift apart. The
+    type adapters are built once; validation runs in pydantic-core and
+    parses the JSON text directly.
+    """
+
+    def __init__(self, name: str, item: type):
+        self.name = name
+        self.item = item
+        # A builtin generic: the genai SDK only converts list[...] to a schema
+        self.response_type = list[item]
+        self._items = TypeAdapter(self.response_type)
+        self._item = TypeAdapter(item)
+
+    def validate_json(self, text: str) -> List[dict]:
+        """Parse and validate a full response; raises pydantic.ValidationError"""
+        return self._items.dump_python(self._items.validate_json(text))
+
+    def validate_item(self, item: object) -> dict:
+        """Validate one already parsed array element"""
+        return self._item.dump_python(self._item.validate_python(item))
+
+IMAGE_CAPTIONS = ResponseSchema('image_captions', ImageCaption)
+PROPERTY_COPY = ResponseSchema('property_copy', PropertyCopy)
@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_cors import cross_origin
-from app.services.ai_service import AIService
-from app.utils.errors import error_handler
+from app.services.firebase import AI_GENERATIONS_PAGE_SIZE
+from app.services.registry import get_services
+from app.utils.errors import error_handler, RateLimitedError
+import json
 import structlog
 
 logger = structlog.get_logger(__name__)
@@ -40,11 +42,12 @@ def analyze_image():
             }), 400
 
         # Process AI analysis (now a synchronous call)
-        ai_service = AIService()
+        ai_service = get_services().ai_service
         versions = ai_service.analyze_property_image(
             data['property_id'],
             data['image_id'],
-            data['versions']
+            data['versions'],
+            bypass_cache=_bypass_cache(data)
         )
 
         return jsonify({
@@ -54,6 +57,9 @@ def analyze_image():
             }
         }), 200
 
+    except RateLimitedError:
+        # Rendered as 429 with Retry-After by error_handler
+        raise
     except Exception as e:
         logger.error("AI analysis error", error=str(e), exc_info=True)
         return jsonify({
@@ -61,6 +67,89 @@ def analyze_image():
             'message': str(e)
         }), 500
 
+# Bulk Image Assistant
+@ai_bp.route('/analyze-images', methods=['POST', 'OPTIONS'])
+@cross_origin(
+    origins=['http://localhost:5173', 'http://127.0.0.1:5173'],
+    methods=['POST', 'OPTIONS'],
+    allow_headers=['Content-Type', 'Authorization']
+)
+@error_handler
+def analyze_images():
+    try:
+        logger.info("Received bulk AI analysis request")
+
+        # Validate JSON input
+        if not request.is_json:
+            logger.error("Invalid request: Not JSON")
+            return jsonify({
+                'status': 'error',
+                'message': 'Invalid request format'
+            }), 400
+
+        # Parse request data; image_ids is optional and defaults to every image
+        data = request.json
+        required_fields = ['property_id', 'versions']
+
+        if not all(field in data for field in required_fields):
+            logger.error("Missing required fields", data=data)
+            return jsonify({
+                'status': 'error',
+                'message': f'Missing required fields: {", ".join(required_fields)}'
+            }), 400
+
+        image_ids = data.get('image_ids')
+        if image_ids is not None and not isinstance(image_ids, list):
+            return jsonify({
+                'status': 'error',
+                'message': 'image_ids must be a list'
+            }), 400
+
+        concurrency = data.get('concurrency')
+        if concurrency is not None and (not isinstance(concurrency, int) or concurrency < 1):
+            return jsonify({
+                'status': 'error',
+                'message': 'concurrency must be a positive integer'
+            }), 400
+
+        # Process every image; failures are reported per image
+        ai_service = get_services().ai_service
+        results = ai_service.analyze_property_images(
+            data['property_id'],
+            data['versions'],
+            image_ids=image_ids,
+            bypass_cache=_bypass_cache(data),
+            max_workers=concurrency
+        )
+        failed = sum(1 for result in results if result['status'] != 'success')
+        rate_limited = [result['retry_after'] for result in results
+                        if result['status'] == 'rate_limited']
+
+        response = jsonify({
+            'status': 'success' if not failed else 'partial',
+            'data': {
+                'images': results,
+                'succeeded': len(results) - failed,
+                'failed': failed,
+                'rate_limited': len(rate_limited)
+            }
+        })
+        retry_after = [seconds for seconds in rate_limited if seconds is not None]
+        if retry_after:
+            # When the rate-limited images are worth retrying
+            response.headers['Retry-After'] = str(max(1, int(max(retry_after) + 0.5)))
+        return response, 200
+
+    except RateLimitedError:
+        # Rendered as 429 with Retry-After by error_handler
+        raise
+    except Exception as e:
+        logger.error("Bulk AI analysis error", error=str(e), exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 # Property Assistant
 @ai_bp.route('/analyze-property', methods=['POST', 'OPTIONS'])
 @cross_origin(
@@ -92,12 +181,28 @@ def analyze_property():
                 'message': f'Missing required fields: {", ".join(required_fields)}'
             }), 400
 
+        ai_service = get_services().ai_service
+
+        if _wants_stream(data):
+            # Server-Sent Events: one event per version as it is generated
+            events = ai_service.stream_property_content(
+                data['property_id'],
+                data['image_id'],
+                data['versions'],
+                bypass_cache=_bypass_cache(data)
+            )
+            return Response(
+                stream_with_context(_sse(events)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
         # Process AI analysis
-        ai_service = AIService()
         versions = ai_service.analyze_property_content(
             data['property_id'],
             data['image_id'],
-            data['versions']
+            data['versions'],
+            bypass_cache=_bypass_cache(data)
         )
 
         return jsonify({
@@ -107,9 +212,74 @@ def analyze_property():
             }
         }), 200
 
+    except RateLimitedError:
+        # Rendered as 429 with Retry-After by error_handler
+        raise
     except Exception as e:
         logger.error("Property AI analysis error", error=str(e), exc_info=True)
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+# Generation history, newest first
+@ai_bp.route('/properties/<property_id>/generations', methods=['GET'])
+@ai_bp.route('/properties/<property_id>/images/<image_id>/generations', methods=['GET'])
+@cross_origin(
+    origins=['http://localhost:5173', 'http://127.0.0.1:5173'],
+    methods=['GET', 'OPTIONS'],
+    allow_headers=['Content-Type', 'Authorization']
+)
+@error_handler
+def get_generations(property_id, image_id=None):
+    try:
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit < 1:
+            return jsonify({
+                'status': 'error',
+                'message': 'limit must be a positive integer'
+            }), 400
+
+        firebase = get_services().firebase
+        page = firebase.get_ai_generations(
+            property_id,
+            image_id=image_id,
+            limit=limit or AI_GENERATIONS_PAGE_SIZE,
+            cursor=request.args.get('cursor')
+        )
+
+        return jsonify({
+            'status': 'success',
+            'data': page
+        }), 200
+
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error("AI generations retrieval error", error=str(e), exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def _bypass_cache(data) -> bool:
+    """Regenerate instead of serving a cached response: "bypass_cache": true"""
+    value = data.get('bypass_cache', False)
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+def _wants_stream(data) -> bool:
+    """Streaming is opted into with "stream": true, ?stream=true or Accept: text/event-stream"""
+    value = data.get('stream', request.args.get('stream', False))
+    if isinstance(value, str):
+        value = value.lower() in ('1', 'true', 'yes')
+    return bool(value) or request.accept_mimetypes.best == 'text/event-stream'
+
+def _sse(events):
+    """Format (event, data) pairs as Server-Sent Events"""
+    for event, payload in events:
+        yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
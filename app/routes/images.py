@@ -1,8 +1,8 @@
 # app/routes/images.py
 
-from flask import Blueprint, request, jsonify
-from werkzeug.exceptions import BadRequest
-from app.services.image_service import ImageService
+from flask import Blueprint, request, jsonify, url_for
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from app.services.registry import get_services
 
 bp = Blueprint('images', __name__, url_prefix='/api')
 
@@ -18,20 +18,55 @@ def upload_images(property_id):
         files = request.files.getlist('files')
         if not files or not any(file.filename for file in files):
             raise BadRequest('No valid files provided')
+
+        if _is_async_request():
+            # Spool the files and let the job workers do the processing
+            job = get_services().image_jobs.submit(property_id, files)
+            status_url = url_for(
+                'images.get_image_job',
+                property_id=property_id,
+                job_id=job['id']
+            )
+            return jsonify({
+                'job_id': job['id'],
+                'status': job['status'],
+                'total': job['total'],
+                'status_url': status_url
+            }), 202, {'Location': status_url}
             
-        image_service = ImageService()
+        image_service = get_services().image_service
         uploaded_images = image_service.process_property_images(property_id, files)
         
         return jsonify(uploaded_images), 201
         
     except BadRequest as e:
         return jsonify({'error': str(e)}), 400
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
     except ValueError as e:
         return jsonify({'error': str(e)}), 422
     except Exception as e:
         # Log error here
         return jsonify({'error': 'Internal server error'}), 500
 
+@bp.route('/properties/<property_id>/images/jobs/<job_id>', methods=['GET'])
+def get_image_job(property_id, job_id):
+    try:
+        job = get_services().image_jobs.get_job(property_id, job_id)
+        if not job:
+            return jsonify({'error': f'Job {job_id} not found'}), 404
+
+        return jsonify(job)
+
+    except Exception as e:
+        # Log error here
+        return jsonify({'error': 'Internal server error'}), 500
+
+def _is_async_request() -> bool:
+    """Async mode is requested with ?async=true or an 'async' form field"""
+    value = request.args.get('async', request.form.get('async', ''))
+    return value.lower() in ('1', 'true', 'yes')
+
 @bp.route('/properties/<property_id>/images/<image_id>', methods=['PUT'])
 def update_image_metadata(property_id, image_id):
     try:
@@ -45,7 +80,7 @@ def update_image_metadata(property_id, image_id):
         if not update_data:
             raise BadRequest('No valid fields to update')
             
-        image_service = ImageService()
+        image_service = get_services().image_service
         updated = image_service.update_image_metadata(property_id, image_id, update_data)
         
         return jsonify(updated)
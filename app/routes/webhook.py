@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from app.services.data_pipeline import DataPipeline
+from app.services.registry import get_services
 from app.utils.errors import error_handler
 from functools import wraps
 import os
@@ -61,7 +61,7 @@ def handle_property_webhook():
                 'message': 'No data provided'
             }), 400
 
-        pipeline = DataPipeline()
+        pipeline = get_services().data_pipeline
         result = pipeline.process_property_data(data)
         
         logger.info("property_webhook_processed", 
@@ -0,0 +1,68 @@
+# app/services/ai_cache.py
+
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import tempfile
+import time
+from app.services.disk_cache import CacheStats, DiskCache
+
+# Seconds a generated response is served from the cache; 0 disables it
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', '86400'))
+AI_CACHE_DIR = os.getenv('AI_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'ai-response-cache')
+AI_CACHE_BYTES = int(os.getenv('AI_CACHE_MB', '64')) * 1024 * 1024
+
+class AIResponseCache:
+    """
+    Content-addressed cache of parsed Gemini responses.
+
+    The key covers everything that determines the output: the model, the
+    built prompt, the image bytes sent and the requested versions, so an
+    identical request is answered from disk instead of a paid generation.
+    It also names the document the response is recorded on, so a hit means
+    that document already holds the generation.
+    Entries expire after ttl seconds; the directory is size-bounded and
+    shared by the worker processes on a host.
+    """
+
+    def __init__(self, directory: str = AI_CACHE_DIR, max_bytes: int = AI_CACHE_BYTES, ttl: int = AI_CACHE_TTL):
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._store = DiskCache(directory, max_bytes, name="ai_response_cache")
+
+    @staticmethod
+    def key(model: str, prompt: str, image: bytes, versions: List[str], target: str) -> str:
+        parts = [
+            model,
+            hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+            hashlib.sha256(image).hexdigest(),
+            json.dumps(list(versions)),
+            target
+        ]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached response for key, or None if missing or expired"""
+        raw = self._store.get(key)
+        entry = None
+        if raw is not None:
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                entry = None
+        if entry is not None and time.time() - entry['created_at'] > self.ttl:
+            entry = None
+
+        self.stats.record(entry is not None)
+        return entry['response'] if entry is not None else None
+
+    def put(self, key: str, response: List[Dict[str, Any]]) -> None:
+        entry = {'created_at': time.time(), 'response': response}
+        self._store.put(key, json.dumps(entry).encode('utf-8'))
+
+def create_response_cache() -> Optional[AIResponseCache]:
+    """Build the response cache, or None when it is disabled"""
+    if AI_CACHE_TTL <= 0 or AI_CACHE_BYTES <= 0:
+        return None
+    return AIResponseCache()
@@ -0,0 +1,98 @@
+# app/services/ai_image.py
+
+from typing import Any, Dict, NamedTuple, Optional
+from PIL import Image
+import io
+import math
+import os
+from app.services.image_renditions import fit_size
+
+class ImageProfile(NamedTuple):
+    """Largest side and JPEG quality of the images sent to one model"""
+    max_side: int
+    quality: int
+
+# Gemini 2.x bills an image up to 384px per side as 258 tokens and a larger
+# one as 258 tokens per 768x768 tile, and sees no more detail than that, so
+# a 768px image costs one or two tiles where the 1600px rendition costs six
+MODEL_IMAGE_PROFILES: Dict[str, ImageProfile] = {
+    'gemini-2.0-flash': ImageProfile(max_side=768, quality=80),
+}
+DEFAULT_IMAGE_PROFILE = ImageProfile(max_side=768, quality=80)
+
+TOKENS_PER_TILE = 258
+TILE_SIDE = 768
+SMALL_IMAGE_SIDE = 384
+
+class PreparedImage(NamedTuple):
+    """An image encoded for a generation request"""
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    source_bytes: int
+
+    @property
+    def estimated_tokens(self) -> int:
+        return image_tokens(self.width, self.height)
+
+def image_profile(model: str) -> ImageProfile:
+    """Profile for a model; AI_IMAGE_MAX_SIDE / AI_IMAGE_QUALITY override it"""
+    profile = MODEL_IMAGE_PROFILES.get(model, DEFAULT_IMAGE_PROFILE)
+    return ImageProfile(
+        max_side=int(os.getenv('AI_IMAGE_MAX_SIDE') or profile.max_side),
+        quality=int(os.getenv('AI_IMAGE_QUALITY') or profile.quality)
+    )
+
+def image_tokens(width: int, height: int) -> int:
+    """Input tokens Gemini charges for an image of this size"""
+    if width <= SMALL_IMAGE_SIDE and height <= SMALL_IMAGE_SIDE:
+        return TOKENS_PER_TILE
+    return math.ceil(width / TILE_SIDE) * math.ceil(height / TILE_SIDE) * TOKENS_PER_TILE
+
+def prepare_image(data: bytes, profile: ImageProfile) -> PreparedImage:
+    """
+    Downsize and re-encode an image to the model's profile
+
+    JPEG sources are decoded in draft mode at the smallest scale that still
+    covers the target. An image that needs no resizing keeps its original
+    bytes when re-encoding would not make it smaller.
+    """
+    image = Image.open(io.BytesIO(data))
+    source_format = image.format
+    bounds = (profile.max_side, profile.max_side)
+    target = fit_size(image.size, bounds)
+    resized = target != image.size
+
+    image.draft('RGB', target)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != target:
+        image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=profile.quality)
+    encoded = output.getvalue()
+
+    if not resized and source_format == 'JPEG' and len(data) <= len(encoded):
+        encoded = data
+
+    return PreparedImage(
+        data=encoded,
+        mime_type='image/jpeg',
+        width=target[0],
+        height=target[1],
+        source_bytes=len(data)
+    )
+
+def image_tokens_used(response: Any) -> Optional[int]:
+    """Image input tokens reported in a response's usage metadata"""
+    usage = getattr(response, 'usage_metadata', None)
+    details = getattr(usage, 'prompt_tokens_details', None) if usage is not None else None
+    if not details:
+        return None
+    return sum(
+        detail.token_count or 0
+        for detail in details
+        if str(getattr(detail.modality, 'value', detail.modality)) == 'IMAGE'
+    )
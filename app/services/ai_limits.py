@@ -0,0 +1,272 @@
+# app/services/ai_limits.py
+
+from typing import Any, Callable, Optional, Tuple
+from contextlib import contextmanager
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import structlog
+from google.genai import errors as genai_errors
+from app.utils.errors import RateLimitedError
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; the quota is then only per process
+    fcntl = None
+
+logger = structlog.get_logger(__name__)
+
+# Quota of the Gemini project, shared by every worker process on the host
+REQUESTS_PER_MINUTE = int(os.getenv('AI_REQUESTS_PER_MINUTE', '1000'))
+TOKENS_PER_MINUTE = int(os.getenv('AI_TOKENS_PER_MINUTE', '1000000'))
+RATE_LIMIT_DIR = os.getenv('AI_RATE_LIMIT_DIR') or os.path.join(tempfile.gettempdir(), 'ai-rate-limit')
+
+# Upper bound of concurrent generations per process; the adaptive limit
+# moves between 1 and this
+MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '8'))
+# A generation slower than this counts as a sign of overload
+LATENCY_TARGET = float(os.getenv('AI_LATENCY_TARGET', '20'))
+
+MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', '4'))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+# Longest a call waits for quota before giving up
+MAX_QUOTA_WAIT = 60.0
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+class SharedRateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute token buckets.
+
+    Both buckets live in one small state file guarded by an exclusive file
+    lock, so every worker process on the host draws from the same quota.
+    Token costs are estimated before a call and corrected afterwards from
+    the usage the API reports.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int = REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = TOKENS_PER_MINUTE,
+        directory: str = RATE_LIMIT_DIR,
+        name: str = 'gemini'
+    ):
+        self.limits = {'requests': requests_per_minute, 'tokens': tokens_per_minute}
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.json")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _state(self):
+        """Locked read-modify-write of the bucket levels, refilled to now"""
+        with self._lock, open(self.path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or '{}')
+            except ValueError:
+                state = {}
+
+            now = time.time()
+            elapsed = max(now - state.get('updated', now), 0.0)
+            levels = {
+                kind: min(limit, state.get(kind, limit) + elapsed * limit / 60.0)
+                for kind, limit in self.limits.items()
+            }
+
+            yield levels
+
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({**levels, 'updated': now}))
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take one request and tokens from the buckets, or return the seconds to wait"""
+        wanted = {'requests': 1, 'tokens': min(tokens, self.limits['tokens'])}
+        with self._state() as levels:
+            wait = max(
+                (wanted[kind] - levels[kind]) * 60.0 / self.limits[kind]
+                for kind in self.limits
+            )
+            if wait <= 0:
+                for kind in self.limits:
+                    levels[kind] -= wanted[kind]
+                return 0.0
+            return wait
+
+    def acquire(self, tokens: int, timeout: float = MAX_QUOTA_WAIT) -> None:
+        """Block until the quota allows a call of about this many tokens"""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitedError(retry_after=wait)
+            time.sleep(wait)
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """Charge (or refund) the difference between estimated and actual tokens"""
+        if actual == estimated:
+            return
+        with self._state() as levels:
+            # May go negative: the next callers then wait for the debt
+            levels['tokens'] -= actual - estimated
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit driven by additive increase, multiplicative decrease.
+
+    Each successful, fast call raises the limit by 1/limit, so it grows by
+    about one per round of calls; a 429 or a call slower than the latency
+    target halves it. At most one decrease happens per latency window, so a
+    burst of failures from one overload is not counted repeatedly.
+    """
+
+    def __init__(
+        self,
+        max_limit: int = MAX_CONCURRENCY,
+        min_limit: int = 1,
+        latency_target: float = LATENCY_TARGET
+    ):
+        self.max_limit = max(max_limit, min_limit)
+        self.min_limit = min_limit
+        self.latency_target = latency_target
+        self.limit = float(self.max_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded or (latency is not None and latency > self.latency_target):
+                self._decrease()
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_target:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit / 2)
+        logger.warning("ai_concurrency_decreased", limit=round(self.limit, 2))
+
+class GenerationLimiter:
+    """
+    Run Gemini calls within quota, at an adaptive concurrency, with retries.
+
+    A call first takes a slot from the per-process AIMD limit, then waits
+    for the shared request and token buckets. Rate-limit and server errors
+    are retried with exponential backoff and full jitter; once retries are
+    exhausted a 429 becomes RateLimitedError so the client is told to come
+    back later instead of receiving a 500.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: Optional[SharedRateLimiter] = None,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        max_retries: int = MAX_RETRIES
+    ):
+        self.rate_limiter = rate_limiter or SharedRateLimiter()
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.max_retries = max_retries
+        self.logger = logger.bind(service="ai_limits")
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int) -> Any:
+        response, slot = self.hold(fn, estimated_tokens)
+        slot.release(completed=True)
+        self.record_usage(estimated_tokens, response)
+        return response
+
+    def hold(self, fn: Callable[[], Any], estimated_tokens: int) -> Tuple[Any, 'ConcurrencySlot']:
+        """
+        Like call, but keep the concurrency slot after fn returns
+
+        For streamed generations, whose work goes on after the first chunk:
+        the caller releases the slot once the stream is finished, which
+        also records its latency.
+        """
+        attempt = 0
+        while True:
+            self.concurrency.acquire()
+            try:
+                self.rate_limiter.acquire(estimated_tokens)
+                # Latency covers the generation only, not the quota wait
+                start = time.monotonic()
+                response = fn()
+            except RateLimitedError:
+                self.concurrency.release()
+                raise
+            except Exception as e:
+                code = _error_code(e)
+                self.concurrency.release(overloaded=code in (429, 503))
+                if code not in RETRYABLE_CODES:
+                    raise
+                if attempt >= self.max_retries:
+                    if code == 429:
+                        raise RateLimitedError(retry_after=BACKOFF_CAP) from e
+                    raise
+
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                self.logger.warning("ai_call_retry",
+                                    code=code,
+                                    attempt=attempt + 1,
+                                    delay=round(delay, 2),
+                                    concurrency=round(self.concurrency.limit, 2))
+                attempt += 1
+                time.sleep(delay)
+                continue
+
+            return response, ConcurrencySlot(self.concurrency, start)
+
+    def record_usage(self, estimated_tokens: int, response: Any) -> None:
+        """Correct the token bucket from a response's reported usage"""
+        actual = _total_tokens(response)
+        if actual is not None:
+            self.rate_limiter.record_usage(estimated_tokens, actual)
+
+class ConcurrencySlot:
+    """A held AdaptiveConcurrency slot; released once, with the call's latency if it completed"""
+
+    def __init__(self, concurrency: AdaptiveConcurrency, start: float):
+        self.concurrency = concurrency
+        self.start = start
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self, completed: bool = True) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        # An abandoned call says nothing about the service's latency
+        latency = time.monotonic() - self.start if completed else None
+        self.concurrency.release(latency=latency)
+
+    def __del__(self):
+        # A stream dropped before it was ever read must not leak the slot
+        self.release(completed=False)
+
+def _error_code(error: Exception) -> Optional[int]:
+    if isinstance(error, genai_errors.APIError):
+        return error.code
+    return None
+
+def _total_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, 'usage_metadata', None)
+    return getattr(usage, 'total_token_count', None) if usage is not None else None
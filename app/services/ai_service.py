@@ -1,39 +1,103 @@
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
 import structlog
 from google import genai
+from google.genai import types
+from pydantic import ValidationError
 import os
-from PIL import Image
-import requests
-from io import BytesIO
-import json
-from app.services.firebase import FirebaseService
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.models.ai_response import IMAGE_CAPTIONS, PROPERTY_COPY, ResponseSchema
+from app.services.ai_image import PreparedImage, image_profile, image_tokens_used, prepare_image
+from app.services.ai_cache import AIResponseCache
+from app.services.ai_limits import GenerationLimiter
+from app.services.firebase import DocumentState, FirebaseService
+from app.services.image_service import ImageService
+from app.services.image_source import ImageSource
+from app.services.prompts import PromptLibrary, TokenCounter, compact_json
+from app.services.registry import get_services
+from app.utils.errors import RateLimitedError
+from app.utils.json_stream import JSONArrayStream
 
 logger = structlog.get_logger(__name__)
 
-class AIService:
+class GenerationStats:
+    """Counters of paid generations in this process and how many were discarded"""
+
     def __init__(self):
+        self.generations = 0
+        self.wasted = 0
+        self._lock = threading.Lock()
+
+    def record(self, wasted: bool) -> None:
+        with self._lock:
+            self.generations += 1
+            if wasted:
+                self.wasted += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'generations': self.generations,
+            'wasted': self.wasted,
+            'waste_rate': round(self.wasted / self.generations, 3) if self.generations else None
+        }
+
+class AIService:
+    # Concurrent image analyses per bulk request
+    BULK_WORKERS = int(os.getenv('AI_BULK_WORKERS', '4'))
+
+    # Output token estimate for quota accounting before the usage is known
+    OUTPUT_TOKEN_ESTIMATE = 1000
+
+    def __init__(
+        self,
+        client: Optional[genai.Client] = None,
+        firebase: Optional[FirebaseService] = None,
+        image_source: Optional[ImageSource] = None,
+        response_cache: Optional[AIResponseCache] = None,
+        limiter: Optional[GenerationLimiter] = None,
+        prompts: Optional[PromptLibrary] = None
+    ):
         self.logger = logger.bind(service="ai_service")
-        # Initialize Gemini API
-        self.client = genai.Client(api_key=os.getenv('GOOGLE_AI_API_KEY'))
+        # Shared clients come from the service registry; a genai.Client
+        # holds its own connection pool, so one per process is enough
+        services = get_services()
+        self.client = client or services.genai_client
         self.model = "gemini-2.0-flash"
-        self.firebase = FirebaseService()
+        # Images are downsized to what the model can use before sending
+        self.image_profile = image_profile(self.model)
+        self.firebase = firebase or services.firebase
+        # Renditions are read from the bucket directly, not via signed URLs
+        self.image_source = image_source or services.image_source
+        # Identical requests are answered without a new generation
+        self.response_cache = response_cache or services.ai_response_cache
+        # Quota, adaptive concurrency and retries for generation calls
+        self.limiter = limiter or services.ai_limiter
+        # Generations whose output could not be used
+        self.generation_stats = GenerationStats()
+        # Versioned templates, compiled once; prompt tokens are counted per call
+        self.prompts = prompts or services.prompts
+        self.token_counter = TokenCounter(self.client, self.model)
+
+    def _render_prompt(self, name: str, **values: Any) -> str:
+        """Render a prompt template and record its size"""
+        prompt = self.prompts.render(name, **values)
+        tokens, source = self.token_counter.count(prompt)
+        self.logger.info("prompt_built",
+                        template=self.prompts.version(name),
+                        chars=len(prompt),
+                        tokens=tokens,
+                        token_source=source)
+        return prompt
 
     def _build_prompt(self, property_title: str, property_description: str, versions: List[str]) -> str:
         """Build the prompt for the AI model"""
-        
-        return f"""As a high-end real estate image specialist, analyze this property image and provide a professional, SEO-optimized title and description. Highlights key selling points visible in the image. Using real estate industry standard terminology, Incorporate relevant keywords naturally, Maintain a professional tone, and Focuses on unique, visible features. 
-
-        Provide a response using the selected tone for each of the following versions {versions}. 
-
-        For additional reference here is the:
-        Property Title: {property_title}
-        Property Description: {property_description}
-
-        Respond in JSON format with an array of objects containing:
-        "version": "version type",
-        "image_title": "Brief, compelling title (max 80 chars)",
-        "image_description": "Detailed, SEO-optimized description (max 300 chars)"
-        """
+        return self._render_prompt(
+            'image_caption',
+            property_title=property_title,
+            property_description=property_description,
+            versions=compact_json(versions)
+        )
     
     def _build_property_prompt(
         self,
@@ -44,119 +108,161 @@ class AIService:
         versions: List[str]
     ) -> str:
         """Build the prompt for property content generation"""
+        return self._render_prompt(
+            'property_copy',
+            property_type=property_type,
+            property_location=property_location,
+            property_summary=property_summary,
+            property_details=compact_json(property_data),
+            versions=compact_json(versions)
+        )
+
+    def _estimate_tokens(self, prompt: str, image: PreparedImage) -> int:
+        """Rough token cost of a generation, for the tokens-per-minute quota"""
+        # The counted (or estimated) prompt, the image's tiles and an
+        # allowance for the response; corrected from the reported usage
+        prompt_tokens, _ = self.token_counter.count(prompt)
+        if prompt_tokens is None:
+            prompt_tokens = TokenCounter.estimate(prompt)
+        return prompt_tokens + image.estimated_tokens + self.OUTPUT_TOKEN_ESTIMATE
+
+    def _read_rendition(self, image_data: Dict[str, Any], size: str) -> bytes:
+        """Bytes of an image's JPEG rendition, cached by object generation"""
+        generation = image_data.get("srcset", {}).get("jpeg", {}).get(size, {}).get("generation")
+        return self.image_source.read(image_data["urls"][size], generation)
+
+    def _read_image(self, image_data: Dict[str, Any]) -> PreparedImage:
+        """Read the smallest rendition covering the model's size and prepare it"""
+        size = "medium" if max(ImageService.MEDIUM_SIZE) >= self.image_profile.max_side else "large"
+        image_bytes = self._read_rendition(image_data, size)
+        image = prepare_image(image_bytes, self.image_profile)
+        self.logger.info("ai_image_prepared",
+                        rendition=size,
+                        size=f"{image.width}x{image.height}",
+                        source_bytes=image.source_bytes,
+                        bytes=len(image.data),
+                        estimated_image_tokens=image.estimated_tokens)
+        return image
+
+    def _image_part(self, image: PreparedImage) -> types.Part:
+        return types.Part.from_bytes(data=image.data, mime_type=image.mime_type)
+
+    def _log_usage(self, image: PreparedImage, response: Any) -> None:
+        """Log what a generation sent and the tokens it was charged"""
+        usage = getattr(response, 'usage_metadata', None)
+        self.logger.info("ai_usage",
+                        bytes_sent=len(image.data),
+                        image_tokens=image_tokens_used(response),
+                        prompt_tokens=getattr(usage, 'prompt_token_count', None),
+                        total_tokens=getattr(usage, 'total_token_count', None))
+
+    def _cached_response(
+        self,
+        image: PreparedImage,
+        prompt: str,
+        versions: List[str],
+        target: str,
+        bypass_cache: bool
+    ) -> Tuple[Optional[str], Optional[List[Dict[str, str]]]]:
+        """Response cache key for a request recorded on target and the cached response, if any"""
+        if self.response_cache is None:
+            return None, None
+
+        cache_key = self.response_cache.key(self.model, prompt, image.data, versions, target)
+        if bypass_cache:
+            return cache_key, None
+
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            self.logger.info("ai_response_cache_hit",
+                            cache_key=cache_key,
+                            **self.response_cache.stats.to_dict())
+        return cache_key, cached
+
+    def _generation_config(self, schema: ResponseSchema) -> types.GenerateContentConfig:
+        """Constrain the output to JSON matching the flow's response model"""
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=schema.response_type
+        )
+
+    def _record_generation(self, schema: ResponseSchema, error: Optional[Exception] = None) -> None:
+        """Count a finished generation; one that failed validation was paid for nothing"""
+        self.generation_stats.record(wasted=error is not None)
+        if error is not None:
+            self.logger.error("ai_generation_wasted",
+                            schema=schema.name,
+                            error=str(error),
+                            **self.generation_stats.to_dict())
+
+    def _process_ai_request(
+        self,
+        image: PreparedImage,
+        prompt: str,
+        versions: List[str],
+        schema: ResponseSchema,
+        target: str,
+        record: Callable[[List[Dict[str, str]]], None],
+        bypass_cache: bool = False
+    ) -> List[Dict[str, str]]:
+        """
+        Validated response, from the response cache or a new generation
 
-        # Create a formatted example JSON structure
-        example_json = {
-            "version": "version name",
-            "title": "property title",
-            "description": "full description",
-            "excerpt": "brief summary"
-        }
+        A new generation is passed to record, which saves it to the ai_meta
+        of the target document, and only cached once that succeeded: a
+        cached response is already in the target's history.
+        """
+        cache_key, cached = self._cached_response(image, prompt, versions, target, bypass_cache)
+        if cached is not None:
+            return cached
 
-        return f'''As a high-end real estate specialist, analyze this {property_type} located in {property_location} and using the image and the information provided, create an engaging title, description and excerpt for this real estate. Highlight key selling points using real estate industry standard terminology, incorporate relevant keywords naturally and maintain a professional tone.
-
-        Property Category: {property_type}
-        Primary Location: {property_location}
-        Property Summary: {property_summary}
-        Property Details: {json.dumps(property_data, indent=2)}
-        Versions Required: {versions}
-        Market Position: High-end real estate market
-
-        For each requested version ({versions}), maintain the core information while adapting:
-        - Tone and vocabulary
-        - Emphasis points
-        - Writing style
-        - Market positioning
-
-        Content Requirements:
-        - Title: Create a compelling, location-specific title that highlights the property's main selling points
-        - Description: Craft a flowing narrative that guides potential buyers through the property
-        - Excerpt: Deliver a concise, keyword-rich summary focusing on unique selling propositions
-
-        Structural Guidelines:
-        1. Title (80 chars max):
-        - Include location and key property type
-        - Highlight a standout feature
-        - Use market-appropriate terminology
-
-        2. Description (2000 chars max):
-        - Opening: Strong location context and property positioning
-        - Body: Progressive reveal of property features and spaces
-        - Closing: Emphasize lifestyle benefits and investment potential
-        - Natural keyword integration
-        - <br> tags for section breaks only
-        - Minimal use of <b> and <i> tags for emphasis
-        - Do not use any bullet points or lists.
-        - Avoid repetition of descriptive adjectives.
-
-        3. Excerpt (300 chars max):
-        - Lead with strongest selling point
-        - Include location context
-        - Mention key features
-        - End with value proposition
-
-        IMPORTANT: Respond with a JSON array where each object has EXACTLY these fields:
-        {json.dumps(example_json, indent=2)}
-
-        Keep all responses in valid JSON format.
-        '''
-
-    def _process_ai_request(self, image_url: str, prompt: str) -> List[Dict[str, str]]:
-        try:
-            # Get image from URL
-            self.logger.info("fetching_image", url=image_url)
-            response = requests.get(image_url)
-            response.raise_for_status()
-            
-            image = Image.open(BytesIO(response.content))
-            self.logger.info("image_fetched_successfully", 
-                            size=f"{image.size[0]}x{image.size[1]}")
+        result = self._generate(image, prompt, schema)
+        record(result)
+
+        if cache_key is not None:
+            # A bypassed request still refreshes the entry
+            self.response_cache.put(cache_key, result)
+        return result
 
+    def _generate(
+        self,
+        image: PreparedImage,
+        prompt: str,
+        schema: ResponseSchema
+    ) -> List[Dict[str, str]]:
+        """Run one generation and return its validated response"""
+        try:
             # Generate content using Gemini API
-            self.logger.info("generating_ai_content")
-            response = self.client.models.generate_content(
-                model=self.model, 
-                contents=[prompt, image]
+            self.logger.info("generating_ai_content", schema=schema.name)
+            # Runs within the shared quota, with retries on 429/5xx
+            response = self.limiter.call(
+                lambda: self.client.models.generate_content(
+                    model=self.model, 
+                    contents=[prompt, self._image_part(image)],
+                    config=self._generation_config(schema)
+                ),
+                estimated_tokens=self._estimate_tokens(prompt, image)
             )
             
-            # Fix this logging statement - use key-value pairs for structlog
             self.logger.info("ai_response_received", response_text=response.text)
-            
-            if not response or not response.text:
-                raise ValueError("Empty response from AI service")
-
-            # Clean up response
-            cleaned_response = response.text.strip()
-            if cleaned_response.startswith("```json"):
-                cleaned_response = cleaned_response[7:]
-            if cleaned_response.endswith("```"):
-                cleaned_response = cleaned_response[:-3]
-            cleaned_response = cleaned_response.strip()
-            
-            # Log cleaned response
-            self.logger.info("cleaned_response_prepared", response=cleaned_response)
-            
-            # Parse response
-            result = json.loads(cleaned_response)
-            
-            # Validate response format
-            if not isinstance(result, list):
-                raise ValueError("Invalid response format - expected array")
-                
-            # Update validation for property content
-            for item in result:
-                required_fields = ["version", "title", "description", "excerpt"]
-                if not all(key in item for key in required_fields):
-                    self.logger.error("missing_required_fields", item=item)
-                    raise ValueError(f"Invalid response item format. Required fields: {required_fields}")
-            
+            self._log_usage(image, response)
+
+            try:
+                if not response.text:
+                    raise ValueError("Empty response from AI service")
+                # The output is constrained to the schema, so it is plain
+                # JSON that pydantic-core parses and validates in one pass
+                result = schema.validate_json(response.text)
+            except (ValueError, ValidationError) as e:
+                self._record_generation(schema, e)
+                raise ValueError(f"Invalid AI response: {str(e)}")
+            self._record_generation(schema)
+
             return result
 
-        except json.JSONDecodeError as e:
-            self.logger.error("json_parse_error", 
-                            error=str(e), 
-                            response=cleaned_response)
-            raise ValueError(f"Failed to parse AI response: {str(e)}")
+        except RateLimitedError:
+            self.logger.warning("ai_rate_limited")
+            raise
         except Exception as e:
             self.logger.error("ai_request_error", 
                             error=str(e))
@@ -166,22 +272,18 @@ class AIService:
         self,
         property_id: str,
         image_id: str,
-        versions: List[str]
+        versions: List[str],
+        bypass_cache: bool = False
     ) -> List[Dict[str, str]]:
         """Analyze property image using provided IDs"""
         try:
-            # Get property data from Firebase
-            property_data = self.firebase.get_property(property_id)
-            if not property_data:
+            # Property and image documents in one round-trip
+            context = self.firebase.get_property_context(property_id, image_id)
+            if context.property is None:
                 raise ValueError(f"Property not found: {property_id}")
-
-            # Get image data from Firebase
-            image_data = self.firebase.get_property_image(property_id, image_id)
-            if not image_data:
+            if context.image is None:
                 raise ValueError(f"Image not found: {image_id}")
-
-            # Get signed URL for the image
-            signed_url = self.firebase.get_image_download_url(image_data["urls"]["large"])
+            property_data = context.property.data
 
             # Build prompt
             prompt = self._build_prompt(
@@ -190,12 +292,10 @@ class AIService:
                 versions
             )
 
-            # Process image with signed URL
-            response = self._process_ai_request(signed_url, prompt)
-
-            # Save results to image ai_meta in firebase
-            self.firebase.update_image_ai_meta(property_id, image_id, response)
-            return response
+            return self._caption_image(
+                property_id, image_id, context.image.data, prompt, versions, bypass_cache,
+                current=context.image
+            )
 
         except Exception as e:
             self.logger.error("image_analysis_error",
@@ -204,66 +304,189 @@ class AIService:
                             image_id=image_id)
             raise
 
-    def analyze_property_content(
+    def analyze_property_images(
+        self,
+        property_id: str,
+        versions: List[str],
+        image_ids: Optional[List[str]] = None,
+        bypass_cache: bool = False,
+        max_workers: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Analyze several images of a property concurrently
+
+        Analyzes the given images, or every image of the property when
+        image_ids is None. The property is read and the prompt built once;
+        each image is then read, generated and saved to its own ai_meta on
+        a bounded thread pool. Returns one result per image, in request
+        order: {'image_id', 'status': 'success', 'versions'},
+        {'image_id', 'status': 'rate_limited', 'error', 'retry_after'} when
+        the quota ran out, or {'image_id', 'status': 'error', 'error'}.
+        """
+        property_data = self.firebase.get_property(property_id)
+        if not property_data:
+            raise ValueError(f"Property not found: {property_id}")
+
+        if image_ids is not None:
+            # One analysis (and one ai_meta write) per image
+            image_ids = list(dict.fromkeys(image_ids))
+
+        images = self.firebase.get_property_images(property_id, image_ids)
+        if image_ids is None:
+            image_ids = list(images)
+
+        prompt = self._build_prompt(
+            property_data["title"],
+            property_data["description"],
+            versions
+        )
+
+        def analyze(image_id: str) -> Dict[str, Any]:
+            image_data = images.get(image_id)
+            try:
+                if not image_data:
+                    raise ValueError(f"Image not found: {image_id}")
+                response = self._caption_image(
+                    property_id, image_id, image_data, prompt, versions, bypass_cache
+                )
+                return {'image_id': image_id, 'status': 'success', 'versions': response}
+            except RateLimitedError as e:
+                self.logger.warning("image_analysis_rate_limited",
+                                  property_id=property_id,
+                                  image_id=image_id,
+                                  retry_after=e.retry_after)
+                return {'image_id': image_id, 'status': 'rate_limited',
+                        'error': str(e), 'retry_after': e.retry_after}
+            except Exception as e:
+                self.logger.error("image_analysis_error",
+                                error=str(e),
+                                property_id=property_id,
+                                image_id=image_id)
+                return {'image_id': image_id, 'status': 'error', 'error': str(e)}
+
+        workers = max(1, min(max_workers or self.BULK_WORKERS, self.BULK_WORKERS, len(image_ids) or 1))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-bulk") as executor:
+            results = list(executor.map(analyze, image_ids))
+
+        failed = sum(1 for result in results if result['status'] != 'success')
+        rate_limited = sum(1 for result in results if result['status'] == 'rate_limited')
+        self.logger.info("bulk_image_analysis_completed",
+                        property_id=property_id,
+                        images=len(results),
+                        failed=failed,
+                        rate_limited=rate_limited,
+                        workers=workers)
+        return results
+
+    def _caption_image(
         self,
         property_id: str,
         image_id: str,
-        versions: List[str]
+        image_data: Dict[str, Any],
+        prompt: str,
+        versions: List[str],
+        bypass_cache: bool,
+        current: Optional[DocumentState] = None
     ) -> List[Dict[str, str]]:
-        """Analyze property and generate content using provided property and image"""
-        try:
-            # Get property data from Firebase
-            property_data = self.firebase.get_property(property_id)
-            if not property_data:
-                raise ValueError(f"Property not found: {property_id}")
-
-            # Get image data from Firebase
-            image_data = self.firebase.get_property_image(property_id, image_id)
-            if not image_data:
-                raise ValueError(f"Image not found: {image_id}")
+        """
+        Generate copy for one image and save it to the image's ai_meta
 
-            # Get signed URL for the image
-            signed_url = self.firebase.get_image_download_url(image_data["urls"]["medium"])
+        current is the image document as already read, if it was, so the
+        save does not read it again.
+        """
+        # Read the rendition from Storage (or the local cache), sized for the model
+        image = self._read_image(image_data)
+
+        # Process image; a new generation is saved to the image's ai_meta
+        return self._process_ai_request(
+            image, prompt, versions, IMAGE_CAPTIONS,
+            target=f"properties/{property_id}/images/{image_id}",
+            record=lambda response: self.firebase.update_image_ai_meta(
+                property_id, image_id, response, current=current
+            ),
+            bypass_cache=bypass_cache
+        )
+
+    def _prepare_property_content(
+        self,
+        property_id: str,
+        image_id: str,
+        versions: List[str]
+    ) -> Tuple[PreparedImage, str, DocumentState]:
+        """
+        Read the property and image and build the property content prompt
 
-            # Prepare property information
-            property_type = property_data.get("details", {}).get("property_type", "property")
-            location = property_data.get("location", {})
-            property_location = f"{location.get('town', '')}, {location.get('municipality', '')}"
+        Returns the prepared image, the prompt and the property as read,
+        which the ai_meta save reuses.
+        """
+        # Property and image documents in one round-trip
+        context = self.firebase.get_property_context(property_id, image_id)
+        if context.property is None:
+            raise ValueError(f"Property not found: {property_id}")
+        if context.image is None:
+            raise ValueError(f"Image not found: {image_id}")
+        property_data = context.property.data
+
+        # Read the rendition from Storage (or the local cache), sized for the model
+        image = self._read_image(context.image.data)
+
+        # Prepare property information
+        property_type = property_data.get("details", {}).get("property_type", "property")
+        location = property_data.get("location", {})
+        property_location = f"{location.get('town', '')}, {location.get('municipality', '')}"
+
+        # Clean and structure property data
+        clean_data = {
+            "details": {k: v for k, v in property_data.get("details", {}).items() if v},
+            "rooms": {k: v for k, v in property_data.get("rooms", {}).items() if v},
+            "features": {k: v for k, v in property_data.get("features", {}).items() if v and v != []},
+            "price": property_data.get("price")
+        }
+        # Empty sections only cost prompt tokens
+        clean_data = {k: v for k, v in clean_data.items() if v}
 
-            # Clean and structure property data
-            clean_data = {
-                "details": {k: v for k, v in property_data.get("details", {}).items() if v},
-                "rooms": {k: v for k, v in property_data.get("rooms", {}).items() if v},
-                "features": {k: v for k, v in property_data.get("features", {}).items() if v and v != []},
-                "price": property_data.get("price")
-            }
+        # Build prompt
+        self.logger.info("Building prompt with data", 
+                        property_type=property_type,
+                        location=property_location,
+                        versions=versions)
 
-            # Build prompt
-            self.logger.info("Building prompt with data", 
-                            property_type=property_type,
-                            location=property_location,
-                            versions=versions)
-
-            prompt = self._build_property_prompt(
-                property_type=property_type,
-                property_location=property_location,
-                property_data=clean_data,
-                property_summary=property_data.get("excerpt", ""),
-                versions=versions
-            )
+        prompt = self._build_property_prompt(
+            property_type=property_type,
+            property_location=property_location,
+            property_data=clean_data,
+            property_summary=property_data.get("excerpt", ""),
+            versions=versions
+        )
 
-            self.logger.info("Prompt built successfully")
+        self.logger.info("Prompt built successfully")
 
-            # Process image with signed URL
-            response = self._process_ai_request(signed_url, prompt)
-            self.logger.info("AI request processed successfully")
+        return image, prompt, context.property
 
-            # Save results to property ai_meta in firebase
-            self.firebase.update_property_ai_meta(
-                property_id=property_id,
-                image_id=image_id,
-                ai_response=response
+    def analyze_property_content(
+        self,
+        property_id: str,
+        image_id: str,
+        versions: List[str],
+        bypass_cache: bool = False
+    ) -> List[Dict[str, str]]:
+        """Analyze property and generate content using provided property and image"""
+        try:
+            image, prompt, property_state = self._prepare_property_content(property_id, image_id, versions)
+
+            # Process image; a new generation is saved to the property's ai_meta
+            response = self._process_ai_request(
+                image, prompt, versions, PROPERTY_COPY,
+                target=f"properties/{property_id}",
+                record=lambda response: self.firebase.update_property_ai_meta(
+                    property_id=property_id,
+                    image_id=image_id,
+                    ai_response=response,
+                    current=property_state
+                ),
+                bypass_cache=bypass_cache
             )
+            self.logger.info("AI request processed successfully")
 
             return response
 
@@ -273,4 +496,110 @@ class AIService:
                             property_id=property_id,
                             image_id=image_id)
             raise
-    
\ No newline at end of file
+    
+
+    def stream_property_content(
+        self,
+        property_id: str,
+        image_id: str,
+        versions: List[str],
+        bypass_cache: bool = False
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Generate property content, yielding each version as soon as it parses
+
+        The property, image and first streamed chunk are fetched before this
+        returns, so a missing property or an exhausted quota still raises
+        here. The returned iterator yields ('version', item) per version,
+        then ('done', {'versions': [...]}) once ai_meta is saved, or
+        ('error', {'message': ...}) if generation fails part way.
+        """
+        image, prompt, property_state = self._prepare_property_content(property_id, image_id, versions)
+        cache_key, cached = self._cached_response(
+            image, prompt, versions, f"properties/{property_id}", bypass_cache
+        )
+        stream = None if cached is not None else self._start_stream(image, prompt, PROPERTY_COPY)
+
+        def events() -> Iterator[Tuple[str, Dict[str, Any]]]:
+            try:
+                if cached is not None:
+                    result = cached
+                    for item in cached:
+                        yield 'version', item
+                else:
+                    result = []
+                    for item in stream:
+                        result.append(item)
+                        yield 'version', item
+                    if not result:
+                        raise ValueError("Empty response from AI service")
+
+                    # Saved once the whole response is known, and cached
+                    # only once saved
+                    self.firebase.update_property_ai_meta(
+                        property_id=property_id,
+                        image_id=image_id,
+                        ai_response=result,
+                        current=property_state
+                    )
+                    if cache_key is not None:
+                        self.response_cache.put(cache_key, result)
+                yield 'done', {'versions': result}
+
+            except Exception as e:
+                self.logger.error("property_stream_error",
+                                error=str(e),
+                                property_id=property_id,
+                                image_id=image_id)
+                yield 'error', {'message': str(e)}
+            finally:
+                if stream is not None:
+                    # Ends the generation if the client went away mid-stream
+                    stream.close()
+
+        return events()
+
+    def _start_stream(self, image: PreparedImage, prompt: str, schema: ResponseSchema) -> Iterator[Dict[str, str]]:
+        """Open a streamed generation and return an iterator of validated items"""
+        estimated_tokens = self._estimate_tokens(prompt, image)
+
+        def start():
+            # The request is only sent when the first chunk is read, so
+            # that happens inside the limiter to get quota and retries
+            chunks = iter(self.client.models.generate_content_stream(
+                model=self.model,
+                contents=[prompt, self._image_part(image)],
+                config=self._generation_config(schema)
+            ))
+            return next(chunks, None), chunks
+
+        # The concurrency slot is held until the stream ends, not just
+        # until the first chunk, so AIMD sees the whole generation
+        (first, chunks), slot = self.limiter.hold(start, estimated_tokens=estimated_tokens)
+
+        def items() -> Iterator[Dict[str, str]]:
+            parser = JSONArrayStream()
+            last = None
+            completed = False
+            try:
+                try:
+                    for chunk in itertools.chain([first] if first is not None else [], chunks):
+                        last = chunk
+                        for item in parser.feed(chunk.text or ''):
+                            yield schema.validate_item(item)
+
+                    if not parser.finished:
+                        raise ValueError("Incomplete response from AI service")
+                except (ValueError, ValidationError) as e:
+                    self._record_generation(schema, e)
+                    raise ValueError(f"Invalid AI response: {str(e)}")
+                completed = True
+            finally:
+                # Exhausted, failed or closed by a disconnected client
+                slot.release(completed=completed)
+            self._record_generation(schema)
+            if last is not None:
+                self._log_usage(image, last)
+                self.limiter.record_usage(estimated_tokens, last)
+
+        return items()
@@ -1,23 +1,26 @@
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 import pandas as pd
 import structlog
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from .data_pipeline import DataPipeline
+from .registry import get_services
 
 class BatchPropertyProcessor:
     """Process multiple properties from CSV file"""
     
-    def __init__(self):
-        self.data_pipeline = DataPipeline()
+    def __init__(self, data_pipeline: Optional[DataPipeline] = None):
+        self.data_pipeline = data_pipeline or get_services().data_pipeline
         self.logger = structlog.get_logger().bind(service="batch_processor")
 
-    def process_csv(self, csv_path: str, max_workers: int = 4) -> Dict[str, Any]:
+    def process_csv(self, csv_path: str) -> Dict[str, Any]:
         """
         Process multiple properties from a CSV file
         
+        Rows are streamed through a Firestore BulkWriter, which batches the
+        writes and ramps throughput up towards Firestore's write limits, so
+        no worker threads are needed here.
+        
         Args:
             csv_path: Path to the CSV file
-            max_workers: Maximum number of concurrent processing threads
             
         Returns:
             Dict containing results summary and detailed status
@@ -36,34 +39,17 @@ class BatchPropertyProcessor:
                 'processed_ids': []
             }
 
-            # Process properties concurrently
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                # Create future tasks
-                future_to_property = {
-                    executor.submit(self.process_single_property, row): row 
-                    for _, row in df.iterrows()
-                }
-                
-                # Process completed tasks
-                for future in as_completed(future_to_property):
-                    property_row = future_to_property[future]
-                    try:
-                        success, property_id, error = future.result()
-                        if success:
-                            results['successful'] += 1
-                            results['processed_ids'].append(property_id)
-                        else:
-                            results['failed'] += 1
-                            results['errors'].append({
-                                'property_id': property_id,
-                                'error': str(error)
-                            })
-                    except Exception as e:
-                        results['failed'] += 1
-                        results['errors'].append({
-                            'property_id': property_row.get('CRM Reference', 'Unknown'),
-                            'error': str(e)
-                        })
+            rows = (self._clean_row(row) for _, row in df.iterrows())
+            for result in self.data_pipeline.process_properties(rows):
+                if result.success:
+                    results['successful'] += 1
+                    results['processed_ids'].append(result.document_id)
+                else:
+                    results['failed'] += 1
+                    results['errors'].append({
+                        'property_id': result.document_id,
+                        'error': result.error
+                    })
 
             self.logger.info(
                 "csv_processing_completed",
@@ -78,38 +64,13 @@ class BatchPropertyProcessor:
             self.logger.error("csv_processing_error", error=str(e))
             raise
 
-    def process_single_property(self, row: pd.Series) -> Tuple[bool, str, str]:
-        """
-        Process a single property from CSV row
-        
-        Args:
-            row: Pandas Series containing property data
-            
-        Returns:
-            Tuple of (success: bool, property_id: str, error: str)
-        """
-        property_id = row.get('CRM Reference', 'Unknown')
-        
-        try:
-            # Convert row to dictionary and clean null values
-            property_data = row.to_dict()
-            property_data = {
-                k: ('' if pd.isna(v) else v) 
-                for k, v in property_data.items()
-            }
-
-            # Process through pipeline
-            self.data_pipeline.process_property_data(property_data)
-            
-            return True, property_id, ''
-
-        except Exception as e:
-            self.logger.error(
-                "property_processing_error",
-                property_id=property_id,
-                error=str(e)
-            )
-            return False, property_id, str(e)
+    @staticmethod
+    def _clean_row(row: pd.Series) -> Dict[str, Any]:
+        """Convert a CSV row to a dictionary with null values as empty strings"""
+        return {
+            k: ('' if pd.isna(v) else v) 
+            for k, v in row.to_dict().items()
+        }
 
     def validate_csv_format(self, csv_path: str) -> Tuple[bool, List[str]]:
         """
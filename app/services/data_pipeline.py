@@ -1,62 +1,67 @@
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 import structlog
 from app.services.firebase import FirebaseService
+from app.services.firestore_batch import BulkWriteResult
 from app.services.feature_processor import FeatureProcessor
+from app.services.registry import get_services
 
 logger = structlog.get_logger(__name__)
 
 class DataPipeline:
-    def __init__(self):
-        self.firebase = FirebaseService()
+    def __init__(self, firebase: Optional[FirebaseService] = None):
+        self.firebase = firebase or get_services().firebase
         self.feature_processor = FeatureProcessor()
         self.logger = logger.bind(service="data_pipeline")
 
+    def build_property_data(self, crm_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Transform CRM data to our property schema; raises ValueError if invalid"""
+        # Process features first
+        features = self.feature_processor.process_features(crm_data)
+        
+        # Validate processed features
+        if not self.feature_processor.validate_features(features):
+            raise ValueError("Invalid feature structure detected")
+
+        # Transform data to our schema
+        return {
+            "property_id": crm_data.get('id'),
+            "title": crm_data.get("title", ""),
+            "description": crm_data.get("description", ""),
+            "excerpt": crm_data.get("excerpt", ""),
+            "price": float(crm_data.get("price", 0)),
+            "website_status": "disabled",
+            "location": {
+                "country": crm_data.get("country", ""),
+                "region": crm_data.get("region", ""),
+                "municipality": crm_data.get("municipality", ""),
+                "town": crm_data.get("town", ""),
+                "postcode": str(crm_data.get("postcode", ""))
+            },
+            "details": {
+                "property_type": crm_data.get("property_type", ""),
+                "area_plot": crm_data.get("area_plot", ""),
+                "area_property": crm_data.get("area_property", "")
+            },
+            "rooms": {
+                "bedrooms": crm_data.get("bedrooms", ""),
+                "bathrooms": crm_data.get("bathrooms", "")
+            },
+            "features": features,  # Use processed features
+            "flags": {
+                "sold": False,
+                "reduced": False
+            }
+            # No "media": the feature image is set by image uploads, and the
+            # merged upsert must not reset it
+        }
+
     def process_property_data(self, crm_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process and store property data from CRM"""
         try:
             self.logger.info("processing_property_data", 
                            property_id=crm_data.get('id'))
 
-            # Process features first
-            features = self.feature_processor.process_features(crm_data)
-            
-            # Validate processed features
-            if not self.feature_processor.validate_features(features):
-                raise ValueError("Invalid feature structure detected")
-
-            # Transform data to our schema
-            property_data = {
-                "property_id": crm_data.get('id'),
-                "title": crm_data.get("title", ""),
-                "description": crm_data.get("description", ""),
-                "excerpt": crm_data.get("excerpt", ""),
-                "price": float(crm_data.get("price", 0)),
-                "website_status": "disabled",
-                "location": {
-                    "country": crm_data.get("country", ""),
-                    "region": crm_data.get("region", ""),
-                    "municipality": crm_data.get("municipality", ""),
-                    "town": crm_data.get("town", ""),
-                    "postcode": str(crm_data.get("postcode", ""))
-                },
-                "details": {
-                    "property_type": crm_data.get("property_type", ""),
-                    "area_plot": crm_data.get("area_plot", ""),
-                    "area_property": crm_data.get("area_property", "")
-                },
-                "rooms": {
-                    "bedrooms": crm_data.get("bedrooms", ""),
-                    "bathrooms": crm_data.get("bathrooms", "")
-                },
-                "features": features,  # Use processed features
-                "flags": {
-                    "sold": False,
-                    "reduced": False
-                },
-                "media": {
-                    "feature_image_id": None
-                }
-            }
+            property_data = self.build_property_data(crm_data)
 
             # Store in Firebase
             result = self.firebase.create_or_update_property(
@@ -86,4 +91,36 @@ class DataPipeline:
                 property_id=crm_data.get('id'),
                 error=str(e)
             )
-            raise
\ No newline at end of file
+            raise
+
+    def process_properties(self, crm_rows: Iterable[Dict[str, Any]]) -> Iterator[BulkWriteResult]:
+        """
+        Process and store many CRM properties through one bulk write
+
+        Yields a result for every row as it completes: rows that fail the
+        transform are reported without being written, the others stream
+        into FirebaseService.bulk_upsert_properties.
+        """
+        rejected: List[BulkWriteResult] = []
+
+        def documents() -> Iterator[Tuple[str, Dict[str, Any]]]:
+            for crm_data in crm_rows:
+                property_id = crm_data.get('id')
+                try:
+                    if property_id in (None, ''):
+                        raise ValueError("Missing property id")
+                    property_data = self.build_property_data(crm_data)
+                except Exception as e:
+                    self.logger.error("property_data_validation_error",
+                                      property_id=property_id,
+                                      error=str(e))
+                    rejected.append(BulkWriteResult(str(property_id), False, str(e)))
+                    continue
+                yield str(property_id), property_data
+
+        for result in self.firebase.bulk_upsert_properties(documents()):
+            while rejected:
+                yield rejected.pop()
+            yield result
+        while rejected:
+            yield rejected.pop()
@@ -0,0 +1,159 @@
+# app/services/disk_cache.py
+
+from typing import Dict, Optional, Any
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import structlog
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; pruning is then only per process
+    fcntl = None
+
+logger = structlog.get_logger(__name__)
+
+class CacheStats:
+    """Hit and miss counters of one cache in this process"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None
+        }
+
+class DiskCache:
+    """
+    Size-bounded LRU of byte values on local disk, keyed by string.
+
+    The directory can be shared by every worker process on the host:
+    entries are written under a temporary name and renamed into place, so
+    readers never see a partial file, and a hit refreshes the file's mtime,
+    which is the LRU order used for eviction. Pruning runs under an
+    exclusive file lock, one process at a time.
+    """
+
+    LOCK_FILE = '.lock'
+    TEMP_PREFIX = '.tmp-'
+    # Temporary files older than this were left behind by a crash
+    STALE_TEMP_SECONDS = 3600
+
+    def __init__(self, directory: str, max_bytes: int, name: str = 'disk_cache'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.logger = logger.bind(service=name)
+        os.makedirs(directory, exist_ok=True)
+
+        # Prune after every tenth of the limit written by this process, and
+        # on the first write, since other processes fill the cache as well
+        self._prune_every = max(max_bytes // 10, 1)
+        self._written = self._prune_every
+        self._lock = threading.Lock()
+
+    def _file(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key: str) -> Optional[bytes]:
+        file = self._file(key)
+        try:
+            with open(file, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.stats.record(False)
+            return None
+
+        try:
+            os.utime(file)
+        except OSError:
+            # Evicted by another process since it was read
+            pass
+        self.stats.record(True)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+
+        file = self._file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(file), prefix=self.TEMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp, file)
+        except Exception:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+        with self._lock:
+            self._written += len(data)
+            due = self._written >= self._prune_every
+            if due:
+                self._written = 0
+        if due:
+            self.prune()
+
+    def prune(self) -> None:
+        """Evict least recently used entries until the cache is below 90% of its limit"""
+        with open(os.path.join(self.directory, self.LOCK_FILE), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+
+            now = time.time()
+            entries = []
+            total = 0
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name == self.LOCK_FILE:
+                        continue
+                    file = os.path.join(root, name)
+                    try:
+                        stat = os.stat(file)
+                    except FileNotFoundError:
+                        continue
+                    if name.startswith(self.TEMP_PREFIX):
+                        if now - stat.st_mtime > self.STALE_TEMP_SECONDS:
+                            self._remove(file)
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, file))
+                    total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            target = int(self.max_bytes * 0.9)
+            evicted = 0
+            for _, size, file in sorted(entries):
+                if total <= target:
+                    break
+                self._remove(file)
+                total -= size
+                evicted += 1
+
+            self.logger.info("disk_cache_pruned", evicted=evicted, bytes=total)
+
+    @staticmethod
+    def _remove(file: str) -> None:
+        try:
+            os.remove(file)
+        except FileNotFoundError:
+            pass
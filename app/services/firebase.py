@@ -1,15 +1,42 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import os
+import threading
+import time
 import structlog
-from typing import Dict, List, Any
+from typing import Dict, Iterable, Iterator, List, Any, NamedTuple, Optional, Tuple
 from datetime import datetime
 
-# import firebase storage
-from firebase_admin import storage
+from app.services.disk_cache import CacheStats
+from app.services.firestore_batch import BulkWriteResult, ChunkedWriteBatch, bulk_set
+from app.services.registry import get_services
 
 logger = structlog.get_logger(__name__)
 
+# Seconds a property document is served from memory; 0 disables the cache
+PROPERTY_CACHE_TTL = float(os.getenv('PROPERTY_CACHE_TTL', '60'))
+PROPERTY_CACHE_SIZE = int(os.getenv('PROPERTY_CACHE_SIZE', '256'))
+
+# Latest generations whose responses stay inline in a document's ai_meta;
+# every generation is stored in full in its ai_generations subcollection
+AI_META_INLINE_GENERATIONS = int(os.getenv('AI_META_INLINE_GENERATIONS', '3'))
+# Conditional ai_meta updates tried when concurrent generations collide
+AI_META_WRITE_ATTEMPTS = 5
+AI_GENERATIONS_PAGE_SIZE = 20
+AI_GENERATIONS_MAX_PAGE = 100
+
+# Lifetime of signed download URLs; a cached URL is handed out until this
+# margin before it expires, so clients always get usable time on it
+SIGNED_URL_EXPIRATION = 3600
+SIGNED_URL_MARGIN = int(os.getenv('SIGNED_URL_MARGIN', '300'))
+SIGNED_URL_CACHE_SIZE = 4096
+# Concurrent signings in a bulk request (each may be an IAM signBlob call)
+SIGNING_WORKERS = 8
+
 def init_firebase():
     """Initialize Firebase Admin SDK"""
     try:
@@ -22,11 +49,127 @@ def init_firebase():
         logger.error("firebase_initialization_failed", error=str(e))
         raise
 
+class DocumentState(NamedTuple):
+    """A document's data as read, with the update time it was read at"""
+    data: Dict[str, Any]
+    update_time: Any
+
+class PropertyContext(NamedTuple):
+    """Property and image documents of one AI request; None when missing"""
+    property: Optional[DocumentState]
+    image: Optional[DocumentState]
+
+class PropertyCache:
+    """
+    Thread-safe TTL/LRU of property documents keyed by property id.
+
+    Entries keep the snapshot's update time, and a document older than the
+    cached one never replaces it. Writes made through FirebaseService
+    invalidate the entry and bump an epoch; a read that was in flight
+    during an invalidation does not store its result, so it cannot put the
+    pre-write document back. Changes made elsewhere (other processes, the
+    console) are picked up once the entry expires.
+    """
+
+    def __init__(self, ttl: float = PROPERTY_CACHE_TTL, max_entries: int = PROPERTY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self.epoch = 0
+        # property id -> (document, update time, expiry)
+        self._entries: 'OrderedDict[str, Tuple[Dict[str, Any], Any, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, property_id: str) -> Optional[DocumentState]:
+        with self._lock:
+            entry = self._entries.get(property_id)
+            if entry is not None and entry[2] < time.monotonic():
+                del self._entries[property_id]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(property_id)
+        self.stats.record(entry is not None)
+        if entry is None:
+            return None
+        # Callers get their own copy to modify
+        return DocumentState(copy.deepcopy(entry[0]), entry[1])
+
+    def put(self, property_id: str, data: Dict[str, Any], update_time: Any, epoch: int) -> None:
+        with self._lock:
+            if epoch != self.epoch:
+                return
+            current = self._entries.get(property_id)
+            if current is not None and None not in (current[1], update_time) and current[1] > update_time:
+                return
+            self._entries[property_id] = (copy.deepcopy(data), update_time, time.monotonic() + self.ttl)
+            self._entries.move_to_end(property_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, property_id: str) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._entries.pop(property_id, None)
+
+def create_property_cache() -> Optional[PropertyCache]:
+    """Build the property cache, or None when it is disabled"""
+    if PROPERTY_CACHE_TTL <= 0 or PROPERTY_CACHE_SIZE <= 0:
+        return None
+    return PropertyCache()
+
+class SignedURLCache:
+    """
+    Thread-safe cache of signed download URLs keyed by storage path.
+
+    A URL is returned until margin seconds before it expires, then signed
+    afresh. Signing can mean a remote IAM signBlob call depending on the
+    credentials, so repeated requests for one image grid sign only once
+    per URL lifetime.
+    """
+
+    def __init__(self, margin: float = SIGNED_URL_MARGIN, max_entries: int = SIGNED_URL_CACHE_SIZE):
+        self.margin = margin
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        # storage path -> (signed URL, monotonic expiry)
+        self._entries: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, storage_path: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(storage_path)
+            if entry is not None and entry[1] - self.margin <= time.monotonic():
+                del self._entries[storage_path]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(storage_path)
+        self.stats.record(entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, storage_path: str, url: str, expires_at: float) -> None:
+        with self._lock:
+            self._entries[storage_path] = (url, expires_at)
+            self._entries.move_to_end(storage_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
 class FirebaseService:
-    def __init__(self):
-        self.db = firestore.client()
+    def __init__(self, db=None, bucket=None, property_cache: Optional[PropertyCache] = None):
+        self.db = db if db is not None else get_services().db
+        self._bucket = bucket
+        # Repeated reads of one listing (AI requests) skip Firestore
+        self.property_cache = property_cache or create_property_cache()
+        self.signed_urls = SignedURLCache()
         self.logger = logger.bind(service="firebase")
 
+    @property
+    def bucket(self):
+        # Resolved on first use so Firestore-only callers never build a
+        # Storage client
+        if self._bucket is None:
+            self._bucket = get_services().bucket
+        return self._bucket
+
     def create_or_update_property(self, property_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Create or update a property document in Firestore"""
         try:
@@ -36,6 +179,7 @@ class FirebaseService:
             # Create or update the document
             property_ref = self.db.collection('properties').document(str(property_id))
             property_ref.set(data, merge=True)
+            self.invalidate_property(property_id)
             
             self.logger.info("property_updated", property_id=property_id)
             
@@ -53,31 +197,58 @@ class FirebaseService:
             )
             raise
 
+    def bulk_upsert_properties(
+        self,
+        properties: Iterable[Tuple[str, Dict[str, Any]]],
+        **options: Any
+    ) -> Iterator[BulkWriteResult]:
+        """
+        Create or update many property documents through a BulkWriter
+
+        Takes (property_id, data) pairs and yields one BulkWriteResult per
+        property as Firestore confirms it; each document is merged like
+        create_or_update_property. Throughput ramp-up, the in-flight window
+        and retry attempts can be overridden with the options of bulk_set.
+        """
+        collection = self.db.collection('properties')
+        writes = (
+            (collection.document(str(property_id)), {**data, 'updated_at': firestore.SERVER_TIMESTAMP})
+            for property_id, data in properties
+        )
+        for result in bulk_set(self.db, writes, merge=True, **options):
+            if result.success:
+                self.invalidate_property(result.document_id)
+            else:
+                self.logger.error("property_update_failed",
+                                  property_id=result.document_id,
+                                  error=result.error)
+            yield result
+
     def get_property(self, property_id: str) -> Dict[str, Any]:
-        """Retrieve a property document from Firestore"""
+        """Retrieve a property document, from the property cache when possible"""
         try:
+            cache = self.property_cache
+            if cache is not None:
+                cached = cache.get(str(property_id))
+                if cached is not None:
+                    self.logger.info("property_cache_hit",
+                                    property_id=property_id,
+                                    **cache.stats.to_dict())
+                    return cached.data
+                epoch = cache.epoch
+
             self.logger.info("attempting_property_retrieval", property_id=property_id)
             
-            # Get collection reference and print it
-            collection_ref = self.db.collection('properties')
-            print(f"Collection reference: {collection_ref._path}")
-            
-            # Get document reference
-            doc_ref = collection_ref.document(str(property_id))
-            print(f"Document reference: {doc_ref._path}")
-            
             # Get document
-            doc = doc_ref.get()
-            print(f"Document exists: {doc.exists}")
+            doc = self.db.collection('properties').document(str(property_id)).get()
             
             if not doc.exists:
-                self.logger.warning("property_not_found", 
-                                property_id=property_id,
-                                collection_path=collection_ref.path)
+                self.logger.warning("property_not_found", property_id=property_id)
                 return None
             
             data = doc.to_dict()
-            print(f"Document data: {data}")
+            if cache is not None:
+                cache.put(str(property_id), data, doc.update_time, epoch)
                 
             return data
                 
@@ -89,6 +260,59 @@ class FirebaseService:
             )
             raise
 
+    def get_property_context(self, property_id: str, image_id: str) -> PropertyContext:
+        """
+        Read the property and one of its images for an AI request
+
+        Both documents come back from a single get_all round-trip (just the
+        image when the property is cached), with their update times.
+        """
+        try:
+            property_ref = self.db.collection('properties').document(str(property_id))
+            image_ref = property_ref.collection('images').document(str(image_id))
+
+            cache = self.property_cache
+            cached = cache.get(str(property_id)) if cache is not None else None
+            epoch = cache.epoch if cache is not None else None
+
+            refs = [image_ref] if cached is not None else [property_ref, image_ref]
+            snapshots = {
+                snapshot.reference.path: snapshot
+                for snapshot in self.db.get_all(refs)
+            }
+
+            def state(ref) -> Optional[DocumentState]:
+                snapshot = snapshots.get(ref.path)
+                if snapshot is None or not snapshot.exists:
+                    return None
+                return DocumentState(snapshot.to_dict(), snapshot.update_time)
+
+            property_state = cached
+            if cached is not None:
+                self.logger.info("property_cache_hit",
+                                property_id=property_id,
+                                **cache.stats.to_dict())
+            else:
+                property_state = state(property_ref)
+                if property_state is not None and cache is not None:
+                    cache.put(str(property_id), property_state.data, property_state.update_time, epoch)
+
+            return PropertyContext(property=property_state, image=state(image_ref))
+
+        except Exception as e:
+            self.logger.error(
+                "property_context_retrieval_failed",
+                property_id=property_id,
+                image_id=image_id,
+                error=str(e)
+            )
+            raise
+
+    def invalidate_property(self, property_id: str) -> None:
+        """Drop a property from the cache after writing it, here or elsewhere"""
+        if self.property_cache is not None:
+            self.property_cache.invalidate(str(property_id))
+
     # get property image data from firebase collection
     def get_property_image(self, property_id: str, image_id: str) -> Dict[str, Any]:
         """Retrieve a property image data from Firestore"""
@@ -109,35 +333,54 @@ class FirebaseService:
             )
             raise
     
+    def get_property_images(
+        self,
+        property_id: str,
+        image_ids: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieve several images of a property, keyed by image id
+
+        Reads the given images in one batched get, or every image of the
+        property in display order when image_ids is None. Missing images
+        are left out.
+        """
+        try:
+            images_ref = self.db.collection('properties').document(str(property_id))\
+                            .collection('images')
+
+            if image_ids is None:
+                snapshots = images_ref.order_by('order').stream()
+            else:
+                snapshots = self.db.get_all([images_ref.document(str(i)) for i in image_ids])
+
+            return {
+                snapshot.id: snapshot.to_dict()
+                for snapshot in snapshots
+                if snapshot.exists
+            }
+
+        except Exception as e:
+            self.logger.error(
+                "images_retrieval_failed",
+                property_id=property_id,
+                error=str(e)
+            )
+            raise
+
     def get_image_download_url(self, full_url: str) -> str:
         """Get a signed download URL for a Firebase Storage image"""
         try:
-            # Extract the path from the full URL
-            # From: https://storage.googleapis.com/real-estate-65605.firebasestorage.app/properties/CP000208/large/CP000208-04.jpg
-            # To: properties/CP000208/large/CP000208-04.jpg
-            storage_path = full_url.split('.app/', 1)[1]
-            
-            self.logger.info("getting_signed_url", 
-                            full_url=full_url,
-                            storage_path=storage_path)
-            
-            # Get bucket
-            bucket = storage.bucket()
-            
-            # Get blob
-            blob = bucket.blob(storage_path)
-            
-            # Generate signed URL that expires in 3600 seconds (1 hour)
-            url = blob.generate_signed_url(
-                version='v4',
-                expiration=3600,
-                method='GET'
-            )
-            
-            self.logger.info("generated_signed_url", 
-                            storage_path=storage_path)
-            
-            return url
+            storage_path = self._storage_path(full_url)
+
+            url = self.signed_urls.get(storage_path)
+            if url is not None:
+                self.logger.info("signed_url_cache_hit",
+                                storage_path=storage_path,
+                                **self.signed_urls.stats.to_dict())
+                return url
+
+            return self._sign_url(storage_path)
             
         except Exception as e:
             self.logger.error(
@@ -147,39 +390,189 @@ class FirebaseService:
             )
             raise
 
-    def update_image_ai_meta(self, property_id: str, image_id: str, ai_response: List[Dict[str, str]]) -> None:
-        """Update the ai_meta field of a property image with new AI responses"""
+    def get_image_download_urls(self, full_urls: List[str]) -> Dict[str, str]:
+        """
+        Get signed download URLs for several images, keyed by full URL
+
+        Cached URLs are returned as they are; the rest are signed
+        concurrently, so an image grid costs one signing latency rather than
+        one per image.
+        """
+        try:
+            start = time.perf_counter()
+            paths = {full_url: self._storage_path(full_url) for full_url in dict.fromkeys(full_urls)}
+
+            signed = {}
+            for path in dict.fromkeys(paths.values()):
+                url = self.signed_urls.get(path)
+                if url is not None:
+                    signed[path] = url
+            missing = [path for path in dict.fromkeys(paths.values()) if path not in signed]
+
+            if missing:
+                workers = min(SIGNING_WORKERS, len(missing))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="url-signing") as executor:
+                    signed.update(zip(missing, executor.map(self._sign_url, missing)))
+
+            self.logger.info("signed_urls_bulk",
+                            urls=len(paths),
+                            signed=len(missing),
+                            latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                            **self.signed_urls.stats.to_dict())
+
+            return {full_url: signed[path] for full_url, path in paths.items()}
+
+        except Exception as e:
+            self.logger.error(
+                "signed_urls_generation_failed",
+                urls=len(full_urls),
+                error=str(e)
+            )
+            raise
+
+    def _storage_path(self, full_url: str) -> str:
+        """Storage path of an image given its public URL"""
+        # Extract the path from the full URL
+        # From: https://storage.googleapis.com/real-estate-65605.firebasestorage.app/properties/CP000208/large/CP000208-04.jpg
+        # To: properties/CP000208/large/CP000208-04.jpg
+        return full_url.split('.app/', 1)[1]
+
+    def _sign_url(self, storage_path: str) -> str:
+        """Sign a v4 download URL for a blob and cache it"""
+        start = time.perf_counter()
+        expires_at = time.monotonic() + SIGNED_URL_EXPIRATION
+
+        # Generate signed URL that expires in 3600 seconds (1 hour)
+        url = self.bucket.blob(storage_path).generate_signed_url(
+            version='v4',
+            expiration=SIGNED_URL_EXPIRATION,
+            method='GET'
+        )
+        self.signed_urls.put(storage_path, url, expires_at)
+
+        self.logger.info("generated_signed_url",
+                        storage_path=storage_path,
+                        latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                        **self.signed_urls.stats.to_dict())
+        return url
+
+    def _append_ai_generation(
+        self,
+        parent_ref,
+        ai_response: List[Dict[str, str]],
+        current: Optional[DocumentState] = None,
+        **fields: Any
+    ) -> str:
+        """
+        Record a generation and keep the latest ones inline in ai_meta
+
+        The generation is added as its own document to the parent's
+        ai_generations subcollection. In the same batch the parent's ai_meta
+        gets the generation's id, time and fields, and ai_meta.responses
+        keeps the responses of the last AI_META_INLINE_GENERATIONS
+        generations, newest first, as readers have always found them;
+        ai_meta.generations lists those generations and their response
+        counts. Inline history from before ai_generations existed is
+        archived by the same batch.
+
+        The update is conditional on the parent being unchanged since it was
+        read. current is the parent as the caller already read it, which
+        saves a read; the parent is only (re-)read when current is None or
+        after a conflicting write. Raises NotFound if the parent does not
+        exist. Returns the generation id.
+        """
+        generation_ref = parent_ref.collection('ai_generations').document()
+        generated_at = datetime.now().isoformat()
+
+        for attempt in range(AI_META_WRITE_ATTEMPTS):
+            if current is None:
+                snapshot = parent_ref.get()
+                if not snapshot.exists:
+                    raise NotFound(f"Document not found: {parent_ref.path}")
+                current = DocumentState(snapshot.to_dict(), snapshot.update_time)
+            ai_meta = current.data.get('ai_meta') or {}
+
+            batch = self.db.batch()
+            batch.set(generation_ref, {
+                **fields,
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'generated_at': generated_at,
+                'responses': ai_response
+            })
+
+            latest = {**fields, 'id': generation_ref.id, 'generated_at': generated_at, 'count': len(ai_response)}
+            previous = self._inline_generations(batch, parent_ref, ai_meta)[:max(AI_META_INLINE_GENERATIONS - 1, 0)]
+            kept = sum(generation['count'] for generation in previous)
+
+            batch.update(parent_ref, {
+                # Dotted paths: other ai_meta fields are left as they are
+                **{f'ai_meta.{name}': value for name, value in fields.items()},
+                'ai_meta.last_generated': generated_at,
+                'ai_meta.generation_id': generation_ref.id,
+                'ai_meta.generations': [latest] + previous,
+                'ai_meta.responses': ai_response + (ai_meta.get('responses') or [])[:kept]
+            }, option=self.db.write_option(last_update_time=current.update_time))
+
+            try:
+                batch.commit()
+                return generation_ref.id
+            except FailedPrecondition:
+                if attempt == AI_META_WRITE_ATTEMPTS - 1:
+                    raise
+                self.logger.info("ai_meta_write_conflict", path=parent_ref.path, attempt=attempt + 1)
+                current = None
+
+    def _inline_generations(self, batch, ref, ai_meta: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Generations summarised in a document's ai_meta, newest first
+
+        A document with inline responses but no generation list gets one:
+        history written before ai_generations existed is first copied into
+        a legacy ai_generations document by the given batch.
+        """
+        if 'generations' in ai_meta:
+            return ai_meta['generations']
+        responses = ai_meta.get('responses') or []
+        if not responses:
+            return []
+
+        generation = {'id': ai_meta.get('generation_id'), 'generated_at': ai_meta.get('last_generated'),
+                      'count': len(responses)}
+        if generation['id'] is None:
+            legacy_ref = ref.collection('ai_generations').document()
+            batch.set(legacy_ref, {
+                'legacy': True,
+                'created_at': _parse_time(ai_meta.get('last_generated')) or firestore.SERVER_TIMESTAMP,
+                'generated_at': ai_meta.get('last_generated'),
+                'responses': responses
+            })
+            generation['id'] = legacy_ref.id
+        elif 'image_id' in ai_meta:
+            generation['image_id'] = ai_meta['image_id']
+        return [generation]
+
+    def update_image_ai_meta(
+        self,
+        property_id: str,
+        image_id: str,
+        ai_response: List[Dict[str, str]],
+        current: Optional[DocumentState] = None
+    ) -> None:
+        """Record new AI responses for a property image, as read in current if given"""
         try:
             # Get reference to the image document
             image_ref = self.db.collection('properties').document(str(property_id))\
                             .collection('images').document(str(image_id))
-            
-            # Get current ai_meta if it exists
-            image_doc = image_ref.get()
-            if not image_doc.exists:
-                raise ValueError(f"Image not found: {image_id}")
-                
-            current_time = datetime.now().isoformat()
 
-            # Get existing responses or start with an empty list
-            current_data = image_doc.to_dict()
-            current_responses = current_data.get('ai_meta', {}).get('responses', [])
-
-
-            # Add new response at the beginning of the list
-            updated_responses = ai_response + current_responses
-            
-            # Simple update with merge
-            image_ref.set({
-                'ai_meta': {
-                    'last_generated': current_time,
-                    'responses': updated_responses
-                }
-            }, merge=True)
+            try:
+                generation_id = self._append_ai_generation(image_ref, ai_response, current)
+            except NotFound:
+                raise ValueError(f"Image not found: {image_id}")
             
             self.logger.info("ai_meta_updated",
                             property_id=property_id,
-                            image_id=image_id)
+                            image_id=image_id,
+                            generation_id=generation_id)
                             
         except Exception as e:
             self.logger.error(
@@ -190,38 +583,30 @@ class FirebaseService:
             )
             raise
     
-    def update_property_ai_meta(self, property_id: str, image_id: str, ai_response: List[Dict[str, str]]) -> None:
-        """Update the ai_meta field of a property with new AI responses"""
+    def update_property_ai_meta(
+        self,
+        property_id: str,
+        image_id: str,
+        ai_response: List[Dict[str, str]],
+        current: Optional[DocumentState] = None
+    ) -> None:
+        """Record new AI responses for a property, as read in current if given"""
         try:
             # Get reference to the property document
             property_ref = self.db.collection('properties').document(str(property_id))
-            
-            # Get current property document
-            property_doc = property_ref.get()
-            if not property_doc.exists:
+
+            try:
+                generation_id = self._append_ai_generation(
+                    property_ref, ai_response, current, image_id=image_id
+                )
+            except NotFound:
                 raise ValueError(f"Property not found: {property_id}")
-                
-            current_time = datetime.now().isoformat()
-
-            # Get existing responses or start with an empty list
-            current_data = property_doc.to_dict()
-            current_responses = current_data.get('ai_meta', {}).get('responses', [])
-
-            # Add new response at the beginning of the list
-            updated_responses = ai_response + current_responses
-
-            # Update property with AI metadata
-            property_ref.set({
-                'ai_meta': {
-                    'last_generated': current_time,
-                    'image_id': image_id, # need to be added into the responses
-                    'responses': updated_responses
-                }
-            }, merge=True)
+            self.invalidate_property(property_id)
             
             self.logger.info("property_ai_meta_updated",
                             property_id=property_id,
-                            image_id=image_id)
+                            image_id=image_id,
+                            generation_id=generation_id)
                             
         except Exception as e:
             self.logger.error(
@@ -230,4 +615,111 @@ class FirebaseService:
                 image_id=image_id,
                 error=str(e)
             )
-            raise
\ No newline at end of file
+            raise
+
+    def get_ai_generations(
+        self,
+        property_id: str,
+        image_id: Optional[str] = None,
+        limit: int = AI_GENERATIONS_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Page through the AI generation history of a property or an image
+
+        Newest first. Returns {'generations': [...], 'next_cursor': id or
+        None}; pass next_cursor back to get the following page.
+        """
+        try:
+            parent_ref = self.db.collection('properties').document(str(property_id))
+            if image_id is not None:
+                parent_ref = parent_ref.collection('images').document(str(image_id))
+            generations_ref = parent_ref.collection('ai_generations')
+
+            limit = max(1, min(limit, AI_GENERATIONS_MAX_PAGE))
+            query = generations_ref.order_by('created_at', direction=firestore.Query.DESCENDING)
+            if cursor:
+                cursor_snapshot = generations_ref.document(cursor).get()
+                if not cursor_snapshot.exists:
+                    raise ValueError(f"Invalid cursor: {cursor}")
+                query = query.start_after(cursor_snapshot)
+
+            # One extra document tells whether there is another page
+            snapshots = list(query.limit(limit + 1).stream())
+            page = snapshots[:limit]
+
+            generations = []
+            for snapshot in page:
+                data = snapshot.to_dict()
+                created_at = data.get('created_at')
+                if hasattr(created_at, 'isoformat'):
+                    data['created_at'] = created_at.isoformat()
+                generations.append({'id': snapshot.id, **data})
+
+            return {
+                'generations': generations,
+                'next_cursor': page[-1].id if len(snapshots) > limit else None
+            }
+
+        except Exception as e:
+            self.logger.error(
+                "ai_generations_retrieval_failed",
+                property_id=property_id,
+                image_id=image_id,
+                error=str(e)
+            )
+            raise
+
+    def archive_ai_meta_history(self, property_id: str) -> int:
+        """
+        Move inline ai_meta history written before ai_generations existed
+
+        For the property and each of its images still in the old format,
+        the inline ai_meta.responses list is copied into one legacy
+        ai_generations document, which becomes the first entry of
+        ai_meta.generations. A document's next generation does the same on
+        its own; this archives a whole property up front. Returns the
+        number of documents archived.
+        """
+        try:
+            property_ref = self.db.collection('properties').document(str(property_id))
+            snapshots = [property_ref.get()]
+            snapshots += list(property_ref.collection('images').stream())
+
+            batch = ChunkedWriteBatch(self.db)
+            archived = 0
+            for snapshot in snapshots:
+                if not snapshot.exists:
+                    continue
+                ai_meta = snapshot.to_dict().get('ai_meta') or {}
+                if 'generation_id' in ai_meta or not ai_meta.get('responses'):
+                    continue
+
+                generations = self._inline_generations(batch, snapshot.reference, ai_meta)
+                batch.update(snapshot.reference, {
+                    'ai_meta.generation_id': generations[0]['id'],
+                    'ai_meta.generations': generations
+                })
+                archived += 1
+
+            batch.commit()
+            self.invalidate_property(property_id)
+
+            self.logger.info("ai_meta_history_archived",
+                            property_id=property_id,
+                            documents=archived)
+            return archived
+
+        except Exception as e:
+            self.logger.error(
+                "ai_meta_history_archive_failed",
+                property_id=property_id,
+                error=str(e)
+            )
+            raise
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
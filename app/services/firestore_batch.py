@@ -0,0 +1,253 @@
+# app/services/firestore_batch.py
+
+from typing import Dict, Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from datetime import datetime
+import os
+import queue
+import threading
+import time
+import grpc
+import structlog
+from google.cloud.firestore_v1.bulk_writer import BulkRetry, BulkWriter, BulkWriterOptions
+from google.cloud.firestore_v1.types import BatchWriteResponse, WriteResult
+from google.rpc import status_pb2
+
+logger = structlog.get_logger(__name__)
+
+# Firestore rejects commits above 500 writes or a 10 MiB request; keep
+# clear of the byte limit since the estimate below is approximate
+MAX_BATCH_WRITES = 500
+MAX_BATCH_BYTES = 9 * 1024 * 1024
+
+# Bulk writes start at the initial rate and grow by 50% every five minutes
+# of sustained load (Firestore's 500/50/5 ramp-up) up to the maximum
+BULK_WRITE_INITIAL_OPS = int(os.getenv('FIRESTORE_BULK_INITIAL_OPS', '500'))
+BULK_WRITE_MAX_OPS = int(os.getenv('FIRESTORE_BULK_MAX_OPS', '10000'))
+# Writes submitted but not yet reported; the input is read no further ahead
+BULK_WRITE_MAX_PENDING = int(os.getenv('FIRESTORE_BULK_MAX_PENDING', '2000'))
+BULK_WRITE_MAX_ATTEMPTS = int(os.getenv('FIRESTORE_BULK_MAX_ATTEMPTS', '5'))
+# Seconds without a result before a partial batch or due retries are sent
+BULK_WRITE_IDLE_SEND = 0.5
+
+# Status codes worth another attempt; anything else fails the document
+RETRYABLE_WRITE_CODES = {
+    grpc.StatusCode.CANCELLED.value[0],
+    grpc.StatusCode.UNKNOWN.value[0],
+    grpc.StatusCode.DEADLINE_EXCEEDED.value[0],
+    grpc.StatusCode.RESOURCE_EXHAUSTED.value[0],
+    grpc.StatusCode.ABORTED.value[0],
+    grpc.StatusCode.INTERNAL.value[0],
+    grpc.StatusCode.UNAVAILABLE.value[0],
+    grpc.StatusCode.UNAUTHENTICATED.value[0],
+}
+STATUS_NAMES = {status_code.value[0]: status_code.name for status_code in grpc.StatusCode}
+
+def estimate_size(value: Any) -> int:
+    """Approximate Firestore storage size of a value"""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, datetime)):
+        return 8
+    if isinstance(value, str):
+        return len(value.encode('utf-8')) + 1
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(str(k)) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    # Sentinels such as SERVER_TIMESTAMP and other small values
+    return 16
+
+class ChunkedWriteBatch:
+    """
+    A WriteBatch that splits itself at Firestore's commit limits.
+
+    Writes are collected and committed in as few batches as the limits
+    allow; a request that fits in one batch is committed atomically in a
+    single round-trip.
+    """
+
+    def __init__(self, db, max_writes: int = MAX_BATCH_WRITES, max_bytes: int = MAX_BATCH_BYTES):
+        self.db = db
+        self.max_writes = max_writes
+        self.max_bytes = max_bytes
+        self._batches = [db.batch()]
+        self._writes = 0
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return sum(len(batch) for batch in self._batches)
+
+    def set(self, ref, data: Dict[str, Any], merge: bool = False) -> 'ChunkedWriteBatch':
+        self._current(ref, data).set(ref, data, merge=merge)
+        return self
+
+    def update(self, ref, data: Dict[str, Any]) -> 'ChunkedWriteBatch':
+        self._current(ref, data).update(ref, data)
+        return self
+
+    def delete(self, ref) -> 'ChunkedWriteBatch':
+        self._current(ref, {}).delete(ref)
+        return self
+
+    def commit(self) -> List[Any]:
+        """Commit every chunk in order and return all write results"""
+        results = []
+        for batch in self._batches:
+            if len(batch):
+                results.extend(batch.commit())
+        self._batches = [self.db.batch()]
+        self._writes = 0
+        self._bytes = 0
+        return results
+
+    def _current(self, ref, data: Dict[str, Any]):
+        size = estimate_size(ref.path) + estimate_size(data)
+        if self._writes and (
+            self._writes + 1 > self.max_writes or self._bytes + size > self.max_bytes
+        ):
+            self._batches.append(self.db.batch())
+            self._writes = 0
+            self._bytes = 0
+        self._writes += 1
+        self._bytes += size
+        return self._batches[-1]
+
+class BulkWriteResult(NamedTuple):
+    """Outcome of one document written by bulk_set"""
+    document_id: str
+    success: bool
+    error: Optional[str] = None
+
+class _ReportingBulkWriter(BulkWriter):
+    """
+    BulkWriter that reports a failed batchWrite call per document.
+
+    BulkWriter only retries writes the server rejected individually; when
+    the whole request fails, its documents get no callback at all. Here the
+    request error becomes the status of every write in it, so those writes
+    go through the error callback and are retried or reported like the rest.
+
+    _send, _schedule_ready_retries, _enqueue_current_batch and _operations
+    are BulkWriter internals, so google-cloud-firestore is pinned to a
+    minor release in requirements.txt and a test checks they still exist.
+    """
+
+    def _send(self, batch) -> BatchWriteResponse:
+        try:
+            return super()._send(batch)
+        except Exception as e:
+            status_code = getattr(e, 'grpc_status_code', None) or grpc.StatusCode.UNKNOWN
+            return BatchWriteResponse(
+                write_results=[WriteResult() for _ in range(len(batch))],
+                status=[
+                    status_pb2.Status(code=status_code.value[0], message=str(e))
+                    for _ in range(len(batch))
+                ]
+            )
+
+    def send_pending(self) -> None:
+        """
+        Send the partial batch and the retries that are due, without waiting
+
+        Unlike flush, this does not block until retries still in backoff
+        have been resolved; they are picked up by a later call or as new
+        writes are added.
+        """
+        # Due retries rejoin the current batch, which is then sent
+        self._schedule_ready_retries()
+        if self._operations:
+            self._enqueue_current_batch()
+
+def bulk_set(
+    db,
+    writes: Iterable[Tuple[Any, Dict[str, Any]]],
+    merge: bool = False,
+    initial_ops_per_second: int = BULK_WRITE_INITIAL_OPS,
+    max_ops_per_second: int = BULK_WRITE_MAX_OPS,
+    max_pending: int = BULK_WRITE_MAX_PENDING,
+    max_attempts: int = BULK_WRITE_MAX_ATTEMPTS
+) -> Iterator[BulkWriteResult]:
+    """
+    Set many documents through a BulkWriter and yield each outcome.
+
+    writes is consumed lazily as (document reference, data) pairs and at
+    most max_pending of them are in flight, so memory stays flat however
+    long the input is. Results are yielded as the server confirms them, in
+    completion order. A write failing with a transient status is retried
+    with exponential backoff until max_attempts; other failures are yielded
+    straight away. Stopping early still commits what was submitted.
+    """
+    results: 'queue.Queue[BulkWriteResult]' = queue.Queue()
+    counts = {'successful': 0, 'failed': 0, 'retries': 0}
+    lock = threading.Lock()
+
+    def on_result(reference, write_result, writer) -> None:
+        results.put(BulkWriteResult(reference.id, True))
+
+    def on_error(failure, writer) -> bool:
+        reference = failure.operation.reference
+        if failure.code in RETRYABLE_WRITE_CODES and failure.attempts + 1 < max_attempts:
+            with lock:
+                counts['retries'] += 1
+            logger.warning("bulk_write_retry",
+                           document=reference.path,
+                           code=failure.code,
+                           attempt=failure.attempts + 1)
+            return True
+        name = STATUS_NAMES.get(failure.code, str(failure.code))
+        results.put(BulkWriteResult(reference.id, False, f"{name}: {failure.message}"))
+        return False
+
+    writer = _ReportingBulkWriter(db, BulkWriterOptions(
+        initial_ops_per_second=initial_ops_per_second,
+        max_ops_per_second=max(max_ops_per_second, initial_ops_per_second),
+        retry=BulkRetry.exponential
+    ))
+    writer.on_write_result(on_result)
+    writer.on_write_error(on_error)
+
+    def completed(result: BulkWriteResult) -> BulkWriteResult:
+        counts['successful' if result.success else 'failed'] += 1
+        return result
+
+    def next_result() -> BulkWriteResult:
+        while True:
+            try:
+                return results.get(timeout=BULK_WRITE_IDLE_SEND)
+            except queue.Empty:
+                # Partial batches and due retries are otherwise only sent
+                # when another batch fills up; retries still in backoff keep
+                # waiting without holding up the input
+                writer.send_pending()
+
+    start = time.monotonic()
+    pending = 0
+    try:
+        for reference, data in writes:
+            writer.set(reference, data, merge=merge)
+            pending += 1
+            while pending >= max_pending:
+                pending -= 1
+                yield completed(next_result())
+            while pending:
+                try:
+                    result = results.get_nowait()
+                except queue.Empty:
+                    break
+                pending -= 1
+                yield completed(result)
+
+        writer.flush()
+        while pending:
+            pending -= 1
+            yield completed(next_result())
+    finally:
+        writer.close()
+        elapsed = time.monotonic() - start
+        written = counts['successful'] + counts['failed']
+        logger.info("bulk_write_completed",
+                    **counts,
+                    seconds=round(elapsed, 2),
+                    docs_per_second=round(written / elapsed, 1) if elapsed else None)
@@ -0,0 +1,215 @@
+# app/services/image_jobs.py
+
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.datastructures import FileStorage
+from datetime import datetime, timezone
+from uuid import uuid4
+import os
+import threading
+import structlog
+from app.services.image_service import ImageService
+from app.services.registry import get_services
+from app.services.upload_spool import UploadSpool
+
+logger = structlog.get_logger(__name__)
+
+class ImageJobService:
+    """
+    Run property image uploads in the background.
+
+    The request thread only spools the uploaded files to disk and records a
+    job document; a process-wide worker pool then runs the normal
+    ImageService pipeline on the spooled copies. Job state lives in
+    Firestore (properties/{id}/image_jobs/{job_id}) so any gunicorn worker
+    can answer status requests, not only the one running the job.
+
+    The pool is in-process, so a job whose worker restarts is never
+    resumed; get_job reports it failed once it has gone STALE_AFTER seconds
+    without progress.
+    """
+
+    WORKERS = int(os.getenv('IMAGE_JOB_WORKERS', '2'))
+    STALE_AFTER = int(os.getenv('IMAGE_JOB_STALE_AFTER', '900'))
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self, image_service: Optional[ImageService] = None, db=None):
+        services = get_services()
+        self.db = db if db is not None else services.db
+        self.image_service = image_service or services.image_service
+        self.logger = logger.bind(service="image_jobs")
+
+    @classmethod
+    def _get_executor(cls) -> ThreadPoolExecutor:
+        with cls._executor_lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=cls.WORKERS,
+                    thread_name_prefix="image-job"
+                )
+            return cls._executor
+
+    def _job_ref(self, property_id: str, job_id: str):
+        return self.db.collection('properties').document(str(property_id))\
+                   .collection('image_jobs').document(job_id)
+
+    def submit(self, property_id: str, files: List[FileStorage]) -> Dict[str, Any]:
+        """Spool files, record a queued job and hand it to the worker pool"""
+        job_id = str(uuid4())
+        spool = UploadSpool(prefix=f"image-job-{job_id}-")
+
+        try:
+            for file in files:
+                if not file or not file.filename:
+                    continue
+
+                self.image_service.validate_file(file)
+
+                # content_length is often missing, so the limit is enforced
+                # on the bytes actually received
+                spool.add(file, self.image_service.MAX_FILE_SIZE)
+
+            if not spool.uploads:
+                raise ValueError("No valid files provided")
+
+            now = datetime.utcnow()
+            # Files are stored keyed by position so progress can update one
+            # entry through a files.N field path
+            job = {
+                'property_id': property_id,
+                'status': 'queued',
+                'total': len(spool.uploads),
+                'completed': 0,
+                'files': {
+                    str(position): {'filename': upload.filename, 'status': 'queued'}
+                    for position, upload in enumerate(spool.uploads)
+                },
+                'images': [],
+                'error': None,
+                'created_at': now,
+                'updated_at': now
+            }
+            self._job_ref(property_id, job_id).set(job)
+
+            # Snapshot before the worker starts mutating the job state
+            response = self._job_response(job_id, job)
+
+            self._get_executor().submit(self._run, property_id, job_id, spool, job)
+
+            self.logger.info("image_job_queued",
+                            property_id=property_id,
+                            job_id=job_id,
+                            files=len(spool.uploads))
+
+            return response
+
+        except Exception:
+            spool.cleanup()
+            raise
+
+    def get_job(self, property_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job document, or None if it does not exist"""
+        doc = self._job_ref(property_id, job_id).get()
+        if not doc.exists:
+            return None
+
+        job = self._job_response(doc.id, doc.to_dict())
+        if job['status'] in ('queued', 'processing') and self._is_stale(job.get('updated_at')):
+            # The worker running it went away; nothing will finish it
+            job['status'] = 'failed'
+            job['error'] = "Job stopped reporting progress"
+            for entry in job['files']:
+                if entry['status'] != 'completed':
+                    entry['status'] = 'failed'
+        return job
+
+    def _job_response(self, job_id: str, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Job document as returned by the API, with files as a list"""
+        files = job.get('files') or {}
+        if isinstance(files, dict):
+            files = [files[key] for key in sorted(files, key=int)]
+        return {'id': job_id, **job, 'files': [dict(entry) for entry in files]}
+
+    def _is_stale(self, updated_at: Optional[datetime]) -> bool:
+        if updated_at is None:
+            return False
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        age = datetime.now(timezone.utc) - updated_at
+        return age.total_seconds() > self.STALE_AFTER
+
+    def _run(
+        self,
+        property_id: str,
+        job_id: str,
+        spool: UploadSpool,
+        job: Dict[str, Any]
+    ) -> None:
+        """Worker entry point: process the spooled files and record progress"""
+        job_ref = self._job_ref(property_id, job_id)
+        lock = threading.Lock()
+
+        def on_progress(position: int, status: str, image: Optional[Dict[str, Any]]) -> None:
+            with lock:
+                entry = job['files'][str(position)]
+                entry['status'] = status
+                if image is not None:
+                    entry['image_id'] = image['id']
+                    job['completed'] += 1
+                    # Files complete together once stored; the final job
+                    # update records them in one write
+                    return
+                job_ref.update({
+                    f'files.{position}': dict(entry),
+                    'updated_at': datetime.utcnow()
+                })
+
+        try:
+            job_ref.update({'status': 'processing', 'updated_at': datetime.utcnow()})
+
+            images = self.image_service.process_property_images(
+                property_id,
+                spool.uploads,
+                on_progress=on_progress
+            )
+
+            job_ref.update({
+                'status': 'completed',
+                'completed': job['completed'],
+                'files': job['files'],
+                'images': images,
+                'updated_at': datetime.utcnow()
+            })
+
+            self.logger.info("image_job_completed",
+                            property_id=property_id,
+                            job_id=job_id,
+                            images=len(images))
+
+        except Exception as e:
+            self.logger.error("image_job_failed",
+                            property_id=property_id,
+                            job_id=job_id,
+                            error=str(e))
+            # Renditions are rolled back on failure, so only files that
+            # already have an image document count as done
+            with lock:
+                for entry in job['files'].values():
+                    if entry['status'] != 'completed':
+                        entry['status'] = 'failed'
+            try:
+                job_ref.update({
+                    'status': 'failed',
+                    'error': str(e),
+                    'files': job['files'],
+                    'updated_at': datetime.utcnow()
+                })
+            except Exception as update_error:
+                self.logger.error("image_job_status_update_failed",
+                                job_id=job_id,
+                                error=str(update_error))
+
+        finally:
+            spool.cleanup()
@@ -0,0 +1,341 @@
+# app/services/image_renditions.py
+
+from typing import List, Dict, Tuple, NamedTuple, Union, BinaryIO, Iterable, Iterator, Optional, Deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+from contextlib import contextmanager
+from PIL import Image
+import multiprocessing
+import threading
+import io
+import math
+import os
+import time
+
+# Raw bytes, a path to a spooled file or an open binary stream
+ImageInput = Union[bytes, str, BinaryIO]
+
+# Storage metadata and encoder settings per output format
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'AVIF': 'image/avif'}
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'AVIF': 'avif'}
+SAVE_OPTIONS = {
+    'JPEG': {'optimize': True},
+    'WEBP': {'method': 4},
+    'AVIF': {'speed': 6},
+}
+# AVIF reaches JPEG-like fidelity at a much lower quality setting
+QUALITY_OFFSETS = {'AVIF': -25}
+
+class RenditionSpec(NamedTuple):
+    """Target geometry and encoding settings for one rendition"""
+    key: str
+    size: Tuple[int, int]
+    quality: int
+    folder: str
+    square: bool = False
+
+class Rendition(NamedTuple):
+    """An encoded rendition ready for upload"""
+    key: str
+    format: str
+    data: bytes
+    width: int
+    height: int
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.format]
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.format]
+
+# Renditions of one upload: size key -> lower-case format -> rendition
+RenditionSet = Dict[str, Dict[str, Rendition]]
+
+def available_formats(formats: Iterable[str]) -> List[str]:
+    """Keep the formats this Pillow build can encode, in order"""
+    Image.init()
+    available = []
+    for fmt in formats:
+        fmt = fmt.strip().upper()
+        if fmt in CONTENT_TYPES and fmt in Image.SAVE and fmt not in available:
+            available.append(fmt)
+    return available
+
+def fit_size(size: Tuple[int, int], bounds: Tuple[int, int]) -> Tuple[int, int]:
+    """Size an image would have after Image.thumbnail(bounds), never upscaling"""
+    width, height = size
+    x, y = bounds
+    if x >= width and y >= height:
+        return width, height
+
+    # Same rounding as Image.thumbnail so output dimensions do not drift
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+def crop_to_square(image: Image.Image) -> Image.Image:
+    """Crop image to its centered square"""
+    width, height = image.size
+    new_size = min(width, height)
+    left = (width - new_size) // 2
+    top = (height - new_size) // 2
+    return image.crop((left, top, left + new_size, top + new_size))
+
+def center_crop(image: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
+    """Center crop image to match target aspect ratio"""
+    current_ratio = image.size[0] / image.size[1]
+    target_ratio = target_size[0] / target_size[1]
+
+    if current_ratio != target_ratio:
+        if current_ratio > target_ratio:
+            # Image is too wide
+            new_width = int(image.size[1] * target_ratio)
+            left = (image.size[0] - new_width) // 2
+            return image.crop((left, 0, left + new_width, image.size[1]))
+        else:
+            # Image is too tall
+            new_height = int(image.size[0] / target_ratio)
+            top = (image.size[1] - new_height) // 2
+            return image.crop((0, top, image.size[0], top + new_height))
+    return image
+
+@contextmanager
+def _timed(timings: Optional[Dict[str, float]], name: str):
+    """Add the wall time of the block to timings[name], if collecting"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+class RenditionEngine:
+    """
+    Build every rendition of an upload from a single decode.
+
+    The source is decoded once, using JPEG draft mode so the decoder scales
+    down in the DCT domain to the smallest size that still covers the
+    largest rendition. Renditions are then produced largest first, each one
+    resized from the previous (uncropped) result instead of from the full
+    resolution source, so the expensive resample only ever runs once on a
+    large image.
+    """
+
+    def __init__(
+        self,
+        specs: List[RenditionSpec],
+        output_format: str = 'JPEG',
+        extra_formats: Iterable[str] = ()
+    ):
+        # Largest first so every step can cascade from the one before it
+        self.specs = sorted(
+            specs,
+            key=lambda spec: spec.size[0] * spec.size[1],
+            reverse=True
+        )
+        self.output_format = output_format
+        # The primary format always comes first; extras are best effort
+        self.formats = [output_format] + [
+            fmt for fmt in available_formats(extra_formats) if fmt != output_format
+        ]
+
+    def render(
+        self,
+        source: ImageInput,
+        timings: Optional[Dict[str, float]] = None
+    ) -> RenditionSet:
+        """
+        Decode source once and return every size in every format
+
+        If timings is given, seconds spent per stage are added to it under
+        'decode', '<size>.resize' and '<size>.encode.<format>'.
+        """
+        try:
+            if isinstance(source, (bytes, bytearray)):
+                source = io.BytesIO(source)
+
+            with _timed(timings, 'decode'):
+                base, original_size = self._decode(source)
+            image = base
+            renditions = {}
+
+            for spec in self.specs:
+                # Target sizes are always derived from the original
+                # dimensions so cascading never changes the output geometry
+                if spec.square:
+                    # Thumbnails are cropped to a square before being fitted
+                    side = min(original_size)
+                    target = fit_size((side, side), spec.size)
+                    with _timed(timings, f'{spec.key}.resize'):
+                        working = crop_to_square(self._source_for(image, base, target))
+                        output = self._resize(working, target)
+                else:
+                    target = fit_size(original_size, spec.size)
+                    with _timed(timings, f'{spec.key}.resize'):
+                        fitted = self._resize(self._source_for(image, base, target), target)
+                        output = center_crop(fitted, spec.size)
+                    # Next (smaller) rendition starts from this one
+                    image = fitted
+                renditions[spec.key] = self._encode(spec, output, timings)
+
+            return {spec.key: renditions[spec.key] for spec in self.specs}
+
+        except Exception as e:
+            raise RuntimeError(f"Error processing image: {str(e)}")
+
+    def _decode(self, source: BinaryIO) -> Tuple[Image.Image, Tuple[int, int]]:
+        """Open source, decoding at reduced scale where the format allows it"""
+        image = Image.open(source)
+        original_size = image.size
+
+        # draft() is a no-op for non-JPEG sources; for JPEG it picks the
+        # largest 1/2, 1/4 or 1/8 scale that still covers the biggest target
+        largest = self.specs[0]
+        image.draft('RGB', fit_size(original_size, largest.size))
+
+        # Convert to RGB if necessary
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        else:
+            image.load()
+        return image, original_size
+
+    def _source_for(
+        self,
+        image: Image.Image,
+        base: Image.Image,
+        target: Tuple[int, int]
+    ) -> Image.Image:
+        """Use the cascaded image unless it is too small to cover target"""
+        if image.size[0] >= target[0] and image.size[1] >= target[1]:
+            return image
+        return base
+
+    def _resize(self, image: Image.Image, target: Tuple[int, int]) -> Image.Image:
+        """Resize to an exact target size, returning a new image"""
+        if target == image.size:
+            return image
+        return image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+    def _encode(
+        self,
+        spec: RenditionSpec,
+        image: Image.Image,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Rendition]:
+        """Encode one size in every configured format"""
+        encoded = {}
+        for fmt in self.formats:
+            with _timed(timings, f'{spec.key}.encode.{fmt.lower()}'):
+                encoded[fmt.lower()] = self.encode(spec, image, fmt)
+        return encoded
+
+    def encode(self, spec: RenditionSpec, image: Image.Image, fmt: str) -> Rendition:
+        """Save with compression"""
+        output = io.BytesIO()
+        quality = max(1, spec.quality + QUALITY_OFFSETS.get(fmt, 0))
+        image.save(output, format=fmt, quality=quality, **SAVE_OPTIONS.get(fmt, {}))
+        return Rendition(
+            key=spec.key,
+            format=fmt,
+            data=output.getvalue(),
+            width=image.size[0],
+            height=image.size[1]
+        )
+
+def _render_in_worker(engine: RenditionEngine, source: ImageInput) -> RenditionSet:
+    """Process pool entry point; must stay importable at module level"""
+    return engine.render(source)
+
+class InlineTranscoder:
+    """Render uploads one after another in the calling thread"""
+
+    def __init__(self, engine: RenditionEngine):
+        self.engine = engine
+
+    def map(self, sources: Iterable[ImageInput]) -> Iterator[RenditionSet]:
+        for source in sources:
+            yield self.engine.render(source)
+
+class ProcessPoolTranscoder:
+    """
+    Render uploads on a process pool shared by the whole worker process.
+
+    Sources are shipped to the pool as spooled file paths (or bytes), so the
+    workers read and decode the files themselves. Encoded renditions are
+    yielded back in submission order as soon as each one is ready. At most
+    ``window`` files are in flight at once so a large request cannot buffer
+    every encoded result in memory ahead of the uploads.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    def __init__(self, engine: RenditionEngine, max_workers: Optional[int] = None):
+        self.engine = engine
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.window = self.max_workers * 2
+
+    @classmethod
+    def _get_executor(cls, max_workers: int) -> ProcessPoolExecutor:
+        with cls._executor_lock:
+            if cls._executor is None:
+                # spawn: forking a threaded gunicorn worker is not safe
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return cls._executor
+
+    @classmethod
+    def _discard_executor(cls, executor: ProcessPoolExecutor) -> None:
+        with cls._executor_lock:
+            if cls._executor is executor:
+                cls._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def map(self, sources: Iterable[ImageInput]) -> Iterator[RenditionSet]:
+        executor = self._get_executor(self.max_workers)
+        in_flight: Deque[Future] = deque()
+        sources = iter(sources)
+
+        try:
+            for source in sources:
+                in_flight.append(executor.submit(_render_in_worker, self.engine, source))
+                if len(in_flight) >= self.window:
+                    yield in_flight.popleft().result()
+
+            while in_flight:
+                yield in_flight.popleft().result()
+
+        except BrokenProcessPool:
+            # A crashed worker poisons the pool; start a fresh one next time
+            self._discard_executor(executor)
+            raise RuntimeError("Image transcoding worker crashed")
+
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+def create_transcoder(
+    engine: RenditionEngine,
+    backend: str = 'inline',
+    max_workers: Optional[int] = None
+):
+    """Build the transcoder for the configured backend"""
+    if backend == 'process':
+        return ProcessPoolTranscoder(engine, max_workers)
+    if backend == 'inline':
+        return InlineTranscoder(engine)
+    raise ValueError(f"Unknown image transcode backend: {backend}")
@@ -1,13 +1,28 @@
 # app/services/image_service.py
 
-from typing import List, Dict, Any, Optional, Tuple
-from PIL import Image
-import io
+from typing import List, Dict, Any, Optional, Tuple, Callable, NamedTuple, Union
 import os
-from firebase_admin import storage, firestore
+from firebase_admin import firestore
 from uuid import uuid4
 from werkzeug.datastructures import FileStorage
 from datetime import datetime
+from app.services.image_renditions import RenditionEngine, RenditionSpec, RenditionSet, create_transcoder
+from app.services.rendition_uploader import UploadBatch
+from app.services.upload_spool import SpooledUpload, UploadSpool
+from app.services.firestore_batch import ChunkedWriteBatch
+from app.services.firebase import FirebaseService
+from app.services.image_source import ImageSource
+from app.services.registry import get_services
+
+# (position in the uploaded file list, status, image document or None)
+ProgressCallback = Callable[[int, str, Optional[Dict[str, Any]]], None]
+
+class IncomingImage(NamedTuple):
+    """A validated, spooled upload waiting to be processed"""
+    position: int
+    filename: str
+    path: str
+    content_hash: str
 
 class ImageService:
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
@@ -23,63 +38,196 @@ class ImageService:
     MEDIUM_QUALITY = 85
     LARGE_QUALITY = 90
 
-    def __init__(self):
-        self.bucket = storage.bucket()
-        self.db = firestore.client()
+    # Concurrent Storage uploads per request
+    UPLOAD_WORKERS = int(os.getenv('IMAGE_UPLOAD_WORKERS', '8'))
+
+    # Where decode/resize/encode runs: 'inline' or 'process'
+    TRANSCODE_BACKEND = os.getenv('IMAGE_TRANSCODE_BACKEND', 'inline')
+    TRANSCODE_WORKERS = int(os.getenv('IMAGE_TRANSCODE_WORKERS', '0')) or None
+
+    # Modern formats encoded next to the JPEG fallbacks (skipped if Pillow
+    # cannot encode them). AVIF is opt-in: it costs about eight times the
+    # CPU of WebP per upload, so enable it with the process backend
+    MODERN_FORMATS = [
+        fmt for fmt in os.getenv('IMAGE_MODERN_FORMATS', 'WEBP').split(',') if fmt.strip()
+    ]
+
+    # Content-hash deduplication: 'off', 'property' or 'global'
+    DEDUP_SCOPE = os.getenv('IMAGE_DEDUP_SCOPE', 'property')
+
+    def __init__(
+        self,
+        bucket=None,
+        db=None,
+        image_source: Optional[ImageSource] = None,
+        firebase: Optional[FirebaseService] = None
+    ):
+        services = get_services()
+        self.bucket = bucket if bucket is not None else services.bucket
+        self.db = db if db is not None else services.db
+        # Told about freshly stored renditions so later reads skip Storage
+        self.image_source = image_source
+        # Told about property documents written here, so its cache drops them
+        self.firebase = firebase
         self.output_format = 'JPEG'
+        self.rendition_engine = RenditionEngine([
+            RenditionSpec('thumbnail', self.THUMBNAIL_SIZE, self.THUMBNAIL_QUALITY, 'thumbnails', square=True),
+            RenditionSpec('medium', self.MEDIUM_SIZE, self.MEDIUM_QUALITY, 'medium'),
+            RenditionSpec('large', self.LARGE_SIZE, self.LARGE_QUALITY, 'large')
+        ], self.output_format, self.MODERN_FORMATS)
+        self.transcoder = create_transcoder(
+            self.rendition_engine,
+            self.TRANSCODE_BACKEND,
+            self.TRANSCODE_WORKERS
+        )
 
     def allowed_file(self, filename: str) -> bool:
         """Check if file extension is allowed"""
         return '.' in filename and \
             filename.rsplit('.', 1)[1].lower() in self.ALLOWED_EXTENSIONS
 
+    def validate_file(
+        self,
+        file: Union[FileStorage, SpooledUpload],
+        size: Optional[int] = None
+    ) -> None:
+        """Raise ValueError if an upload may not be processed"""
+        if not self.allowed_file(file.filename):
+            raise ValueError(f"Invalid file type for {file.filename}")
+
+        size = size if size is not None else getattr(file, 'content_length', None)
+        if size and size > self.MAX_FILE_SIZE:
+            raise ValueError(f"File {file.filename} exceeds maximum size")
+
     def process_property_images(
         self, 
         property_id: str, 
-        files: List[FileStorage]
+        files: List[Union[FileStorage, SpooledUpload]],
+        on_progress: Optional[ProgressCallback] = None
     ) -> List[Dict[str, Any]]:
-        """Process multiple images for a property"""
+        """
+        Process multiple images for a property
+
+        files may be request uploads or files already spooled to disk.
+        on_progress, if given, is called with the file's position in files,
+        its new status ('processed' once encoded, 'completed' once stored)
+        and, on completion, the image document.
+        """
+        spool = UploadSpool()
         try:
-            next_number = self._get_next_image_number(property_id)
-            processed_images = []
+            # Validate and spool every file before any processing starts
+            incoming = self._spool_uploads(files, spool)
 
-            for index, file in enumerate(files, start=next_number):
-                # Validate file
-                if not file or not file.filename:
+            # Exact re-uploads reuse what is already stored
+            known = self._find_duplicates(property_id, {item.content_hash for item in incoming})
+
+            images: Dict[str, Dict[str, Any]] = {}   # content hash -> image
+            to_transcode: List[IncomingImage] = []
+            to_copy: List[Tuple[IncomingImage, Dict[str, Any]]] = []
+            for item in incoming:
+                if item.content_hash in images:
                     continue
+                existing = known.get(item.content_hash)
+                if existing is None:
+                    images[item.content_hash] = None
+                    to_transcode.append(item)
+                elif existing['property_id'] == property_id:
+                    images[item.content_hash] = {**existing['image'], 'duplicate': True}
+                else:
+                    images[item.content_hash] = None
+                    to_copy.append((item, existing))
+
+            # Only images that get a new document consume a number
+            numbered = sorted(
+                to_transcode + [item for item, _ in to_copy],
+                key=lambda item: item.position
+            )
+            numbers = {}
+            next_number = None
+            if numbered:
+                next_number = self._allocate_image_numbers(property_id, len(numbered))
+                for offset, item in enumerate(numbered):
+                    numbers[item.position] = next_number + offset
+
+            new_images = []
+
+            with UploadBatch(self.bucket, self.UPLOAD_WORKERS) as uploads:
+                # Renditions come back in upload order, so numbering is stable
+                results = self.transcoder.map([item.path for item in to_transcode])
+                for item, renditions in zip(to_transcode, results):
+                    index = numbers[item.position]
+
+                    # Generate standardized filename
+                    filename = f"{property_id}-{str(index).zfill(2)}.jpg"
                     
-                if not self.allowed_file(file.filename):
-                    raise ValueError(f"Invalid file type for {file.filename}")
+                    # Queue every size and format for upload
+                    urls, srcset = self._upload_renditions(uploads, property_id, filename, renditions)
                     
-                if file.content_length and file.content_length > self.MAX_FILE_SIZE:
-                    raise ValueError(f"File {file.filename} exceeds maximum size")
+                    image = self._new_image_data(urls, filename, index, item.content_hash)
+                    image['srcset'] = srcset
+                    images[item.content_hash] = image
+                    new_images.append(image)
 
-                # Read file data
-                file_data = file.read()
-                
-                # Generate standardized filename
-                filename = f"{property_id}-{str(index).zfill(2)}.jpg"
-                
-                # Process image in different sizes and upload
-                urls = self._process_and_upload_images(property_id, filename, file_data)
-                
-                # Create image metadata document
-                image_id = str(uuid4())
-                image_ref = self.db.collection('properties').document(property_id)\
-                               .collection('images').document(image_id)
-                
-                image_data = {
-                    'urls': urls,
-                    'filename': filename,
-                    'title': '',
-                    'description': '',
-                    'order': index,
-                    'created_at': datetime.utcnow(),
-                    'updated_at': datetime.utcnow()
-                }
-                
-                image_ref.set(image_data)
-                processed_images.append({'id': image_id, **image_data})
+                    if on_progress:
+                        on_progress(item.position, 'processed', None)
+
+                # Every rendition must be stored before any document points at it
+                uploads.wait()
+
+                # Generations let readers find cached renditions without a
+                # metadata request
+                for image in new_images:
+                    for sizes in image['srcset'].values():
+                        for entry in sizes.values():
+                            entry['generation'] = uploads.generations.get(entry['url'])
+
+                # Images from other properties share their stored renditions
+                for item, existing in to_copy:
+                    index = numbers[item.position]
+                    source = existing['image']
+                    image = self._new_image_data(
+                        source['urls'],
+                        f"{property_id}-{str(index).zfill(2)}.jpg",
+                        index,
+                        item.content_hash
+                    )
+                    image['title'] = source.get('title', '')
+                    image['description'] = source.get('description', '')
+                    if 'srcset' in source:
+                        image['srcset'] = source['srcset']
+                    image['source'] = {
+                        'property_id': existing['property_id'],
+                        'image_id': source['id']
+                    }
+                    images[item.content_hash] = image
+                    new_images.append(image)
+
+                # Image documents, hash index entries and the property's media
+                # update all go out in one batched commit
+                property_ref = self.db.collection('properties').document(property_id)
+                batch = ChunkedWriteBatch(self.db)
+                for image in new_images:
+                    image_data = {k: v for k, v in image.items() if k != 'id'}
+                    batch.set(property_ref.collection('images').document(image['id']), image_data)
+                    self._index_image(batch, property_id, image)
+
+                if new_images and next_number == 1:
+                    # First images of the property: feature the first one
+                    first = min(new_images, key=lambda image: image['order'])
+                    batch.set(property_ref, {'media': {'feature_image_id': first['id']}}, merge=True)
+
+                # Committed inside the upload batch so a failed commit deletes
+                # the renditions stored above instead of orphaning them
+                batch.commit()
+                if new_images and next_number == 1 and self.firebase is not None:
+                    self.firebase.invalidate_property(property_id)
+
+            processed_images = []
+            for item in incoming:
+                image = images[item.content_hash]
+                processed_images.append(image)
+                if on_progress:
+                    on_progress(item.position, 'completed', image)
                 
             return processed_images
             
@@ -87,103 +235,178 @@ class ImageService:
             # Log error here
             raise RuntimeError(f"Error processing images: {str(e)}")
 
-    def _process_and_upload_images(
+        finally:
+            spool.cleanup()
+
+    def _spool_uploads(
+        self,
+        files: List[Union[FileStorage, SpooledUpload]],
+        spool: UploadSpool
+    ) -> List[IncomingImage]:
+        """Validate uploads and stream them to disk, hashing as they arrive"""
+        incoming = []
+        for position, file in enumerate(files):
+            if not file or not file.filename:
+                continue
+                
+            if isinstance(file, SpooledUpload):
+                self.validate_file(file, size=file.size)
+                upload = file
+            else:
+                self.validate_file(file)
+                # The size limit is enforced on the bytes actually received
+                upload = spool.add(file, self.MAX_FILE_SIZE)
+
+            incoming.append(IncomingImage(
+                position=position,
+                filename=upload.filename,
+                path=upload.path,
+                content_hash=upload.content_hash
+            ))
+        return incoming
+
+    def _new_image_data(
+        self,
+        urls: Dict[str, str],
+        filename: str,
+        index: int,
+        content_hash: str
+    ) -> Dict[str, Any]:
+        """Build a new image document"""
+        return {
+            'id': str(uuid4()),
+            'urls': urls,
+            'filename': filename,
+            'title': '',
+            'description': '',
+            'order': index,
+            'content_hash': content_hash,
+            'created_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow()
+        }
+
+    def _find_duplicates(self, property_id: str, hashes: set) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up already stored images by content hash.
+
+        Returns {hash: {'property_id': ..., 'image': image document}}. Hits in
+        this property win over hits in other properties.
+        """
+        if self.DEDUP_SCOPE not in ('property', 'global') or not hashes:
+            return {}
+
+        hashes = sorted(hashes)
+        property_ref = self.db.collection('properties').document(property_id)
+        lookups = [
+            (h, property_ref.collection('image_hashes').document(h))
+            for h in hashes
+        ]
+        if self.DEDUP_SCOPE == 'global':
+            lookups += [(h, self.db.collection('image_hashes').document(h)) for h in hashes]
+
+        # One round-trip for every index entry, then one for the images
+        entries = {
+            snapshot.reference.path: snapshot.to_dict()
+            for snapshot in self.db.get_all([ref for _, ref in lookups])
+            if snapshot.exists
+        }
+
+        matches = {}
+        for content_hash, ref in lookups:
+            entry = entries.get(ref.path)
+            if entry is None or content_hash in matches:
+                continue
+            owner = entry.get('property_id', property_id)
+            matches[content_hash] = (
+                owner,
+                self.db.collection('properties').document(owner)
+                    .collection('images').document(entry['image_id'])
+            )
+
+        if not matches:
+            return {}
+
+        found = {
+            snapshot.reference.path: {'id': snapshot.id, **snapshot.to_dict()}
+            for snapshot in self.db.get_all([ref for _, ref in matches.values()])
+            if snapshot.exists
+        }
+
+        duplicates = {}
+        for content_hash, (owner, image_ref) in matches.items():
+            image = found.get(image_ref.path)
+            if image is not None:
+                duplicates[content_hash] = {'property_id': owner, 'image': image}
+        return duplicates
+
+    def _index_image(
+        self,
+        batch: ChunkedWriteBatch,
+        property_id: str,
+        image: Dict[str, Any]
+    ) -> None:
+        """Record an image's content hash in the dedup indexes"""
+        if self.DEDUP_SCOPE not in ('property', 'global'):
+            return
+
+        entry = {'image_id': image['id'], 'created_at': image['created_at']}
+        batch.set(
+            self.db.collection('properties').document(property_id)
+                .collection('image_hashes').document(image['content_hash']),
+            entry
+        )
+
+        if self.DEDUP_SCOPE == 'global' and 'source' not in image:
+            batch.set(
+                self.db.collection('image_hashes').document(image['content_hash']),
+                {**entry, 'property_id': property_id}
+            )
+
+    def _upload_renditions(
         self, 
+        uploads: UploadBatch,
         property_id: str, 
         filename: str, 
-        file_data: bytes
-    ) -> Dict[str, str]:
-        """Process and upload image in different sizes"""
+        renditions: RenditionSet
+    ) -> Tuple[Dict[str, str], Dict[str, Dict[str, Dict[str, Any]]]]:
+        """
+        Queue each rendition of an image for upload
+
+        Returns the primary-format URL per size (the image's 'urls') and the
+        per-format srcset metadata: {format: {size: {url, width, height, bytes}}}.
+        """
         urls = {}
-        sizes = {
-            'thumbnail': (self.THUMBNAIL_SIZE, self.THUMBNAIL_QUALITY, 'thumbnails'),
-            'medium': (self.MEDIUM_SIZE, self.MEDIUM_QUALITY, 'medium'),
-            'large': (self.LARGE_SIZE, self.LARGE_QUALITY, 'large')
-        }
+        srcset = {}
+        stem = filename.rsplit('.', 1)[0]
 
-        for size_key, (dimensions, quality, folder) in sizes.items():
-            # Process image for current size
-            processed_image = self._process_image(file_data, dimensions, quality)
-            
-            # Upload to Firebase Storage
-            image_path = f"properties/{property_id}/{folder}/{filename}"
-            blob = self.bucket.blob(image_path)
-            blob.upload_from_string(processed_image, content_type='image/jpeg')
-            
-            # Set cache control based on size
-            cache_time = self._get_cache_control_time(size_key)
-            blob.cache_control = f'public, max-age={cache_time}'
-            blob.patch()
-            
-            # Store URL
-            urls[size_key] = blob.public_url
-            
-        return urls
+        for spec in self.rendition_engine.specs:
+            # Cache control is sent with the upload instead of a separate patch
+            cache_time = self._get_cache_control_time(spec.key)
 
-    def _process_image(
-        self, 
-        file_data: bytes, 
-        size: Tuple[int, int], 
-        quality: int
-    ) -> bytes:
-        """Process a single image to specific size"""
-        try:
-            image = Image.open(io.BytesIO(file_data))
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # For thumbnails, we crop to square first
-            if size == self.THUMBNAIL_SIZE:
-                image = self._crop_to_square(image)
-            
-            # Resize maintaining aspect ratio
-            image.thumbnail(size, Image.Resampling.LANCZOS)
-            
-            # Center crop if aspect ratio doesn't match (except for thumbnails)
-            if size != self.THUMBNAIL_SIZE:
-                image = self._center_crop(image, size)
-            
-            # Save with compression
-            output = io.BytesIO()
-            image.save(output, format=self.output_format, quality=quality, optimize=True)
-            return output.getvalue()
+            for fmt, rendition in renditions[spec.key].items():
+                image_path = f"properties/{property_id}/{spec.folder}/{stem}.{rendition.extension}"
+                # Primary-format bytes go to the rendition cache as each
+                # upload lands, so later AI reads skip Storage
+                on_stored = None
+                if self.image_source is not None and rendition.format == self.output_format:
+                    on_stored = self.image_source.remember
+                url = uploads.submit(
+                    image_path,
+                    rendition.data,
+                    content_type=rendition.content_type,
+                    cache_control=f'public, max-age={cache_time}',
+                    on_stored=on_stored
+                )
+                srcset.setdefault(fmt, {})[spec.key] = {
+                    'url': url,
+                    'width': rendition.width,
+                    'height': rendition.height,
+                    'bytes': len(rendition.data)
+                }
+                if rendition.format == self.output_format:
+                    urls[spec.key] = url
             
-        except Exception as e:
-            raise RuntimeError(f"Error processing image: {str(e)}")
-
-    def _crop_to_square(self, image: Image.Image) -> Image.Image:
-        """Crop image to square for thumbnail"""
-        width, height = image.size
-        new_size = min(width, height)
-        left = (width - new_size) // 2
-        top = (height - new_size) // 2
-        right = left + new_size
-        bottom = top + new_size
-        return image.crop((left, top, right, bottom))
-
-    def _center_crop(
-        self, 
-        image: Image.Image, 
-        target_size: Tuple[int, int]
-    ) -> Image.Image:
-        """Center crop image to match target aspect ratio"""
-        current_ratio = image.size[0] / image.size[1]
-        target_ratio = target_size[0] / target_size[1]
-        
-        if current_ratio != target_ratio:
-            if current_ratio > target_ratio:
-                # Image is too wide
-                new_width = int(image.size[1] * target_ratio)
-                left = (image.size[0] - new_width) // 2
-                return image.crop((left, 0, left + new_width, image.size[1]))
-            else:
-                # Image is too tall
-                new_height = int(image.size[0] / target_ratio)
-                top = (image.size[1] - new_height) // 2
-                return image.crop((0, top, image.size[0], top + new_height))
-        return image
+        return urls, srcset
 
     def _get_cache_control_time(self, size_key: str) -> int:
         """Get cache control time based on image size"""
@@ -194,16 +417,44 @@ class ImageService:
         }
         return cache_times.get(size_key, 86400)
 
+    def _allocate_image_numbers(self, property_id: str, count: int) -> int:
+        """
+        Reserve count consecutive image numbers and return the first one.
+
+        Numbers come from a counter document per property, updated in a
+        transaction, so concurrent uploads to one property never receive the
+        same numbers and an upload costs one small write instead of a query.
+        """
+        counter_ref = self.db.collection('properties').document(property_id)\
+                        .collection('counters').document('images')
+
+        @firestore.transactional
+        def allocate(transaction) -> int:
+            snapshot = counter_ref.get(transaction=transaction)
+            if snapshot.exists:
+                start = snapshot.get('next_number')
+            else:
+                # First upload since the counter was introduced
+                start = self._get_next_image_number(property_id)
+
+            transaction.set(counter_ref, {
+                'next_number': start + count,
+                'updated_at': firestore.SERVER_TIMESTAMP
+            })
+            return start
+
+        return allocate(self.db.transaction())
+
     def _get_next_image_number(self, property_id: str) -> int:
-        """Get the next available image number for a property"""
+        """Derive the next image number from existing images (counter bootstrap)"""
         images_ref = self.db.collection('properties').document(property_id)\
                         .collection('images')
-        images = images_ref.order_by('filename', direction=firestore.Query.DESCENDING)\
-                          .limit(1).get()
+        images = list(images_ref.order_by('filename', direction=firestore.Query.DESCENDING)\
+                          .limit(1).get())
         
-        if not images or len(list(images)) == 0:
+        if not images:
             return 1
             
-        last_filename = list(images)[0].get('filename')
+        last_filename = images[0].get('filename')
         last_number = int(last_filename.split('-')[1].split('.')[0])
         return last_number + 1
\ No newline at end of file
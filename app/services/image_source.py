@@ -0,0 +1,149 @@
+# app/services/image_source.py
+
+from typing import Optional
+from collections import OrderedDict
+from urllib.parse import urlparse, unquote
+import os
+import tempfile
+import threading
+import structlog
+from google.cloud.storage.retry import DEFAULT_RETRY
+from app.services.disk_cache import CacheStats, DiskCache
+
+logger = structlog.get_logger(__name__)
+
+# Seconds to wait for Storage on each read (connect, then response)
+READ_TIMEOUT = float(os.getenv('IMAGE_READ_TIMEOUT', '30'))
+CONNECT_TIMEOUT = min(READ_TIMEOUT, 10.0)
+
+# Rendition cache in front of Storage reads: 'disk', 'memory' or 'off'
+RENDITION_CACHE = os.getenv('IMAGE_RENDITION_CACHE', 'disk')
+
+# Process-local rendition cache size
+MEMORY_CACHE_BYTES = int(os.getenv('IMAGE_MEMORY_CACHE_MB', '64')) * 1024 * 1024
+
+# Host-wide rendition cache shared by all worker processes
+DISK_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'rendition-cache')
+DISK_CACHE_BYTES = int(os.getenv('IMAGE_DISK_CACHE_MB', '512')) * 1024 * 1024
+
+class MemoryRenditionCache:
+    """Thread-safe LRU of rendition bytes keyed by storage path and generation"""
+
+    def __init__(self, max_bytes: int = MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str, generation: Optional[int]) -> Optional[bytes]:
+        key = f"{path}#{generation}"
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+        self.stats.record(data is not None)
+        return data
+
+    def put(self, path: str, generation: Optional[int], data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        key = f"{path}#{generation}"
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+class DiskRenditionCache(DiskCache):
+    """
+    Rendition bytes on local disk, keyed by storage path and object
+    generation so a replaced object is never served from the cache
+    """
+
+    def __init__(self, directory: str = DISK_CACHE_DIR, max_bytes: int = DISK_CACHE_BYTES):
+        super().__init__(directory, max_bytes, name="rendition_cache")
+
+    def get(self, path: str, generation: Optional[int]) -> Optional[bytes]:
+        return super().get(f"{path}#{generation}")
+
+    def put(self, path: str, generation: Optional[int], data: bytes) -> None:
+        super().put(f"{path}#{generation}", data)
+
+def create_rendition_cache(kind: str = RENDITION_CACHE):
+    """Build the configured rendition cache, or None when caching is off"""
+    if kind == 'disk' and DISK_CACHE_BYTES > 0:
+        return DiskRenditionCache()
+    if kind == 'memory' and MEMORY_CACHE_BYTES > 0:
+        return MemoryRenditionCache()
+    return None
+
+class ImageSource:
+    """
+    Read stored renditions straight from the bucket.
+
+    Blobs are downloaded by storage path over the bucket client's pooled
+    session, with timeouts and the Storage library's retry policy for
+    idempotent reads, so no signed URL or separate HTTP client is needed.
+
+    Reads go through an optional cache keyed by storage path and object
+    generation. Image documents record each rendition's generation, so a
+    cached rendition is served with no network at all; without one, a
+    metadata request finds the current generation first. Renditions the
+    upload path already has in memory can be handed to remember().
+    """
+
+    def __init__(self, bucket, cache=None, timeout: float = READ_TIMEOUT):
+        self.bucket = bucket
+        self.cache = cache
+        self.timeout = (min(timeout, CONNECT_TIMEOUT), timeout)
+        self.logger = logger.bind(service="image_source")
+
+    def storage_path(self, url_or_path: str) -> str:
+        """Storage path of a blob given its public URL or the path itself"""
+        if not url_or_path.startswith(('https://', 'http://')):
+            return url_or_path
+
+        # https://storage.googleapis.com/<bucket>/<path>
+        path = unquote(urlparse(url_or_path).path).lstrip('/')
+        prefix = f"{self.bucket.name}/"
+        if not path.startswith(prefix):
+            raise ValueError(f"URL is not in bucket {self.bucket.name}: {url_or_path}")
+        return path[len(prefix):]
+
+    def read(self, url_or_path: str, generation: Optional[int] = None) -> bytes:
+        """Return a rendition's bytes, from the cache when possible"""
+        path = self.storage_path(url_or_path)
+
+        if self.cache is not None:
+            if generation is None:
+                blob = self.bucket.blob(path)
+                blob.reload(timeout=self.timeout, retry=DEFAULT_RETRY)
+                generation = blob.generation
+
+            data = self.cache.get(path, generation)
+            if data is not None:
+                self.logger.info("image_source_cache_hit",
+                                storage_path=path,
+                                bytes=len(data),
+                                **self.cache.stats.to_dict())
+                return data
+
+        blob = self.bucket.blob(path, generation=generation)
+        data = blob.download_as_bytes(timeout=self.timeout, retry=DEFAULT_RETRY)
+
+        stats = self.cache.stats.to_dict() if self.cache is not None else {}
+        self.logger.info("image_source_downloaded", storage_path=path, bytes=len(data), **stats)
+
+        if self.cache is not None:
+            self.cache.put(path, generation or blob.generation, data)
+        return data
+
+    def remember(self, url_or_path: str, data: bytes, generation: Optional[int] = None) -> None:
+        """Keep bytes that were just uploaded so the next read skips Storage"""
+        if self.cache is not None and generation is not None:
+            self.cache.put(self.storage_path(url_or_path), generation, data)
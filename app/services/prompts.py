@@ -0,0 +1,143 @@
+# app/services/prompts.py
+
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from collections import OrderedDict
+from string import Template
+import json
+import os
+import threading
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+PROMPT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prompts')
+
+# Template version in use per prompt; files are named <name>.<version>.txt
+PROMPT_VERSIONS = {
+    'image_caption': 'v1',
+    'property_copy': 'v1',
+}
+
+# How prompt tokens are counted: 'estimate' (offline), 'api' (the model's
+# count_tokens endpoint, one extra request per distinct prompt) or 'off'
+TOKEN_COUNT = os.getenv('AI_TOKEN_COUNT', 'estimate')
+CHARS_PER_TOKEN = 4
+
+class PromptTemplate(NamedTuple):
+    """A compiled prompt template and the placeholders it requires"""
+    name: str
+    version: str
+    template: Template
+    fields: frozenset
+
+    @property
+    def id(self) -> str:
+        return f"{self.name}.{self.version}"
+
+    def render(self, **values: Any) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise ValueError(f"Prompt {self.id} is missing values: {sorted(missing)}")
+        return self.template.substitute(values)
+
+def _placeholders(template: Template) -> Optional[frozenset]:
+    """Placeholder names in a template, or None if one is malformed"""
+    # Template.get_identifiers()/is_valid() need Python 3.11
+    names = set()
+    for match in template.pattern.finditer(template.template):
+        if match.group('invalid') is not None:
+            return None
+        name = match.group('named') or match.group('braced')
+        if name is not None:
+            names.add(name)
+    return frozenset(names)
+
+class PromptLibrary:
+    """
+    Prompt templates read and compiled once per process.
+
+    Each prompt is a text file with $placeholders, versioned in its file
+    name, so a wording change ships as a new file and PROMPT_VERSIONS picks
+    the one in use. Missing files or malformed placeholders fail at load
+    time, which create_app triggers, rather than on the first request
+    that needs them.
+    """
+
+    def __init__(self, directory: str = PROMPT_DIR, versions: Optional[Dict[str, str]] = None):
+        self.templates: Dict[str, PromptTemplate] = {}
+        for name, version in (versions or PROMPT_VERSIONS).items():
+            path = os.path.join(directory, f"{name}.{version}.txt")
+            with open(path, encoding='utf-8') as f:
+                template = Template(f.read().strip())
+            fields = _placeholders(template)
+            if fields is None:
+                raise ValueError(f"Invalid placeholder in prompt template {path}")
+            self.templates[name] = PromptTemplate(
+                name=name,
+                version=version,
+                template=template,
+                fields=fields
+            )
+        logger.info("prompt_templates_loaded",
+                    templates=[template.id for template in self.templates.values()])
+
+    def render(self, name: str, **values: Any) -> str:
+        return self.templates[name].render(**values)
+
+    def version(self, name: str) -> str:
+        return self.templates[name].id
+
+def compact_json(value: Any) -> str:
+    """JSON without indentation or spaces after separators, for prompts"""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+class TokenCounter:
+    """
+    Prompt token counts, from the model's count_tokens API or an estimate.
+
+    API counts are remembered per prompt text, so a prompt reused across a
+    bulk request is only counted once; if the API call fails the offline
+    estimate is used instead.
+    """
+
+    MAX_REMEMBERED = 256
+
+    def __init__(self, client, model: str, mode: str = TOKEN_COUNT):
+        self.client = client
+        self.model = model
+        self.mode = mode
+        self._counts: 'OrderedDict[str, int]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.logger = logger.bind(service="token_counter")
+
+    @staticmethod
+    def estimate(text: str) -> int:
+        """Offline estimate: about four characters per token for English text"""
+        return -(-len(text) // CHARS_PER_TOKEN)
+
+    def count(self, text: str) -> Tuple[Optional[int], str]:
+        """Tokens in text and where the number came from"""
+        if self.mode == 'off':
+            return None, 'off'
+        if self.mode != 'api':
+            return self.estimate(text), 'estimate'
+
+        with self._lock:
+            tokens = self._counts.get(text)
+            if tokens is not None:
+                self._counts.move_to_end(text)
+                return tokens, 'api'
+
+        try:
+            tokens = self.client.models.count_tokens(model=self.model, contents=text).total_tokens
+        except Exception as e:
+            self.logger.warning("token_count_failed", error=str(e))
+            tokens = None
+        if tokens is None:
+            return self.estimate(text), 'estimate'
+
+        with self._lock:
+            self._counts[text] = tokens
+            while len(self._counts) > self.MAX_REMEMBERED:
+                self._counts.popitem(last=False)
+        return tokens, 'api'
@@ -0,0 +1,206 @@
+# app/services/registry.py
+
+from typing import Any, Callable, Dict, Optional
+from flask import Flask, current_app, has_app_context
+import os
+import threading
+import weakref
+import structlog
+import firebase_admin
+
+logger = structlog.get_logger(__name__)
+
+# Connections kept open per host for Storage; image uploads fan out across
+# several threads per request, so the requests default of 10 is too small
+STORAGE_POOL_SIZE = int(os.getenv('STORAGE_POOL_SIZE', '32'))
+
+_registries: 'weakref.WeakSet[ServiceRegistry]' = weakref.WeakSet()
+
+class ServiceRegistry:
+    """
+    Process-wide shared clients and services.
+
+    Every instance is created lazily on first use and then shared by all
+    requests and threads: the Firestore client (gRPC channel), the Storage
+    client (pooled HTTPS session), the genai client and the services built
+    on them. None of these are safe to use across fork(), so a child
+    process drops everything it inherited and builds its own on demand;
+    with gunicorn --preload the master never needs a client at all.
+    """
+
+    def __init__(self, firebase_app: Optional[firebase_admin.App] = None):
+        self._firebase_app = firebase_app
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        _registries.add(self)
+
+    def init_app(self, app: Flask) -> 'ServiceRegistry':
+        app.extensions['services'] = self
+        return self
+
+    def reset(self) -> None:
+        """Forget every instance; the next access builds fresh ones"""
+        # A lock held by another thread at fork time is never released in
+        # the child, so the lock is replaced rather than acquired
+        self._lock = threading.RLock()
+        self._instances = {}
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                self._instances[name] = factory()
+                logger.info("service_created", service=name, pid=os.getpid())
+            return self._instances[name]
+
+    @property
+    def firebase_app(self) -> firebase_admin.App:
+        return self._firebase_app or firebase_admin.get_app()
+
+    @property
+    def db(self):
+        """Shared Firestore client"""
+        def create():
+            from google.cloud import firestore
+            app = self.firebase_app
+            return firestore.Client(
+                credentials=app.credential.get_credential(),
+                project=app.project_id
+            )
+        return self._get('db', create)
+
+    @property
+    def bucket(self):
+        """Default Storage bucket on a shared, pooled HTTPS session"""
+        def create():
+            from google.auth.transport.requests import AuthorizedSession
+            from google.cloud import storage
+            from requests.adapters import HTTPAdapter
+
+            app = self.firebase_app
+            credentials = app.credential.get_credential()
+            session = AuthorizedSession(credentials)
+            adapter = HTTPAdapter(
+                pool_connections=STORAGE_POOL_SIZE,
+                pool_maxsize=STORAGE_POOL_SIZE
+            )
+            session.mount('https://', adapter)
+
+            client = storage.Client(
+                credentials=credentials,
+                project=app.project_id,
+                _http=session
+            )
+            return client.bucket(app.options.get('storageBucket'))
+        return self._get('bucket', create)
+
+    @property
+    def genai_client(self):
+        """Shared Gemini client; its HTTP connection pool is thread-safe"""
+        def create():
+            from google import genai
+            return genai.Client(api_key=os.getenv('GOOGLE_AI_API_KEY'))
+        return self._get('genai_client', create)
+
+    @property
+    def image_source(self):
+        """Rendition reads from the bucket through the configured cache"""
+        def create():
+            from app.services.image_source import ImageSource, create_rendition_cache
+            return ImageSource(self.bucket, cache=create_rendition_cache())
+        return self._get('image_source', create)
+
+    @property
+    def ai_response_cache(self):
+        """Generated responses by content hash; None when disabled"""
+        def create():
+            from app.services.ai_cache import create_response_cache
+            return create_response_cache()
+        return self._get('ai_response_cache', create)
+
+    @property
+    def ai_limiter(self):
+        """Gemini quota and adaptive concurrency, shared by every AI call"""
+        def create():
+            from app.services.ai_limits import GenerationLimiter
+            return GenerationLimiter()
+        return self._get('ai_limiter', create)
+
+    @property
+    def prompts(self):
+        """Prompt templates, compiled once per process"""
+        def create():
+            from app.services.prompts import PromptLibrary
+            return PromptLibrary()
+        return self._get('prompts', create)
+
+    @property
+    def firebase(self):
+        def create():
+            from app.services.firebase import FirebaseService
+            return FirebaseService(db=self.db, bucket=self.bucket)
+        return self._get('firebase', create)
+
+    @property
+    def ai_service(self):
+        def create():
+            from app.services.ai_service import AIService
+            return AIService(
+                client=self.genai_client,
+                firebase=self.firebase,
+                image_source=self.image_source,
+                response_cache=self.ai_response_cache,
+                limiter=self.ai_limiter,
+                prompts=self.prompts
+            )
+        return self._get('ai_service', create)
+
+    @property
+    def image_service(self):
+        def create():
+            from app.services.image_service import ImageService
+            return ImageService(
+                bucket=self.bucket,
+                db=self.db,
+                image_source=self.image_source,
+                firebase=self.firebase
+            )
+        return self._get('image_service', create)
+
+    @property
+    def image_jobs(self):
+        def create():
+            from app.services.image_jobs import ImageJobService
+            return ImageJobService(image_service=self.image_service, db=self.db)
+        return self._get('image_jobs', create)
+
+    @property
+    def data_pipeline(self):
+        def create():
+            from app.services.data_pipeline import DataPipeline
+            return DataPipeline(firebase=self.firebase)
+        return self._get('data_pipeline', create)
+
+_default_registry: Optional[ServiceRegistry] = None
+_default_lock = threading.Lock()
+
+def get_services() -> ServiceRegistry:
+    """The current app's registry, or a process default outside Flask"""
+    global _default_registry
+    if has_app_context() and 'services' in current_app.extensions:
+        return current_app.extensions['services']
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = ServiceRegistry()
+        return _default_registry
+
+def _reset_after_fork() -> None:
+    global _default_lock
+    _default_lock = threading.Lock()
+    for registry in list(_registries):
+        registry.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
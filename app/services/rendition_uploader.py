@@ -0,0 +1,157 @@
+# app/services/rendition_uploader.py
+
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_EXCEPTION
+import threading
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+# Called with (public URL, bytes, generation) once a blob is stored
+StoredCallback = Callable[[str, bytes, Optional[int]], None]
+
+class UploadBatch:
+    """
+    Upload the renditions of one request concurrently, all or nothing.
+
+    Blob metadata (content type, cache control) is set before the upload so
+    it travels with the object in a single request instead of a follow-up
+    patch. Uploads run on a bounded thread pool; the first failure stops new
+    submissions, cancels queued work and deletes every blob that this batch
+    already stored, so a failed request leaves no partial rendition sets.
+    """
+
+    def __init__(self, bucket, max_workers: int = 8, max_pending: Optional[int] = None):
+        self.bucket = bucket
+        self.logger = logger.bind(service="rendition_uploader")
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="rendition-upload"
+        )
+        # Back-pressure so encoded bytes do not pile up behind slow uploads
+        self._pending = threading.BoundedSemaphore(max_pending or max_workers * 2)
+        self._lock = threading.Lock()
+        self._futures: List[Future] = []
+        self._uploaded: List[str] = []
+        # Object generation of every stored blob, by public URL
+        self.generations: Dict[str, int] = {}
+        self._error: Optional[BaseException] = None
+
+    def __enter__(self) -> 'UploadBatch':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is not None:
+                self.rollback()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def submit(
+        self,
+        path: str,
+        data: bytes,
+        content_type: str,
+        cache_control: Optional[str] = None,
+        on_stored: Optional[StoredCallback] = None
+    ) -> str:
+        """
+        Queue an upload and return the blob's public URL
+
+        on_stored, if given, runs on the upload thread once the blob is
+        stored, so callers can use the bytes without holding on to them.
+        """
+        self._raise_if_failed()
+
+        blob = self.bucket.blob(path)
+        blob.cache_control = cache_control
+
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(self._upload, blob, data, content_type, on_stored)
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(self._on_done)
+
+        with self._lock:
+            self._futures.append(future)
+
+        return blob.public_url
+
+    def wait(self) -> None:
+        """Block until every upload finished, rolling back on the first failure"""
+        with self._lock:
+            futures = list(self._futures)
+
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = next(
+            (f for f in done if not f.cancelled() and f.exception() is not None),
+            None
+        )
+        if failed is None:
+            return
+
+        for future in not_done:
+            future.cancel()
+        self.rollback()
+        raise failed.exception()
+
+    def rollback(self) -> None:
+        """Delete everything this batch uploaded"""
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+        # Let in-flight uploads land so they can be deleted as well
+        wait(futures)
+
+        with self._lock:
+            uploaded, self._uploaded = self._uploaded, []
+
+        for path in uploaded:
+            try:
+                self.bucket.blob(path).delete()
+            except Exception as e:
+                self.logger.error("rendition_rollback_failed", path=path, error=str(e))
+
+        if uploaded:
+            self.logger.warning("rendition_uploads_rolled_back", count=len(uploaded))
+
+    def _upload(
+        self,
+        blob,
+        data: bytes,
+        content_type: str,
+        on_stored: Optional[StoredCallback]
+    ) -> None:
+        # Skip work queued before another upload failed
+        if self._error is not None:
+            return
+        blob.upload_from_string(data, content_type=content_type)
+        with self._lock:
+            self._uploaded.append(blob.name)
+            self.generations[blob.public_url] = blob.generation
+
+        if on_stored is not None:
+            try:
+                on_stored(blob.public_url, data, blob.generation)
+            except Exception as e:
+                # The upload itself succeeded; a callback cannot fail it
+                self.logger.warning("rendition_stored_callback_failed", path=blob.name, error=str(e))
+
+    def _on_done(self, future: Future) -> None:
+        self._pending.release()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            with self._lock:
+                if self._error is None:
+                    self._error = error
+            self.logger.error("rendition_upload_failed", error=str(error))
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            self.rollback()
+            raise self._error
@@ -0,0 +1,169 @@
+# app/services/upload_spool.py
+
+from typing import BinaryIO, List, Optional
+from flask import Request, current_app
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+# Directory for spooled uploads; the system temp directory when unset
+SPOOL_DIR = os.getenv('IMAGE_SPOOL_DIR') or None
+CHUNK_SIZE = 64 * 1024
+# Largest request body accepted (MAX_CONTENT_LENGTH)
+MAX_REQUEST_SIZE = int(os.getenv('IMAGE_MAX_REQUEST_MB', '200')) * 1024 * 1024
+
+class SpooledUpload:
+    """An upload copied to disk, with its size and SHA-256 known"""
+
+    def __init__(
+        self,
+        filename: str,
+        content_type: Optional[str],
+        path: str,
+        size: int,
+        content_hash: str
+    ):
+        self.filename = filename
+        self.content_type = content_type
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+
+    def open(self) -> BinaryIO:
+        return open(self.path, 'rb')
+
+    def read(self) -> bytes:
+        with self.open() as f:
+            return f.read()
+
+class SpoolFile(io.FileIO):
+    """
+    A multipart file part written straight to the spool directory.
+
+    Size and SHA-256 are tracked while the form parser writes, and the part
+    is rejected with a 413 as soon as it passes max_size, before the rest
+    of the body is read. The file is deleted on close unless an UploadSpool
+    took it over.
+    """
+
+    def __init__(self, filename: Optional[str], max_size: Optional[int], directory: Optional[str] = None):
+        self.filename = filename
+        self.max_size = max_size
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.kept = False
+        fd, self.path = tempfile.mkstemp(prefix='upload-', dir=directory or SPOOL_DIR)
+        super().__init__(fd, 'r+')
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge(f"File {self.filename} exceeds maximum size")
+        self.digest.update(data)
+        return super().write(data)
+
+    def keep(self, path: str) -> None:
+        """Move the file to path; it is then no longer deleted on close"""
+        os.replace(self.path, path)
+        self.path = path
+        self.kept = True
+
+    def close(self) -> None:
+        super().close()
+        if not self.kept and os.path.exists(self.path):
+            os.remove(self.path)
+
+class SpoolingRequest(Request):
+    """
+    Flask request that parses multipart file parts into SpoolFiles.
+
+    Each part is capped at the MAX_UPLOAD_FILE_SIZE config and the whole
+    body at MAX_CONTENT_LENGTH, both enforced while the body is read.
+    """
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None
+    ) -> BinaryIO:
+        max_size = current_app.config.get('MAX_UPLOAD_FILE_SIZE') if current_app else None
+        return SpoolFile(filename, max_size)
+
+class UploadSpool:
+    """
+    A private directory holding the spooled uploads of one request or job.
+
+    Files the request parser already wrote to disk (SpoolFile) are moved
+    in; others are streamed in fixed-size chunks while the size limit is
+    enforced and the content hash computed, so memory use does not depend
+    on how many files a request carries or whether the client sent a
+    Content-Length for each part.
+    """
+
+    def __init__(self, directory: Optional[str] = None, prefix: str = 'image-upload-'):
+        self.path = tempfile.mkdtemp(prefix=prefix, dir=directory or SPOOL_DIR)
+        self.uploads: List[SpooledUpload] = []
+
+    def __enter__(self) -> 'UploadSpool':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.cleanup()
+
+    def add(self, file: FileStorage, max_size: int) -> SpooledUpload:
+        """Stream a FileStorage to disk, raising ValueError past max_size"""
+        path = os.path.join(
+            self.path,
+            f"{len(self.uploads):03d}-{secure_filename(file.filename) or 'upload'}"
+        )
+
+        if isinstance(file.stream, SpoolFile) and not file.stream.closed:
+            # Already on disk from the request parser: move, do not copy
+            stream = file.stream
+            if stream.size > max_size:
+                raise ValueError(f"File {file.filename} exceeds maximum size")
+            stream.keep(path)
+            return self._record(file, path, stream.size, stream.digest.hexdigest())
+
+        digest = hashlib.sha256()
+        size = 0
+
+        try:
+            with open(path, 'wb') as out:
+                while True:
+                    chunk = file.stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_size:
+                        raise ValueError(f"File {file.filename} exceeds maximum size")
+                    digest.update(chunk)
+                    out.write(chunk)
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        return self._record(file, path, size, digest.hexdigest())
+
+    def _record(self, file: FileStorage, path: str, size: int, content_hash: str) -> SpooledUpload:
+        upload = SpooledUpload(
+            filename=file.filename,
+            content_type=file.content_type,
+            path=path,
+            size=size,
+            content_hash=content_hash
+        )
+        self.uploads.append(upload)
+        return upload
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
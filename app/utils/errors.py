@@ -9,7 +9,7 @@ logger = structlog.get_logger(__name__)
 class APIError(Exception):
     """Base API Error class"""
     def __init__(self, message: str, status_code: int = 400, payload: Any = None):
-        super().__init__()
+        super().__init__(message)
         self.message = message
         self.status_code = status_code
         self.payload = payload
@@ -24,6 +24,8 @@ def handle_api_error(error: APIError):
     """Handler for API errors"""
     response = jsonify(error.to_dict())
     response.status_code = error.status_code
+    if getattr(error, 'retry_after', None) is not None:
+        response.headers['Retry-After'] = str(max(1, int(error.retry_after + 0.5)))
     return response
 
 def error_handler(f: Callable) -> Callable:
@@ -78,4 +80,13 @@ class UnauthorizedError(APIError):
         super().__init__(
             message,
             status_code=401
-        )
\ No newline at end of file
+        )
+
+class RateLimitedError(APIError):
+    def __init__(self, message: str = "AI quota exhausted, retry later", retry_after: float = None):
+        super().__init__(
+            message,
+            status_code=429,
+            payload={'retry_after': round(retry_after, 1)} if retry_after is not None else None
+        )
+        self.retry_after = retry_after
@@ -0,0 +1,72 @@
+import json
+from typing import Any, List
+
+class JSONArrayStream:
+    """
+    Incrementally parse the elements of a JSON array from text chunks.
+
+    feed() returns every element completed by the new text, so callers can
+    act on each object while the rest of the array is still arriving. A
+    Markdown code fence around the array, as models often emit, is skipped.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._decoder = json.JSONDecoder()
+
+    @property
+    def finished(self) -> bool:
+        """True once the closing bracket of the array was read"""
+        return self._finished
+
+    def feed(self, text: str) -> List[Any]:
+        self._buffer += text
+        items = []
+
+        while not self._finished:
+            self._skip_whitespace()
+            if self._pos >= len(self._buffer):
+                break
+
+            if not self._started:
+                if self._buffer.startswith('```', self._pos):
+                    # Skip the fence and its language tag up to the newline
+                    newline = self._buffer.find('\n', self._pos)
+                    if newline == -1:
+                        break
+                    self._pos = newline + 1
+                    continue
+                if self._buffer[self._pos] != '[':
+                    raise ValueError("Invalid response format - expected array")
+                self._started = True
+                self._pos += 1
+                continue
+
+            char = self._buffer[self._pos]
+            if char == ',':
+                self._pos += 1
+                continue
+            if char == ']':
+                self._finished = True
+                self._pos += 1
+                break
+
+            try:
+                item, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # The element is not complete yet
+                break
+            items.append(item)
+            self._pos = end
+
+        # Drop consumed text so the buffer stays small
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+        return items
+
+    def _skip_whitespace(self) -> None:
+        while self._pos < len(self._buffer) and self._buffer[self._pos].isspace():
+            self._pos += 1
@@ -0,0 +1,77 @@
+"""In-process stand-in for a Firebase Storage bucket, for offline benchmarks"""
+import threading
+import time
+from typing import Dict, Optional
+
+class FakeBlob:
+    def __init__(self, bucket: 'FakeBucket', name: str):
+        self.bucket = bucket
+        self.name = name
+        self.cache_control: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.generation: Optional[int] = None
+        self.size: Optional[int] = None
+
+    @property
+    def public_url(self) -> str:
+        return f"https://storage.googleapis.com/{self.bucket.name}/{self.name}"
+
+    def upload_from_string(self, data: bytes, content_type: Optional[str] = None, **kwargs) -> None:
+        if self.bucket.latency:
+            time.sleep(self.bucket.latency)
+        with self.bucket.lock:
+            self.bucket.generation += 1
+            self.generation = self.bucket.generation
+            self.bucket.objects[self.name] = {
+                'data': bytes(data),
+                'content_type': content_type,
+                'cache_control': self.cache_control,
+                'generation': self.generation
+            }
+        self.content_type = content_type
+        self.size = len(data)
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        if self.bucket.latency:
+            time.sleep(self.bucket.latency)
+        return self.bucket.objects[self.name]['data']
+
+    def reload(self, **kwargs) -> None:
+        if self.bucket.latency:
+            time.sleep(self.bucket.latency)
+        obj = self.bucket.objects[self.name]
+        self.generation = obj['generation']
+        self.content_type = obj['content_type']
+        self.size = len(obj['data'])
+
+    def exists(self, **kwargs) -> bool:
+        return self.name in self.bucket.objects
+
+    def delete(self, **kwargs) -> None:
+        with self.bucket.lock:
+            self.bucket.objects.pop(self.name, None)
+
+class FakeBucket:
+    """
+    Keeps uploaded objects in memory.
+
+    latency (seconds) is slept on every upload and download to approximate
+    a network round-trip, so concurrency in the upload stage shows up in
+    the numbers.
+    """
+
+    def __init__(self, name: str = 'benchmark-bucket', latency: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.objects: Dict[str, Dict] = {}
+
+    def blob(self, name: str, generation: Optional[int] = None) -> FakeBlob:
+        blob = FakeBlob(self, name)
+        blob.generation = generation
+        return blob
+
+    @property
+    def bytes_stored(self) -> int:
+        return sum(len(obj['data']) for obj in self.objects.values())
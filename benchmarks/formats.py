@@ -0,0 +1,100 @@
+"""
+Compare output bytes and encode time of each rendition format.
+
+Usage:
+    python -m benchmarks.formats [image ...] [--repeat N] [--formats JPEG,WEBP,AVIF]
+
+Defaults to the sample images in the repository root.
+"""
+import argparse
+import os
+import statistics
+import time
+from PIL import Image
+from app.services.image_renditions import (
+    RenditionEngine, RenditionSpec, available_formats, fit_size, crop_to_square, center_crop
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGES = [os.path.join(ROOT, 'land.jpg'), os.path.join(ROOT, 'property.jpg')]
+
+# Mirrors ImageService's rendition configuration
+SPECS = [
+    RenditionSpec('thumbnail', (150, 150), 70, 'thumbnails', square=True),
+    RenditionSpec('medium', (800, 600), 85, 'medium'),
+    RenditionSpec('large', (1600, 1200), 90, 'large'),
+]
+
+def prepare_sizes(path: str):
+    """Decode an image once and return the cropped image for every spec"""
+    with Image.open(path) as source:
+        image = source.convert('RGB')
+
+    prepared = []
+    for spec in SPECS:
+        if spec.square:
+            working = crop_to_square(image)
+            working = working.resize(fit_size(working.size, spec.size), Image.Resampling.LANCZOS)
+        else:
+            working = center_crop(
+                image.resize(fit_size(image.size, spec.size), Image.Resampling.LANCZOS),
+                spec.size
+            )
+        prepared.append((spec, working))
+    return prepared
+
+def run(paths, formats, repeat):
+    engine = RenditionEngine(SPECS)
+    rows = []
+    for path in paths:
+        for spec, image in prepare_sizes(path):
+            for fmt in formats:
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    rendition = engine.encode(spec, image, fmt)
+                    timings.append(time.perf_counter() - start)
+                rows.append({
+                    'image': os.path.basename(path),
+                    'size': spec.key,
+                    'format': fmt,
+                    'dimensions': f"{rendition.width}x{rendition.height}",
+                    'bytes': len(rendition.data),
+                    'encode_ms': statistics.median(timings) * 1000
+                })
+    return rows
+
+def print_report(rows, formats):
+    print(f"{'image':<16}{'size':<11}{'format':<8}{'dimensions':<12}{'bytes':>10}{'vs jpeg':>9}{'encode ms':>11}")
+    baseline = {
+        (row['image'], row['size']): row['bytes']
+        for row in rows if row['format'] == 'JPEG'
+    }
+    for row in rows:
+        jpeg_bytes = baseline.get((row['image'], row['size']))
+        ratio = f"{row['bytes'] / jpeg_bytes:.0%}" if jpeg_bytes else '-'
+        print(f"{row['image']:<16}{row['size']:<11}{row['format']:<8}{row['dimensions']:<12}"
+              f"{row['bytes']:>10}{ratio:>9}{row['encode_ms']:>11.1f}")
+
+    print("\nTotals per format:")
+    for fmt in formats:
+        selected = [row for row in rows if row['format'] == fmt]
+        print(f"  {fmt:<6} {sum(r['bytes'] for r in selected):>10} bytes"
+              f" {sum(r['encode_ms'] for r in selected):>9.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('images', nargs='*', default=DEFAULT_IMAGES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--formats', default='JPEG,WEBP,AVIF')
+    args = parser.parse_args()
+
+    formats = available_formats(args.formats.split(','))
+    skipped = set(f.strip().upper() for f in args.formats.split(',')) - set(formats)
+    if skipped:
+        print(f"Skipping formats this Pillow build cannot encode: {', '.join(sorted(skipped))}\n")
+
+    print_report(run(args.images, formats, args.repeat), formats)
+
+if __name__ == "__main__":
+    main()
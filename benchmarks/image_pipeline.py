@@ -0,0 +1,307 @@
+"""
+Benchmark the image upload pipeline offline.
+
+Runs ImageService's rendition engine and upload stage against the sample
+photos and synthetic images of several megapixel sizes, with an in-memory
+bucket standing in for Firebase Storage. Reports decode, resize and encode
+time per rendition, bytes out, upload time and peak memory per image.
+
+Usage:
+    python -m benchmarks.image_pipeline               # print a report
+    python -m benchmarks.image_pipeline --check       # fail on byte/memory regressions
+    python -m benchmarks.image_pipeline --check --check-timings
+    python -m benchmarks.image_pipeline --update      # re-record baselines
+
+Output bytes are deterministic for a given Pillow build, so --check gates
+on them (and on peak memory) anywhere. Timings depend on the machine and
+are only compared with --check-timings, against baselines recorded on the
+machine that runs the check.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import threading
+import time
+from typing import Dict, Any, Iterable, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+SAMPLE_IMAGES = {
+    'land': os.path.join(ROOT, 'land.jpg'),
+    'property': os.path.join(ROOT, 'property.jpg'),
+}
+# Synthetic 4:3 sources: name -> megapixels
+SYNTHETIC_IMAGES = {
+    'synthetic-2mp': 2,
+    'synthetic-8mp': 8,
+    'synthetic-24mp': 24,
+}
+
+# Allowed relative increase before --check reports a regression
+DEFAULT_TOLERANCES = {
+    'time': 0.5,
+    'bytes': 0.05,
+    'memory': 0.25,
+}
+# Metric kinds compared by --check; 'time' is added by --check-timings
+CHECKED_KINDS = ('bytes', 'memory')
+
+def synthetic_jpeg(megapixels: float) -> bytes:
+    """Deterministic, detailed 4:3 JPEG of roughly the given size"""
+    from PIL import Image
+
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = width * 3 // 4
+
+    # Fractal detail at a quarter size, scaled up and tinted by gradients
+    detail = Image.effect_mandelbrot(
+        (width // 4, height // 4), (-2.0, -1.2, 1.0, 1.2), 100
+    ).resize((width, height), Image.Resampling.BICUBIC)
+    horizontal = Image.linear_gradient('L').rotate(90).resize((width, height))
+    vertical = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', (detail, horizontal, vertical))
+
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=92)
+    return output.getvalue()
+
+def load_cases(names: List[str]) -> List[Tuple[str, bytes]]:
+    cases = []
+    for name in names:
+        if name in SAMPLE_IMAGES:
+            with open(SAMPLE_IMAGES[name], 'rb') as f:
+                cases.append((name, f.read()))
+        elif name in SYNTHETIC_IMAGES:
+            cases.append((name, synthetic_jpeg(SYNTHETIC_IMAGES[name])))
+        else:
+            raise SystemExit(f"Unknown case: {name}")
+    return cases
+
+def _current_rss_mb() -> float:
+    """Resident set size now; falls back to the high-water mark off Linux"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        # ru_maxrss is kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+class RssSampler:
+    """Track the peak RSS above the starting point while the block runs"""
+
+    def __init__(self, interval: float = 0.002):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def __enter__(self) -> 'RssSampler':
+        self._start = _current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._record()
+
+    def _record(self) -> None:
+        self.peak_mb = max(self.peak_mb, _current_rss_mb() - self._start)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._record()
+
+def run_case(data: bytes, repeat: int, latency: float) -> Dict[str, Any]:
+    """Measure one source image; runs in a fresh process for a clean RSS peak"""
+    from PIL import Image
+    from app.services.image_service import ImageService
+    from app.services.rendition_uploader import UploadBatch
+    from benchmarks.fake_storage import FakeBucket
+
+    bucket = FakeBucket(latency=latency)
+    # Firestore is not touched by the stages measured here
+    service = ImageService(bucket=bucket, db=object())
+    engine = service.rendition_engine
+
+    with Image.open(io.BytesIO(data)) as source:
+        dimensions = source.size
+
+    def run_once() -> Tuple[Dict[str, float], Any]:
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        renditions = engine.render(data, timings)
+
+        upload_start = time.perf_counter()
+        with UploadBatch(bucket, service.UPLOAD_WORKERS) as uploads:
+            service._upload_renditions(uploads, 'BENCH', 'BENCH-01.jpg', renditions)
+            uploads.wait()
+        end = time.perf_counter()
+
+        timings['upload'] = end - upload_start
+        timings['total'] = end - start
+        return timings, renditions
+
+    with RssSampler() as sampler:
+        runs = []
+        for _ in range(repeat):
+            timings, renditions = run_once()
+            runs.append(timings)
+
+    def median_ms(key: str) -> float:
+        return round(statistics.median(run.get(key, 0.0) for run in runs) * 1000, 2)
+
+    result = {
+        'source': {
+            'dimensions': f"{dimensions[0]}x{dimensions[1]}",
+            'megapixels': round(dimensions[0] * dimensions[1] / 1_000_000, 1),
+            'bytes': len(data),
+        },
+        'decode_ms': median_ms('decode'),
+        'renditions': {},
+        'upload_ms': median_ms('upload'),
+        'total_ms': median_ms('total'),
+        'bytes_out': 0,
+    }
+    for spec in engine.specs:
+        formats = {}
+        for fmt, rendition in renditions[spec.key].items():
+            formats[fmt] = {
+                'encode_ms': median_ms(f'{spec.key}.encode.{fmt}'),
+                'bytes': len(rendition.data),
+            }
+            result['bytes_out'] += len(rendition.data)
+        result['renditions'][spec.key] = {
+            'dimensions': f"{rendition.width}x{rendition.height}",
+            'resize_ms': median_ms(f'{spec.key}.resize'),
+            'formats': formats,
+        }
+    result['peak_rss_mb'] = round(sampler.peak_mb, 1)
+    return result
+
+def run(cases: List[Tuple[str, bytes]], repeat: int, latency: float) -> Dict[str, Any]:
+    results = {}
+    # A fresh interpreter per case keeps peak-memory numbers independent
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        for name, data in cases:
+            results[name] = pool.apply(run_case, (data, repeat, latency))
+    return results
+
+def print_report(results: Dict[str, Any]) -> None:
+    for name, result in results.items():
+        source = result['source']
+        print(f"\n{name}: {source['dimensions']} ({source['megapixels']} MP, {source['bytes']} bytes)")
+        print(f"  decode {result['decode_ms']:.1f} ms   upload {result['upload_ms']:.1f} ms   "
+              f"total {result['total_ms']:.1f} ms   bytes out {result['bytes_out']}   "
+              f"peak +{result['peak_rss_mb']:.1f} MB")
+        for key, rendition in result['renditions'].items():
+            encodes = '  '.join(
+                f"{fmt} {info['encode_ms']:.1f} ms/{info['bytes']} B"
+                for fmt, info in rendition['formats'].items()
+            )
+            print(f"  {key:<10} {rendition['dimensions']:<10} resize {rendition['resize_ms']:.1f} ms   {encodes}")
+
+def _metrics(result: Dict[str, Any]) -> Dict[str, Tuple[str, float]]:
+    """Flatten a case result into {metric: (kind, value)} for comparison"""
+    metrics = {
+        'decode_ms': ('time', result['decode_ms']),
+        'upload_ms': ('time', result['upload_ms']),
+        'total_ms': ('time', result['total_ms']),
+        'bytes_out': ('bytes', result['bytes_out']),
+        'peak_rss_mb': ('memory', result['peak_rss_mb']),
+    }
+    for key, rendition in result['renditions'].items():
+        metrics[f'{key}.resize_ms'] = ('time', rendition['resize_ms'])
+        for fmt, info in rendition['formats'].items():
+            metrics[f'{key}.{fmt}.encode_ms'] = ('time', info['encode_ms'])
+            metrics[f'{key}.{fmt}.bytes'] = ('bytes', info['bytes'])
+    return metrics
+
+def compare(
+    results: Dict[str, Any],
+    baselines: Dict[str, Any],
+    tolerances: Dict[str, float],
+    kinds: Iterable[str] = CHECKED_KINDS
+) -> List[str]:
+    """Return a description of every metric of the given kinds that regressed past tolerance"""
+    kinds = set(kinds)
+    regressions = []
+    for name, result in results.items():
+        if name not in baselines:
+            continue
+        expected = _metrics(baselines[name])
+        for metric, (kind, value) in _metrics(result).items():
+            if kind not in kinds or metric not in expected:
+                continue
+            baseline = expected[metric][1]
+            # Values of a few milliseconds or megabytes are mostly noise
+            floor = {'time': 5.0, 'memory': 5.0}.get(kind, 0)
+            limit = max(baseline, floor) * (1 + tolerances[kind])
+            if value > limit:
+                regressions.append(
+                    f"{name} {metric}: {value} > {baseline} (+{tolerances[kind]:.0%} allowed)"
+                )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cases', default=','.join([*SAMPLE_IMAGES, *SYNTHETIC_IMAGES]),
+                        help="comma separated case names")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="simulated Storage round-trip in seconds")
+    parser.add_argument('--check', action='store_true',
+                        help="compare bytes and memory against the stored baselines")
+    parser.add_argument('--check-timings', action='store_true',
+                        help="with --check, compare timings too (baselines must come from this machine)")
+    parser.add_argument('--update', action='store_true', help="store these results as the new baselines")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--json', help="also write the results to this file")
+    for kind, value in DEFAULT_TOLERANCES.items():
+        parser.add_argument(f'--{kind}-tolerance', type=float, default=value)
+    args = parser.parse_args()
+
+    cases = load_cases([name.strip() for name in args.cases.split(',') if name.strip()])
+    results = run(cases, args.repeat, args.latency)
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.update:
+        baselines = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baselines = json.load(f)
+        baselines.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaselines written to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            raise SystemExit(f"No baselines at {args.baseline}; run with --update first")
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+        tolerances = {kind: getattr(args, f'{kind}_tolerance') for kind in DEFAULT_TOLERANCES}
+        kinds = CHECKED_KINDS + (('time',) if args.check_timings else ())
+        regressions = compare(results, baselines, tolerances, kinds)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baselines")
+
+if __name__ == "__main__":
+    main()
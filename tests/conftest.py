@@ -0,0 +1,257 @@
+import copy
+import datetime
+import itertools
+
+import pytest
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import DELETE_FIELD, SERVER_TIMESTAMP
+
+from benchmarks.fake_storage import FakeBucket
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        value = self._data
+        for part in field.split('.'):
+            value = value[part]
+        return copy.deepcopy(value)
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        self.db.reads += 1
+        return self.db.snapshot(self)
+
+    def set(self, data, merge=False):
+        self.db.apply(('set', self, data, merge))
+
+    def update(self, data, option=None):
+        self.db.check(option, self)
+        self.db.apply(('update', self, data))
+
+    def delete(self):
+        self.db.apply(('delete', self))
+
+class FakeCollection:
+    def __init__(self, db, path, order=None, limit=None, after=None):
+        self.db = db
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+        self._order = order
+        self._limit = limit
+        self._after = after
+
+    def document(self, document_id=None):
+        document_id = document_id or f"auto-{next(self.db.ids)}"
+        return FakeDocument(self.db, f"{self.path}/{document_id}")
+
+    def order_by(self, field, direction='ASCENDING'):
+        return FakeCollection(self.db, self.path, (field, direction), self._limit, self._after)
+
+    def limit(self, count):
+        return FakeCollection(self.db, self.path, self._order, count, self._after)
+
+    def start_after(self, snapshot):
+        return FakeCollection(self.db, self.path, self._order, self._limit, snapshot.id)
+
+    def stream(self):
+        self.db.reads += 1
+        snapshots = [
+            self.db.snapshot(FakeDocument(self.db, path))
+            for path in self.db.docs
+            if path.rsplit('/', 1)[0] == self.path
+        ]
+        if self._order:
+            field, direction = self._order
+            snapshots.sort(key=lambda snapshot: snapshot.get(field),
+                           reverse=str(direction).upper().endswith('DESCENDING'))
+        if self._after is not None:
+            ids = [snapshot.id for snapshot in snapshots]
+            snapshots = snapshots[ids.index(self._after) + 1:]
+        if self._limit is not None:
+            snapshots = snapshots[:self._limit]
+        return snapshots
+
+    get = stream
+
+class FakeWriteBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def __len__(self):
+        return len(self.ops)
+
+    def set(self, reference, data, merge=False):
+        self.ops.append(('set', reference, data, merge))
+
+    def update(self, reference, data, option=None):
+        self.ops.append(('update', reference, data, option))
+
+    def delete(self, reference, option=None):
+        self.ops.append(('delete', reference))
+
+    def commit(self):
+        if self.db.fail_commits:
+            raise RuntimeError('commit failed')
+        self.db.commits.append(len(self.ops))
+        return self._write()
+
+    def _write(self):
+        for op in self.ops:
+            if op[0] == 'update':
+                self.db.check(op[3], op[1])
+        for op in self.ops:
+            self.db.apply(op)
+        return [None] * len(self.ops)
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    Write batch driven by firestore.transactional, applied on _commit.
+
+    Transactions are not counted in commits and ignore fail_commits, which
+    fail only write batches.
+    """
+
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._id = None
+
+    def _clean_up(self):
+        self.ops = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = f"transaction-{next(self.db.ids)}"
+
+    def _commit(self):
+        self._write()
+        self._clean_up()
+
+    def _rollback(self):
+        self._clean_up()
+
+class FakeFirestore:
+    """
+    Dictionary-backed stand-in for the Firestore client.
+
+    Supports documents and subcollections, merged sets, dotted-path updates,
+    SERVER_TIMESTAMP and DELETE_FIELD, last_update_time preconditions,
+    write batches, transactions, get_all and simple ordered, limited collection queries.
+    Counts reads, writes and commits.
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self.update_times = {}
+        self.reads = 0
+        self.writes = 0
+        self.commits = []
+        self.fail_commits = False
+        self.ids = itertools.count(1)
+        self._clock = itertools.count(1)
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def document(self, path):
+        return FakeDocument(self, path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        self.reads += 1
+        return [self.snapshot(reference) for reference in references]
+
+    def write_option(self, last_update_time):
+        return last_update_time
+
+    def check(self, last_update_time, reference):
+        """Raise FailedPrecondition if the document changed since last_update_time"""
+        if last_update_time is not None and self.update_times.get(reference.path) != last_update_time:
+            raise FailedPrecondition(reference.path)
+
+    def snapshot(self, reference):
+        return FakeSnapshot(reference, copy.deepcopy(self.docs.get(reference.path)),
+                            self.update_times.get(reference.path))
+
+    def now(self):
+        return datetime.datetime(2030, 1, 1) + datetime.timedelta(seconds=next(self._clock))
+
+    def apply(self, op):
+        kind, reference = op[0], op[1]
+        self.writes += 1
+        if kind == 'delete':
+            self.docs.pop(reference.path, None)
+            self.update_times.pop(reference.path, None)
+            return
+
+        now = self.now()
+        if kind == 'set':
+            data, merge = op[2], op[3]
+            current = self.docs.get(reference.path) if merge else None
+            self.docs[reference.path] = _merge(copy.deepcopy(current or {}), data, now)
+        else:
+            if reference.path not in self.docs:
+                raise NotFound(reference.path)
+            document = self.docs[reference.path]
+            for field, value in op[2].items():
+                target = document
+                parts = field.split('.')
+                for part in parts[:-1]:
+                    target = target.setdefault(part, {})
+                if value is DELETE_FIELD:
+                    target.pop(parts[-1], None)
+                else:
+                    target[parts[-1]] = _resolve(copy.deepcopy(value), now)
+        self.update_times[reference.path] = now
+
+def _resolve(value, now):
+    if value is SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, dict):
+        return {k: _resolve(v, now) for k, v in value.items() if v is not DELETE_FIELD}
+    return value
+
+def _merge(target, data, now):
+    for key, value in data.items():
+        if value is DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value, now)
+        else:
+            target[key] = _resolve(copy.deepcopy(value), now)
+    return target
+
+@pytest.fixture
+def bucket():
+    """In-memory Storage bucket"""
+    return FakeBucket('test-bucket')
+
+@pytest.fixture
+def db():
+    """In-memory Firestore client"""
+    return FakeFirestore()
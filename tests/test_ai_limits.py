@@ -0,0 +1,128 @@
+import pytest
+from google.genai import errors as genai_errors
+
+from app.services import ai_limits
+from app.services.ai_limits import AdaptiveConcurrency, GenerationLimiter, SharedRateLimiter
+from app.utils.errors import RateLimitedError
+
+def _api_error(code):
+    return genai_errors.APIError(code, {'error': {'message': 'failed', 'status': 'UNAVAILABLE'}})
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr(ai_limits.time, 'sleep', delays.append)
+    return delays
+
+def test_rate_limiter_waits_for_the_emptier_bucket(tmp_path):
+    limiter = SharedRateLimiter(requests_per_minute=2, tokens_per_minute=600, directory=str(tmp_path))
+
+    assert limiter.try_acquire(100) == 0
+    assert limiter.try_acquire(100) == 0
+    # Out of requests: one refills in 30 seconds
+    assert limiter.try_acquire(100) == pytest.approx(30, abs=0.1)
+
+def test_rate_limiter_quota_is_shared_through_its_state_file(tmp_path):
+    first = SharedRateLimiter(requests_per_minute=60, tokens_per_minute=600, directory=str(tmp_path))
+    second = SharedRateLimiter(requests_per_minute=60, tokens_per_minute=600, directory=str(tmp_path))
+
+    assert first.try_acquire(600) == 0
+    assert second.try_acquire(60) == pytest.approx(6, abs=0.1)
+
+def test_rate_limiter_charges_actual_usage(tmp_path):
+    limiter = SharedRateLimiter(requests_per_minute=60, tokens_per_minute=600, directory=str(tmp_path))
+    assert limiter.try_acquire(100) == 0
+
+    # The call used 300 more tokens than estimated
+    limiter.record_usage(100, 400)
+    assert limiter.try_acquire(300) == pytest.approx(10, abs=0.1)
+
+def test_rate_limiter_acquire_gives_up_past_its_timeout(tmp_path):
+    limiter = SharedRateLimiter(requests_per_minute=1, tokens_per_minute=600, directory=str(tmp_path))
+    limiter.acquire(10)
+
+    with pytest.raises(RateLimitedError) as raised:
+        limiter.acquire(10, timeout=1)
+    assert raised.value.retry_after == pytest.approx(60, abs=0.1)
+    assert str(raised.value) == "AI quota exhausted, retry later"
+
+def test_concurrency_grows_additively_and_halves_on_overload():
+    concurrency = AdaptiveConcurrency(max_limit=8, latency_target=5)
+    concurrency.limit = 4.0
+
+    concurrency.acquire()
+    concurrency.release(latency=1)
+    assert concurrency.limit == pytest.approx(4.25)
+
+    concurrency.acquire()
+    concurrency.release(overloaded=True)
+    assert concurrency.limit == pytest.approx(2.125)
+
+    # One decrease per latency window
+    concurrency.acquire()
+    concurrency.release(latency=10)
+    assert concurrency.limit == pytest.approx(2.125)
+
+def test_concurrency_stays_within_bounds():
+    concurrency = AdaptiveConcurrency(max_limit=2, latency_target=0)
+    for _ in range(5):
+        concurrency.acquire()
+        concurrency.release(latency=0)
+    assert concurrency.limit == 2
+
+    concurrency._decrease()
+    concurrency._decrease()
+    assert concurrency.limit == 1
+
+def test_limiter_retries_server_errors(tmp_path, no_backoff):
+    limiter = GenerationLimiter(SharedRateLimiter(directory=str(tmp_path)), AdaptiveConcurrency(max_limit=4))
+    outcomes = [_api_error(503), _api_error(500), 'ok']
+
+    def call():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert limiter.call(call, estimated_tokens=10) == 'ok'
+    assert len(no_backoff) == 2
+    assert limiter.concurrency._in_flight == 0
+
+def test_limiter_does_not_retry_client_errors(tmp_path, no_backoff):
+    limiter = GenerationLimiter(SharedRateLimiter(directory=str(tmp_path)))
+
+    def call():
+        raise _api_error(400)
+
+    with pytest.raises(genai_errors.APIError):
+        limiter.call(call, estimated_tokens=10)
+    assert no_backoff == []
+
+def test_limiter_turns_exhausted_429s_into_rate_limited_error(tmp_path, no_backoff):
+    limiter = GenerationLimiter(SharedRateLimiter(directory=str(tmp_path)), max_retries=2)
+
+    def call():
+        raise _api_error(429)
+
+    with pytest.raises(RateLimitedError) as raised:
+        limiter.call(call, estimated_tokens=10)
+    assert raised.value.retry_after == ai_limits.BACKOFF_CAP
+    assert len(no_backoff) == 2
+
+def test_held_slot_is_released_once(tmp_path):
+    limiter = GenerationLimiter(SharedRateLimiter(directory=str(tmp_path)), AdaptiveConcurrency(max_limit=4))
+
+    response, slot = limiter.hold(lambda: 'stream', estimated_tokens=10)
+    assert response == 'stream'
+    assert limiter.concurrency._in_flight == 1
+
+    slot.release()
+    slot.release(completed=False)
+    assert limiter.concurrency._in_flight == 0
+
+def test_dropped_slot_is_released(tmp_path):
+    limiter = GenerationLimiter(SharedRateLimiter(directory=str(tmp_path)), AdaptiveConcurrency(max_limit=4))
+
+    limiter.hold(lambda: 'stream', estimated_tokens=10)
+
+    assert limiter.concurrency._in_flight == 0
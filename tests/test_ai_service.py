@@ -0,0 +1,215 @@
+import io
+import json
+import types
+
+import pytest
+from PIL import Image
+
+from app.services.ai_cache import AIResponseCache
+from app.services.ai_limits import AdaptiveConcurrency, GenerationLimiter, SharedRateLimiter
+from app.services.ai_service import AIService
+from app.services.firebase import FirebaseService
+from app.services.image_source import ImageSource
+from app.services.prompts import PromptLibrary
+from app.utils.errors import RateLimitedError
+
+CAPTIONS = [{'version': 'short', 'image_title': 'Pool', 'image_description': 'A pool'}]
+COPY = [{'version': 'short', 'title': 'Villa', 'description': 'A villa', 'excerpt': 'Villa'}]
+
+def _response(text):
+    usage = types.SimpleNamespace(prompt_token_count=10, total_token_count=20)
+    return types.SimpleNamespace(text=text, usage_metadata=usage)
+
+class FakeModels:
+    """generate_content returns, and generate_content_stream splits, the next response"""
+
+    def __init__(self):
+        self.responses = []
+        self.calls = 0
+
+    def generate_content(self, model, contents, config):
+        self.calls += 1
+        return _response(json.dumps(self.responses.pop(0)))
+
+    def generate_content_stream(self, model, contents, config):
+        self.calls += 1
+        text = json.dumps(self.responses.pop(0))
+        # Chunk boundaries fall mid-token, as they do from the API
+        return (_response(text[i:i + 7]) for i in range(0, len(text), 7))
+
+@pytest.fixture
+def client():
+    return types.SimpleNamespace(models=FakeModels())
+
+@pytest.fixture
+def firebase(db, bucket):
+    property_ref = db.collection('properties').document('P1')
+    property_ref.set({'title': 'Villa', 'description': 'By the sea', 'details': {'property_type': 'villa'}})
+    output = io.BytesIO()
+    Image.new('RGB', (800, 600)).save(output, format='JPEG')
+    bucket.blob('properties/P1/medium/P1-01.jpg').upload_from_string(output.getvalue(), 'image/jpeg')
+    property_ref.collection('images').document('I1').set({
+        'urls': {'medium': 'properties/P1/medium/P1-01.jpg', 'large': 'properties/P1/medium/P1-01.jpg'}
+    })
+    return FirebaseService(db=db, bucket=bucket)
+
+@pytest.fixture
+def service(client, firebase, bucket, tmp_path):
+    limiter = GenerationLimiter(
+        SharedRateLimiter(directory=str(tmp_path / 'quota')),
+        AdaptiveConcurrency(max_limit=2)
+    )
+    return AIService(
+        client=client,
+        firebase=firebase,
+        image_source=ImageSource(bucket),
+        response_cache=AIResponseCache(str(tmp_path / 'responses')),
+        limiter=limiter,
+        prompts=PromptLibrary()
+    )
+
+def _generations(db, path):
+    return [doc for doc in db.docs if doc.startswith(f"{path}/ai_generations/")]
+
+def test_cached_image_caption_is_not_recorded_again(service, client, db):
+    client.models.responses = [CAPTIONS]
+
+    assert service.analyze_property_image('P1', 'I1', ['short']) == CAPTIONS
+    assert service.analyze_property_image('P1', 'I1', ['short']) == CAPTIONS
+
+    assert client.models.calls == 1
+    assert len(_generations(db, 'properties/P1/images/I1')) == 1
+
+def test_bypassed_cache_records_a_new_generation(service, client, db):
+    client.models.responses = [CAPTIONS, CAPTIONS]
+
+    service.analyze_property_image('P1', 'I1', ['short'])
+    service.analyze_property_image('P1', 'I1', ['short'], bypass_cache=True)
+
+    assert client.models.calls == 2
+    assert len(_generations(db, 'properties/P1/images/I1')) == 2
+
+def test_cached_property_content_is_not_recorded_again(service, client, db):
+    client.models.responses = [COPY]
+
+    assert service.analyze_property_content('P1', 'I1', ['short']) == COPY
+    assert service.analyze_property_content('P1', 'I1', ['short']) == COPY
+
+    assert client.models.calls == 1
+    assert len(_generations(db, 'properties/P1')) == 1
+
+def test_streamed_content_is_recorded_once(service, client, db):
+    client.models.responses = [COPY]
+
+    streamed = list(service.stream_property_content('P1', 'I1', ['short']))
+    cached = list(service.stream_property_content('P1', 'I1', ['short']))
+
+    assert streamed == cached == [('version', COPY[0]), ('done', {'versions': COPY})]
+    assert client.models.calls == 1
+    assert len(_generations(db, 'properties/P1')) == 1
+
+def test_bulk_analysis_reports_rate_limited_images(service, client, firebase, monkeypatch):
+    def exhausted(fn, estimated_tokens):
+        raise RateLimitedError(retry_after=12.5)
+    monkeypatch.setattr(service.limiter, 'call', exhausted)
+
+    results = service.analyze_property_images('P1', ['short'], image_ids=['I1', 'missing'])
+
+    assert results == [
+        {'image_id': 'I1', 'status': 'rate_limited',
+         'error': 'AI quota exhausted, retry later', 'retry_after': 12.5},
+        {'image_id': 'missing', 'status': 'error', 'error': 'Image not found: missing'},
+    ]
+
+@pytest.fixture
+def latencies(service, monkeypatch):
+    """Latency of every concurrency slot the service releases"""
+    concurrency = service.limiter.concurrency
+    released = []
+    release = concurrency.release
+
+    def recording_release(latency=None, overloaded=False):
+        released.append(latency)
+        release(latency, overloaded)
+    monkeypatch.setattr(concurrency, 'release', recording_release)
+    return released
+
+def test_stream_holds_its_concurrency_slot_until_exhausted(service, client, latencies):
+    client.models.responses = [COPY]
+
+    events = service.stream_property_content('P1', 'I1', ['short'])
+    assert next(events) == ('version', COPY[0])
+    assert service.limiter.concurrency._in_flight == 1
+
+    assert next(events)[0] == 'done'
+    assert service.limiter.concurrency._in_flight == 0
+    assert len(latencies) == 1 and latencies[0] is not None
+
+def test_closed_stream_releases_its_slot_without_a_latency(service, client, latencies):
+    client.models.responses = [COPY + COPY]
+
+    events = service.stream_property_content('P1', 'I1', ['short'])
+    next(events)
+    events.close()
+
+    assert service.limiter.concurrency._in_flight == 0
+    assert latencies == [None]
+
+def test_failed_save_is_not_cached(service, client, firebase, db, monkeypatch):
+    client.models.responses = [CAPTIONS, CAPTIONS]
+    update = firebase.update_image_ai_meta
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError('Firestore unavailable')
+    monkeypatch.setattr(firebase, 'update_image_ai_meta', unavailable)
+    with pytest.raises(RuntimeError):
+        service.analyze_property_image('P1', 'I1', ['short'])
+
+    monkeypatch.setattr(firebase, 'update_image_ai_meta', update)
+    assert service.analyze_property_image('P1', 'I1', ['short']) == CAPTIONS
+
+    assert client.models.calls == 2
+    assert len(_generations(db, 'properties/P1/images/I1')) == 1
+
+def test_identical_images_are_each_recorded(service, client, db):
+    client.models.responses = [CAPTIONS, CAPTIONS]
+    image_ref = db.collection('properties').document('P1').collection('images')
+    image_ref.document('I2').set(db.docs['properties/P1/images/I1'])
+
+    service.analyze_property_image('P1', 'I1', ['short'])
+    service.analyze_property_image('P1', 'I2', ['short'])
+
+    assert len(_generations(db, 'properties/P1/images/I1')) == 1
+    assert len(_generations(db, 'properties/P1/images/I2')) == 1
+
+def test_stream_whose_save_fails_is_not_cached(service, client, firebase, db, monkeypatch):
+    client.models.responses = [COPY, COPY]
+    update = firebase.update_property_ai_meta
+
+    def unavailable(**kwargs):
+        raise RuntimeError('Firestore unavailable')
+    monkeypatch.setattr(firebase, 'update_property_ai_meta', unavailable)
+    failed = list(service.stream_property_content('P1', 'I1', ['short']))
+    assert failed[-1] == ('error', {'message': 'Firestore unavailable'})
+
+    monkeypatch.setattr(firebase, 'update_property_ai_meta', update)
+    list(service.stream_property_content('P1', 'I1', ['short']))
+
+    assert client.models.calls == 2
+    assert len(_generations(db, 'properties/P1')) == 1
+
+def test_each_analysis_reads_firestore_once(service, client, db):
+    client.models.responses = [CAPTIONS, COPY, COPY]
+
+    for analyze in (
+        lambda: service.analyze_property_image('P1', 'I1', ['short']),
+        lambda: service.analyze_property_content('P1', 'I1', ['short'], bypass_cache=True),
+        lambda: list(service.stream_property_content('P1', 'I1', ['short'], bypass_cache=True)),
+    ):
+        db.reads = 0
+        analyze()
+        # The property and image come from one get_all; the ai_meta save reuses them
+        assert db.reads == 1
+
+    assert len(_generations(db, 'properties/P1/images/I1')) == 1
+    assert len(_generations(db, 'properties/P1')) == 2
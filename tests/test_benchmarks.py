@@ -0,0 +1,44 @@
+import copy
+
+from benchmarks.image_pipeline import DEFAULT_TOLERANCES, compare
+
+BASELINE = {
+    'photo': {
+        'decode_ms': 10.0,
+        'upload_ms': 1.0,
+        'total_ms': 100.0,
+        'bytes_out': 1000,
+        'peak_rss_mb': 20.0,
+        'renditions': {
+            'large': {
+                'resize_ms': 20.0,
+                'formats': {'jpeg': {'encode_ms': 10.0, 'bytes': 1000}},
+            },
+        },
+    },
+}
+
+def _result(**changes):
+    result = copy.deepcopy(BASELINE)
+    result['photo'].update(changes)
+    return result
+
+def test_timings_are_not_checked_by_default():
+    slower = _result(decode_ms=100.0, total_ms=1000.0)
+
+    assert compare(slower, BASELINE, DEFAULT_TOLERANCES) == []
+    assert len(compare(slower, BASELINE, DEFAULT_TOLERANCES, ['bytes', 'memory', 'time'])) == 2
+
+def test_byte_and_memory_regressions_fail_the_check():
+    bigger = _result(bytes_out=1100, peak_rss_mb=40.0)
+    bigger['photo']['renditions']['large']['formats']['jpeg']['bytes'] = 1049
+
+    regressions = compare(bigger, BASELINE, DEFAULT_TOLERANCES)
+    assert [line.split(':')[0] for line in regressions] == ['photo bytes_out', 'photo peak_rss_mb']
+
+def test_metrics_missing_from_the_baseline_are_skipped():
+    extra = _result()
+    extra['photo']['renditions']['large']['formats']['webp'] = {'encode_ms': 99.0, 'bytes': 999}
+
+    assert compare(extra, BASELINE, DEFAULT_TOLERANCES) == []
+    assert compare({'other': BASELINE['photo']}, BASELINE, DEFAULT_TOLERANCES) == []
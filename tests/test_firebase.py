@@ -0,0 +1,248 @@
+import time
+import types
+
+import pytest
+
+from app.services import firebase as firebase_module
+from app.services.data_pipeline import DataPipeline
+from app.services.firebase import FirebaseService, PropertyCache, SignedURLCache
+from benchmarks.fake_storage import FakeBucket
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(firebase_module, 'time',
+                        types.SimpleNamespace(monotonic=clock, perf_counter=time.perf_counter))
+    return clock
+
+@pytest.fixture
+def firebase(db, bucket):
+    db.collection('properties').document('P1').set({'title': 'Villa', 'price': 100})
+    return FirebaseService(db=db, bucket=bucket, property_cache=PropertyCache(ttl=60))
+
+def test_property_cache_entries_expire(clock):
+    cache = PropertyCache(ttl=60)
+    cache.put('P1', {'title': 'Villa'}, 1, cache.epoch)
+
+    clock.now += 59
+    assert cache.get('P1').data == {'title': 'Villa'}
+    clock.now += 2
+    assert cache.get('P1') is None
+    assert cache.stats.to_dict() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+def test_property_cache_evicts_least_recently_used(clock):
+    cache = PropertyCache(ttl=60, max_entries=2)
+    for property_id in ('P1', 'P2'):
+        cache.put(property_id, {}, 1, cache.epoch)
+    cache.get('P1')
+    cache.put('P3', {}, 1, cache.epoch)
+
+    assert [cache.get(p) is not None for p in ('P1', 'P2', 'P3')] == [True, False, True]
+
+def test_property_cache_keeps_the_newer_document(clock):
+    cache = PropertyCache(ttl=60)
+    cache.put('P1', {'price': 200}, 2, cache.epoch)
+    cache.put('P1', {'price': 100}, 1, cache.epoch)
+
+    assert cache.get('P1') == ({'price': 200}, 2)
+
+def test_read_started_before_an_invalidation_is_not_stored(clock):
+    cache = PropertyCache(ttl=60)
+    epoch = cache.epoch
+    cache.invalidate('P1')
+    cache.put('P1', {'price': 100}, 1, epoch)
+
+    assert cache.get('P1') is None
+
+def test_property_cache_returns_copies(clock):
+    cache = PropertyCache(ttl=60)
+    cache.put('P1', {'details': {'rooms': 3}}, 1, cache.epoch)
+    cache.get('P1').data['details']['rooms'] = 4
+
+    assert cache.get('P1').data == {'details': {'rooms': 3}}
+
+def test_get_property_is_served_from_the_cache(firebase, db, clock):
+    assert firebase.get_property('P1')['title'] == 'Villa'
+    reads = db.reads
+    assert firebase.get_property('P1')['title'] == 'Villa'
+    assert db.reads == reads
+
+def test_property_writes_invalidate_the_cache(firebase, db, clock):
+    firebase.get_property('P1')
+    firebase.create_or_update_property('P1', {'price': 150})
+
+    assert firebase.get_property('P1')['price'] == 150
+
+def test_upsert_keeps_the_feature_image(firebase, db, clock):
+    db.collection('properties').document('P1').set({'media': {'feature_image_id': 'I1'}}, merge=True)
+    pipeline = DataPipeline(firebase=firebase)
+
+    pipeline.process_property_data({'id': 'P1', 'title': 'Villa', 'price': '120', 'features': 'Pool'})
+
+    assert db.docs['properties/P1']['media'] == {'feature_image_id': 'I1'}
+    assert db.docs['properties/P1']['price'] == 120.0
+
+def test_signed_url_is_reused_until_the_margin_before_expiry(clock):
+    cache = SignedURLCache(margin=300)
+    cache.put('a.jpg', 'https://signed/a', clock.now + 3600)
+
+    clock.now += 3299
+    assert cache.get('a.jpg') == 'https://signed/a'
+    clock.now += 1
+    assert cache.get('a.jpg') is None
+
+def test_signed_url_cache_is_bounded(clock):
+    cache = SignedURLCache(max_entries=2)
+    for path in ('a', 'b', 'c'):
+        cache.put(path, f"https://signed/{path}", clock.now + 3600)
+
+    assert [cache.get(path) for path in ('a', 'b', 'c')] == [None, 'https://signed/b', 'https://signed/c']
+
+class SigningBucket(FakeBucket):
+    """Signs URLs by counting, so a new signature is visible"""
+
+    def __init__(self):
+        super().__init__('test-bucket')
+        self.signed = []
+
+    def blob(self, name, generation=None):
+        blob = super().blob(name, generation)
+        bucket = self
+
+        def generate_signed_url(**kwargs):
+            bucket.signed.append(name)
+            return f"https://signed/{name}?n={len(bucket.signed)}"
+        blob.generate_signed_url = generate_signed_url
+        return blob
+
+def _url(path):
+    return f"https://storage.googleapis.com/test.firebasestorage.app/{path}"
+
+def test_download_urls_are_signed_once_per_lifetime(db, clock):
+    bucket = SigningBucket()
+    firebase = FirebaseService(db=db, bucket=bucket)
+
+    first = firebase.get_image_download_url(_url('a.jpg'))
+    assert firebase.get_image_download_url(_url('a.jpg')) == first
+
+    clock.now += firebase_module.SIGNED_URL_EXPIRATION - firebase_module.SIGNED_URL_MARGIN
+    assert firebase.get_image_download_url(_url('a.jpg')) != first
+    assert bucket.signed == ['a.jpg', 'a.jpg']
+
+def test_bulk_signing_reuses_cached_urls(db, clock):
+    bucket = SigningBucket()
+    firebase = FirebaseService(db=db, bucket=bucket)
+    cached = firebase.get_image_download_url(_url('a.jpg'))
+
+    urls = firebase.get_image_download_urls([_url('a.jpg'), _url('b.jpg'), _url('b.jpg')])
+
+    assert urls[_url('a.jpg')] == cached
+    assert sorted(bucket.signed) == ['a.jpg', 'b.jpg']
+    assert list(urls) == [_url('a.jpg'), _url('b.jpg')]
+
+def _responses(n, version='v'):
+    return [{'version': f"{version}{i}", 'title': f"Title {i}"} for i in range(n)]
+
+def _history(db, path):
+    return {doc: data for doc, data in db.docs.items() if doc.startswith(f"{path}/ai_generations/")}
+
+def test_ai_meta_keeps_the_latest_generations_inline(firebase, db, monkeypatch):
+    monkeypatch.setattr(firebase_module, 'AI_META_INLINE_GENERATIONS', 2)
+    for n in range(3):
+        firebase.update_property_ai_meta('P1', 'I1', _responses(2, f"g{n}-"))
+
+    ai_meta = db.docs['properties/P1']['ai_meta']
+    assert [r['version'] for r in ai_meta['responses']] == ['g2-0', 'g2-1', 'g1-0', 'g1-1']
+    assert [g['count'] for g in ai_meta['generations']] == [2, 2]
+    assert ai_meta['generations'][0]['id'] == ai_meta['generation_id']
+    assert ai_meta['image_id'] == 'I1'
+    assert len(_history(db, 'properties/P1')) == 3
+
+def test_first_generation_archives_legacy_history(firebase, db):
+    legacy = _responses(5, 'old')
+    db.collection('properties').document('P1').update({
+        'ai_meta': {'last_generated': '2024-05-01T10:00:00', 'responses': legacy, 'reviewed': True}
+    })
+
+    firebase.update_property_ai_meta('P1', 'I1', _responses(1, 'new'))
+
+    ai_meta = db.docs['properties/P1']['ai_meta']
+    assert ai_meta['responses'] == _responses(1, 'new') + legacy
+    assert ai_meta['reviewed'] is True
+    archived, = [data for data in _history(db, 'properties/P1').values() if data.get('legacy')]
+    assert archived['responses'] == legacy
+    assert ai_meta['generations'][1]['count'] == 5
+
+def test_conflicting_ai_meta_write_is_retried(firebase, db):
+    property_ref = db.collection('properties').document('P1')
+    batch = db.batch
+
+    def concurrent_batch():
+        # Another generation lands between the read and this commit
+        db.batch = batch
+        property_ref.update({'ai_meta.generation_id': 'concurrent'})
+        return batch()
+    db.batch = concurrent_batch
+
+    firebase.update_property_ai_meta('P1', 'I1', _responses(1))
+
+    generation_id, = [path.rsplit('/', 1)[1] for path in _history(db, 'properties/P1')]
+    assert db.docs['properties/P1']['ai_meta']['generation_id'] == generation_id
+
+def test_ai_meta_write_reuses_the_state_read_by_the_caller(firebase, db):
+    current = firebase.get_property_context('P1', 'I1').property
+    db.reads = 0
+
+    firebase.update_property_ai_meta('P1', 'I1', _responses(1), current=current)
+
+    assert db.reads == 0
+    assert len(_history(db, 'properties/P1')) == 1
+
+def test_stale_state_is_read_again_after_the_conflict(firebase, db):
+    current = firebase.get_property_context('P1', 'I1').property
+    # Another worker records a generation after this one read the property
+    firebase.update_property_ai_meta('P1', 'I1', _responses(1, 'other'))
+    db.reads = 0
+
+    firebase.update_property_ai_meta('P1', 'I1', _responses(1, 'mine'), current=current)
+
+    assert db.reads == 1
+    ai_meta = db.docs['properties/P1']['ai_meta']
+    assert [r['version'] for r in ai_meta['responses']] == ['mine0', 'other0']
+    assert len(ai_meta['generations']) == 2
+
+def test_image_deleted_since_it_was_read_gets_no_history(firebase, db):
+    image_ref = db.collection('properties').document('P1').collection('images').document('I1')
+    image_ref.set({'title': 'Pool'})
+    current = firebase.get_property_context('P1', 'I1').image
+    image_ref.delete()
+
+    with pytest.raises(ValueError, match='Image not found: I1'):
+        firebase.update_image_ai_meta('P1', 'I1', _responses(1), current=current)
+    assert _history(db, 'properties/P1/images/I1') == {}
+
+def test_missing_image_gets_no_history(firebase, db):
+    with pytest.raises(ValueError, match='Image not found: I9'):
+        firebase.update_image_ai_meta('P1', 'I9', _responses(1))
+    assert _history(db, 'properties/P1/images/I9') == {}
+
+def test_archive_moves_legacy_history_of_every_document(firebase, db):
+    property_ref = db.collection('properties').document('P1')
+    property_ref.update({'ai_meta': {'responses': _responses(3)}})
+    property_ref.collection('images').document('I1').set({'ai_meta': {'responses': _responses(2)}})
+    property_ref.collection('images').document('I2').set({'title': 'No history'})
+
+    assert firebase.archive_ai_meta_history('P1') == 2
+    assert firebase.archive_ai_meta_history('P1') == 0
+
+    ai_meta = db.docs['properties/P1/images/I1']['ai_meta']
+    assert ai_meta['responses'] == _responses(2)
+    assert ai_meta['generations'] == [{'id': ai_meta['generation_id'], 'generated_at': None, 'count': 2}]
+    assert len(_history(db, 'properties/P1/images/I1')) == 1
@@ -0,0 +1,164 @@
+import threading
+import time
+
+import grpc
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from google.cloud.firestore_v1.types import BatchWriteResponse, WriteResult
+from google.rpc import status_pb2
+
+from app.services import firestore_batch
+from app.services.firestore_batch import BulkWriteResult, ChunkedWriteBatch, bulk_set, estimate_size
+
+def test_writes_fitting_one_batch_commit_once(db):
+    batch = ChunkedWriteBatch(db)
+    for i in range(500):
+        batch.set(db.collection('items').document(str(i)), {'n': i})
+
+    assert len(batch) == 500
+    batch.commit()
+    assert db.commits == [500]
+    assert len(db.docs) == 500
+
+def test_splits_at_the_write_limit(db):
+    batch = ChunkedWriteBatch(db, max_writes=3)
+    for i in range(7):
+        batch.set(db.collection('items').document(str(i)), {'n': i})
+    batch.update(db.collection('items').document('0'), {'n': 'updated'})
+    batch.commit()
+
+    assert db.commits == [3, 3, 2]
+    # Chunks are committed in order, so the update lands after the set
+    assert db.docs['items/0'] == {'n': 'updated'}
+
+def test_splits_at_the_byte_limit(db):
+    payload = {'text': 'x' * 1000}
+    size = estimate_size('items/0') + estimate_size(payload)
+    batch = ChunkedWriteBatch(db, max_bytes=size * 2)
+    for i in range(5):
+        batch.set(db.collection('items').document(str(i)), payload)
+    batch.commit()
+
+    assert db.commits == [2, 2, 1]
+
+def test_oversized_write_gets_its_own_batch(db):
+    batch = ChunkedWriteBatch(db, max_bytes=100)
+    batch.set(db.collection('items').document('big'), {'text': 'x' * 500})
+    batch.set(db.collection('items').document('small'), {'n': 1})
+    batch.commit()
+
+    assert db.commits == [1, 1]
+
+def test_commit_resets_the_batch(db):
+    batch = ChunkedWriteBatch(db, max_writes=2)
+    for i in range(3):
+        batch.delete(db.collection('items').document(str(i)))
+    batch.commit()
+    batch.commit()
+    batch.set(db.collection('items').document('a'), {})
+    batch.commit()
+
+    assert db.commits == [2, 1, 1]
+    assert len(batch) == 0
+
+def test_estimate_size():
+    assert estimate_size('abc') == 4
+    assert estimate_size({'a': 1, 'b': [True, None]}) == 2 + 8 + 2 + 2
+
+class FakeBatchWrite:
+    """Stands in for the batchWrite RPC: fails chosen documents, stores the rest"""
+
+    def __init__(self):
+        self.stored = {}
+        self.failures = {}
+        self.request_failures = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, writer, batch):
+        with self.lock:
+            if self.request_failures:
+                self.request_failures -= 1
+                raise ServiceUnavailable('batchWrite unavailable')
+            statuses = []
+            for reference in batch._document_references.values():
+                code = self.failures.get(reference.id, [0])
+                code = code.pop(0) if len(code) > 1 else code[0]
+                if code == 0:
+                    self.stored[reference.id] = self.stored.get(reference.id, 0) + 1
+                statuses.append(status_pb2.Status(code=code, message='rejected' if code else ''))
+        return BatchWriteResponse(write_results=[WriteResult() for _ in statuses], status=statuses)
+
+@pytest.fixture
+def batch_write(monkeypatch):
+    fake = FakeBatchWrite()
+    monkeypatch.setattr(firestore_batch.BulkWriter, '_send', lambda writer, batch: fake(writer, batch))
+    return fake
+
+@pytest.fixture
+def client():
+    # Only builds requests; every batchWrite goes to FakeBatchWrite
+    return firestore.Client(project='test', credentials=AnonymousCredentials())
+
+def test_bulk_writer_internals_are_still_there(client):
+    # _ReportingBulkWriter overrides or calls these; an upgrade that drops
+    # them must fail here rather than in production
+    for name in ('_send', '_schedule_ready_retries', '_enqueue_current_batch'):
+        assert callable(getattr(firestore_batch.BulkWriter, name, None)), name
+
+    writer = firestore_batch._ReportingBulkWriter(client)
+    try:
+        assert writer._operations == []
+    finally:
+        writer.close()
+
+def _writes(client, count, pulled=None):
+    for i in range(count):
+        if pulled is not None:
+            pulled.append(time.monotonic())
+        yield client.collection('items').document(str(i)), {'n': i}
+
+ABORTED = grpc.StatusCode.ABORTED.value[0]
+INVALID_ARGUMENT = grpc.StatusCode.INVALID_ARGUMENT.value[0]
+
+def test_bulk_set_reports_every_document(client, batch_write):
+    batch_write.failures = {'3': [INVALID_ARGUMENT]}
+
+    results = list(bulk_set(client, _writes(client, 45), initial_ops_per_second=5000))
+
+    assert sorted(int(result.document_id) for result in results) == list(range(45))
+    failed, = [result for result in results if not result.success]
+    assert failed == BulkWriteResult('3', False, 'INVALID_ARGUMENT: rejected')
+    assert len(batch_write.stored) == 44
+
+def test_failed_request_is_retried_per_document(client, batch_write, monkeypatch):
+    monkeypatch.setattr(firestore_batch, 'BULK_WRITE_IDLE_SEND', 0.05)
+    batch_write.request_failures = 1
+
+    results = list(bulk_set(client, _writes(client, 10), initial_ops_per_second=5000))
+
+    assert all(result.success for result in results)
+    assert batch_write.stored == {str(i): 1 for i in range(10)}
+
+def test_retries_give_up_after_max_attempts(client, batch_write, monkeypatch):
+    monkeypatch.setattr(firestore_batch, 'BULK_WRITE_IDLE_SEND', 0.05)
+    batch_write.failures = {'0': [ABORTED]}
+
+    results = list(bulk_set(client, _writes(client, 1), max_attempts=2))
+
+    assert results == [BulkWriteResult('0', False, 'ABORTED: rejected')]
+
+def test_retry_backoff_does_not_hold_up_the_input(client, batch_write, monkeypatch):
+    monkeypatch.setattr(firestore_batch, 'BULK_WRITE_IDLE_SEND', 0.05)
+    # Retried after a one second backoff
+    batch_write.failures = {'0': [ABORTED, 0]}
+    pulled = []
+    start = time.monotonic()
+
+    results = list(bulk_set(client, _writes(client, 25, pulled), max_pending=10,
+                            initial_ops_per_second=5000))
+
+    assert pulled[-1] - start < 0.5
+    assert results[-1] == BulkWriteResult('0', True)
+    assert batch_write.stored['0'] == 1
@@ -0,0 +1,122 @@
+import datetime
+import io
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app.services.image_jobs import ImageJobService
+from app.services.image_service import ImageService
+
+def _upload(name, color):
+    output = io.BytesIO()
+    Image.new('RGB', (1200, 900), color).save(output, format='JPEG')
+    output.seek(0)
+    return FileStorage(output, name, content_type='image/jpeg')
+
+class DeferredExecutor:
+    """Holds submitted jobs until the test runs them"""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, fn, *args):
+        self.calls.append((fn, args))
+
+    def run(self):
+        for fn, args in self.calls:
+            fn(*args)
+
+class RecordingJobRef:
+    """Job document reference that remembers every update"""
+
+    def __init__(self, reference, updates):
+        self.reference = reference
+        self.updates = updates
+
+    def __getattr__(self, name):
+        return getattr(self.reference, name)
+
+    def update(self, data, option=None):
+        self.updates.append(data)
+        self.reference.update(data, option)
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = DeferredExecutor()
+    monkeypatch.setattr(ImageJobService, '_get_executor', classmethod(lambda cls: executor))
+    return executor
+
+@pytest.fixture
+def updates():
+    return []
+
+@pytest.fixture
+def jobs(bucket, db, executor, updates, monkeypatch):
+    image_service = ImageService(bucket=bucket, db=db)
+    jobs = ImageJobService(image_service=image_service, db=db)
+    job_ref = jobs._job_ref
+    monkeypatch.setattr(jobs, '_job_ref', lambda *args: RecordingJobRef(job_ref(*args), updates))
+    return jobs
+
+def test_submitted_job_is_queued_until_a_worker_runs_it(jobs, executor):
+    job = jobs.submit('P1', [_upload('a.jpg', 'red'), _upload('b.jpg', 'blue')])
+
+    assert job['status'] == 'queued'
+    assert job['files'] == [
+        {'filename': 'a.jpg', 'status': 'queued'},
+        {'filename': 'b.jpg', 'status': 'queued'},
+    ]
+    assert jobs.get_job('P1', job['id'])['status'] == 'queued'
+    assert len(executor.calls) == 1
+
+def test_completed_job_lists_its_images(jobs, executor):
+    job = jobs.submit('P1', [_upload('a.jpg', 'red'), _upload('b.jpg', 'blue')])
+    executor.run()
+
+    stored = jobs.get_job('P1', job['id'])
+    assert stored['status'] == 'completed'
+    assert stored['completed'] == 2
+    assert [image['filename'] for image in stored['images']] == ['P1-01.jpg', 'P1-02.jpg']
+    assert stored['files'] == [
+        {'filename': 'a.jpg', 'status': 'completed', 'image_id': stored['images'][0]['id']},
+        {'filename': 'b.jpg', 'status': 'completed', 'image_id': stored['images'][1]['id']},
+    ]
+
+def test_progress_writes_one_file_entry_per_stage(jobs, executor, updates):
+    jobs.submit('P1', [_upload('a.jpg', 'red'), _upload('b.jpg', 'blue')])
+    executor.run()
+
+    processing, first, second, completed = updates
+    assert processing['status'] == 'processing'
+    assert set(first) == {'files.0', 'updated_at'}
+    assert first['files.0'] == {'filename': 'a.jpg', 'status': 'processed'}
+    assert set(second) == {'files.1', 'updated_at'}
+    assert completed['status'] == 'completed'
+
+def test_failed_job_marks_unfinished_files_failed(jobs, executor, db):
+    job = jobs.submit('P1', [_upload('a.jpg', 'red')])
+    db.fail_commits = True
+    executor.run()
+
+    stored = jobs.get_job('P1', job['id'])
+    assert stored['status'] == 'failed'
+    assert 'commit failed' in stored['error']
+    assert stored['files'] == [{'filename': 'a.jpg', 'status': 'failed'}]
+    assert stored['images'] == []
+
+def test_job_without_progress_is_reported_failed(jobs, executor, db):
+    job = jobs.submit('P1', [_upload('a.jpg', 'red')])
+    path = f"properties/P1/image_jobs/{job['id']}"
+    db.docs[path]['updated_at'] -= datetime.timedelta(seconds=ImageJobService.STALE_AFTER + 1)
+
+    stored = jobs.get_job('P1', job['id'])
+
+    assert stored['status'] == 'failed'
+    assert stored['error'] == "Job stopped reporting progress"
+    assert stored['files'] == [{'filename': 'a.jpg', 'status': 'failed'}]
+
+def test_job_without_files_is_rejected(jobs, executor):
+    with pytest.raises(ValueError, match='No valid files'):
+        jobs.submit('P1', [FileStorage(io.BytesIO(), '')])
+    assert executor.calls == []
@@ -0,0 +1,133 @@
+import io
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from app.services.image_renditions import (
+    InlineTranscoder,
+    ProcessPoolTranscoder,
+    RenditionEngine,
+    RenditionSpec,
+    center_crop,
+    crop_to_square,
+    fit_size,
+)
+
+SPECS = [
+    RenditionSpec('thumbnail', (150, 150), 70, 'thumbnails', square=True),
+    RenditionSpec('medium', (800, 600), 85, 'medium'),
+    RenditionSpec('large', (1600, 1200), 90, 'large'),
+]
+
+SOURCE_SIZES = [
+    (4032, 3024),   # 4:3 camera photo
+    (3024, 4032),   # portrait
+    (5000, 1200),   # panorama
+    (1000, 999),    # nearly square, smaller than the large rendition
+    (640, 480),     # smaller than every rendition but the thumbnail
+    (1601, 1201),   # just above the large bounds
+]
+
+def _jpeg(size):
+    # A gradient, so the encoder has something other than a flat colour
+    image = Image.radial_gradient('L').resize(size).convert('RGB')
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+def _legacy_size(data, spec):
+    """Size produced by the original per-rendition pipeline"""
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    if spec.square:
+        image = crop_to_square(image)
+    image.thumbnail(spec.size, Image.Resampling.LANCZOS)
+    if not spec.square:
+        image = center_crop(image, spec.size)
+    return image.size
+
+@pytest.mark.parametrize('size', SOURCE_SIZES)
+@pytest.mark.parametrize('bounds', [(150, 150), (800, 600), (1600, 1200), (333, 777)])
+def test_fit_size_matches_thumbnail(size, bounds):
+    image = Image.new('RGB', size)
+    image.thumbnail(bounds)
+    assert fit_size(size, bounds) == image.size
+
+@pytest.mark.parametrize('size', SOURCE_SIZES)
+def test_cascaded_renditions_keep_legacy_geometry(size):
+    data = _jpeg(size)
+    renditions = RenditionEngine(SPECS).render(data)
+
+    for spec in SPECS:
+        rendition = renditions[spec.key]['jpeg']
+        decoded = Image.open(io.BytesIO(rendition.data))
+        assert decoded.size == (rendition.width, rendition.height)
+        assert decoded.size == _legacy_size(data, spec)
+
+def test_renditions_ordered_largest_first_with_primary_format_first():
+    engine = RenditionEngine(SPECS, 'JPEG', ['webp', 'JPEG', 'BMP'])
+    renditions = engine.render(_jpeg((1200, 900)))
+
+    assert [spec.key for spec in engine.specs] == ['large', 'medium', 'thumbnail']
+    assert list(renditions) == ['large', 'medium', 'thumbnail']
+    # Unknown formats are skipped and the primary one is not repeated
+    assert engine.formats == ['JPEG', 'WEBP']
+    webp = renditions['medium']['webp']
+    assert Image.open(io.BytesIO(webp.data)).format == 'WEBP'
+    assert (webp.width, webp.height) == (renditions['medium']['jpeg'].width,
+                                         renditions['medium']['jpeg'].height)
+
+def test_render_records_stage_timings():
+    timings = {}
+    RenditionEngine(SPECS).render(_jpeg((800, 600)), timings)
+
+    assert 'decode' in timings
+    assert {'large.resize', 'medium.encode.jpeg', 'thumbnail.encode.jpeg'} <= set(timings)
+
+def test_render_wraps_decode_errors():
+    with pytest.raises(RuntimeError, match='Error processing image'):
+        RenditionEngine(SPECS).render(b'not an image')
+
+@pytest.fixture
+def process_pool():
+    yield
+    executor = ProcessPoolTranscoder._executor
+    if executor is not None:
+        ProcessPoolTranscoder._discard_executor(executor)
+
+def test_process_pool_yields_results_in_input_order(process_pool):
+    sizes = [(1200, 900), (300, 200), (900, 1200), (640, 480), (2000, 500)]
+    transcoder = ProcessPoolTranscoder(RenditionEngine(SPECS), max_workers=2)
+
+    sources = [_jpeg(size) for size in sizes]
+
+    renditions = list(transcoder.map(sources))
+
+    expected = list(InlineTranscoder(transcoder.engine).map(sources))
+    assert [r['large']['jpeg'].data for r in renditions] == [r['large']['jpeg'].data for r in expected]
+
+class BrokenExecutor:
+    """Fails every submission as a pool whose worker died would"""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+def test_broken_process_pool_is_discarded(monkeypatch):
+    broken = BrokenExecutor()
+    monkeypatch.setattr(ProcessPoolTranscoder, '_executor', broken)
+    transcoder = ProcessPoolTranscoder(RenditionEngine(SPECS), max_workers=1)
+
+    with pytest.raises(RuntimeError, match='worker crashed'):
+        list(transcoder.map([_jpeg((640, 480))]))
+
+    assert broken.shut_down
+    assert ProcessPoolTranscoder._executor is None
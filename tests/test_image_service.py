@@ -0,0 +1,165 @@
+import io
+
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+from app.services.firebase import FirebaseService
+from app.services.image_service import ImageService
+
+def _upload(name, color):
+    output = io.BytesIO()
+    Image.new('RGB', (1200, 900), color).save(output, format='JPEG')
+    output.seek(0)
+    return FileStorage(output, name, content_type='image/jpeg')
+
+@pytest.fixture
+def service(bucket, db):
+    return ImageService(bucket=bucket, db=db)
+
+def test_upload_stores_renditions_and_documents(service, bucket, db):
+    images = service.process_property_images('P1', [_upload('a.jpg', 'red'), _upload('b.jpg', 'blue')])
+
+    assert [image['filename'] for image in images] == ['P1-01.jpg', 'P1-02.jpg']
+    assert set(bucket.objects) >= {'properties/P1/large/P1-01.jpg', 'properties/P1/thumbnails/P1-02.webp'}
+    for image in images:
+        stored = db.docs[f"properties/P1/images/{image['id']}"]
+        assert stored['urls'] == image['urls']
+        assert stored['srcset']['jpeg']['large']['generation'] is not None
+    assert db.docs['properties/P1']['media']['feature_image_id'] == images[0]['id']
+    assert len(db.commits) == 1
+
+def test_failed_commit_deletes_uploaded_renditions(service, bucket, db):
+    db.fail_commits = True
+
+    with pytest.raises(RuntimeError, match='commit failed'):
+        service.process_property_images('P1', [_upload('a.jpg', 'red')])
+
+    assert bucket.objects == {}
+    assert not [path for path in db.docs if '/images/' in path or '/image_hashes/' in path]
+
+class RecordingImageSource:
+    def __init__(self):
+        self.remembered = {}
+
+    def remember(self, url, data, generation=None):
+        self.remembered[url] = (data, generation)
+
+def test_primary_renditions_are_remembered_as_they_upload(bucket, db):
+    source = RecordingImageSource()
+    service = ImageService(bucket=bucket, db=db, image_source=source)
+
+    image, = service.process_property_images('P1', [_upload('a.jpg', 'red')])
+
+    assert set(source.remembered) == set(image['urls'].values())
+    for size, url in image['urls'].items():
+        data, generation = source.remembered[url]
+        stored = bucket.objects[url.split('/test-bucket/', 1)[1]]
+        assert (data, generation) == (stored['data'], stored['generation'])
+        assert generation == image['srcset']['jpeg'][size]['generation']
+
+def test_featuring_the_first_image_invalidates_the_cached_property(bucket, db):
+    db.collection('properties').document('P1').set({'title': 'Villa'})
+    firebase = FirebaseService(db=db, bucket=bucket)
+    service = ImageService(bucket=bucket, db=db, firebase=firebase)
+    assert 'media' not in firebase.get_property('P1')
+
+    image, = service.process_property_images('P1', [_upload('a.jpg', 'red')])
+
+    assert firebase.get_property('P1')['media'] == {'feature_image_id': image['id']}
+
+def _image_docs(db, property_id):
+    prefix = f"properties/{property_id}/images/"
+    return {path[len(prefix):]: doc for path, doc in db.docs.items() if path.startswith(prefix)}
+
+def _next_number(db, property_id):
+    return db.docs[f"properties/{property_id}/counters/images"]['next_number']
+
+def test_reupload_returns_the_existing_image(service, db):
+    original, = service.process_property_images('P1', [_upload('a.jpg', 'red')])
+
+    duplicate, = service.process_property_images('P1', [_upload('copy.jpg', 'red')])
+
+    assert duplicate['id'] == original['id']
+    assert duplicate['duplicate'] is True
+    assert duplicate['filename'] == 'P1-01.jpg'
+    assert list(_image_docs(db, 'P1')) == [original['id']]
+    assert _next_number(db, 'P1') == 2
+
+def test_file_repeated_in_one_request_gets_one_document(service, db):
+    first, second = service.process_property_images(
+        'P1', [_upload('a.jpg', 'red'), _upload('again.jpg', 'red')]
+    )
+
+    assert first is second
+    assert list(_image_docs(db, 'P1')) == [first['id']]
+    assert _next_number(db, 'P1') == 2
+
+def test_global_duplicate_shares_the_stored_renditions(service, bucket, db):
+    service.DEDUP_SCOPE = 'global'
+    original, = service.process_property_images('P1', [_upload('a.jpg', 'red')])
+    stored_objects = set(bucket.objects)
+
+    copy, = service.process_property_images('P2', [_upload('b.jpg', 'red')])
+
+    assert copy['id'] != original['id']
+    assert copy['filename'] == 'P2-01.jpg'
+    assert copy['urls'] == original['urls']
+    assert copy['srcset'] == original['srcset']
+    assert copy['source'] == {'property_id': 'P1', 'image_id': original['id']}
+    assert set(_image_docs(db, 'P2')) == {copy['id']}
+    assert set(bucket.objects) == stored_objects
+    # The global index keeps pointing at the image that owns the renditions
+    assert db.docs[f"image_hashes/{original['content_hash']}"]['image_id'] == original['id']
+
+def test_hash_entry_of_a_deleted_image_is_ignored(service, db):
+    original, = service.process_property_images('P1', [_upload('a.jpg', 'red')])
+    del db.docs[f"properties/P1/images/{original['id']}"]
+
+    image, = service.process_property_images('P1', [_upload('a.jpg', 'red')])
+
+    assert image['id'] != original['id']
+    assert 'duplicate' not in image
+    assert image['filename'] == 'P1-02.jpg'
+    assert db.docs[f"properties/P1/image_hashes/{image['content_hash']}"]['image_id'] == image['id']
+    assert _next_number(db, 'P1') == 3
+
+def test_only_new_images_consume_numbers(service, db):
+    service.process_property_images('P1', [_upload('a.jpg', 'red')])
+
+    images = service.process_property_images(
+        'P1', [_upload('b.jpg', 'blue'), _upload('a.jpg', 'red'), _upload('c.jpg', 'green')]
+    )
+
+    assert [image['filename'] for image in images] == ['P1-02.jpg', 'P1-01.jpg', 'P1-03.jpg']
+    assert [image.get('duplicate', False) for image in images] == [False, True, False]
+    assert _next_number(db, 'P1') == 4
+
+def test_first_allocation_starts_after_existing_filenames(service, db):
+    images_ref = db.collection('properties').document('P1').collection('images')
+    images_ref.document('a').set({'filename': 'P1-01.jpg'})
+    images_ref.document('b').set({'filename': 'P1-07.jpg'})
+
+    assert service._allocate_image_numbers('P1', 2) == 8
+    assert _next_number(db, 'P1') == 10
+
+def test_later_allocations_read_the_counter(service, db):
+    counter_ref = db.collection('properties').document('P1').collection('counters').document('images')
+    counter_ref.set({'next_number': 20})
+    # Filenames are only consulted before the counter exists
+    db.collection('properties').document('P1').collection('images').document('a')\
+        .set({'filename': 'P1-45.jpg'})
+
+    assert service._allocate_image_numbers('P1', 3) == 20
+    assert service._allocate_image_numbers('P1', 1) == 23
+    assert _next_number(db, 'P1') == 24
+
+def test_upload_numbers_its_images_as_one_block(service, db):
+    images = service.process_property_images(
+        'P1', [_upload('a.jpg', 'red'), _upload('b.jpg', 'blue'), _upload('c.jpg', 'green')]
+    )
+    more, = service.process_property_images('P1', [_upload('d.jpg', 'white')])
+
+    assert [image['order'] for image in images + [more]] == [1, 2, 3, 4]
+    assert more['filename'] == 'P1-04.jpg'
+    assert _next_number(db, 'P1') == 5
@@ -0,0 +1,106 @@
+import os
+import time
+
+import pytest
+
+from app.services.disk_cache import CacheStats, DiskCache
+from app.services.image_source import DiskRenditionCache, ImageSource, MemoryRenditionCache
+
+def _age(cache, key, seconds):
+    """Move an entry's last use seconds into the past"""
+    past = time.time() - seconds
+    os.utime(cache._file(key), (past, past))
+
+def test_disk_cache_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    cache.put('a', b'alpha')
+
+    assert cache.get('a') == b'alpha'
+    assert cache.get('b') is None
+    assert cache.stats.to_dict() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    for i, key in enumerate(['old', 'used', 'new']):
+        cache.put(key, bytes(300))
+        _age(cache, key, 100 - i)
+    # A hit refreshes the entry's position
+    assert cache.get('used') is not None
+
+    cache.put('newest', bytes(300))
+    cache.prune()
+
+    assert cache.get('old') is None
+    assert [cache.get(key) is not None for key in ('used', 'new', 'newest')] == [True, True, True]
+
+def test_disk_cache_prunes_below_ninety_percent(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    for i in range(10):
+        cache.put(str(i), bytes(100))
+        _age(cache, str(i), 100 - i)
+    cache.put('10', bytes(100))
+    cache.prune()
+
+    remaining = [str(i) for i in range(11) if cache.get(str(i)) is not None]
+    assert remaining == [str(i) for i in range(2, 11)]
+
+def test_disk_cache_skips_values_over_the_limit(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10)
+    cache.put('big', bytes(11))
+    assert cache.get('big') is None
+
+def test_disk_cache_removes_stale_temporary_files(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000)
+    stale = tmp_path / f"{DiskCache.TEMP_PREFIX}crashed"
+    fresh = tmp_path / f"{DiskCache.TEMP_PREFIX}writing"
+    stale.write_bytes(b'x')
+    fresh.write_bytes(b'x')
+    past = time.time() - DiskCache.STALE_TEMP_SECONDS - 1
+    os.utime(stale, (past, past))
+
+    cache.prune()
+
+    assert not stale.exists()
+    assert fresh.exists()
+
+def test_memory_cache_evicts_by_bytes_in_lru_order():
+    cache = MemoryRenditionCache(max_bytes=10)
+    cache.put('a', 1, b'aaaa')
+    cache.put('b', 1, b'bbbb')
+    assert cache.get('a', 1) == b'aaaa'
+    cache.put('c', 1, b'cccc')
+
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) == b'aaaa'
+    assert cache.get('c', 1) == b'cccc'
+    # Generations are part of the key
+    assert cache.get('a', 2) is None
+
+def test_cache_stats_without_lookups():
+    assert CacheStats().to_dict() == {'hits': 0, 'misses': 0, 'hit_rate': None}
+
+@pytest.mark.parametrize('kind', ['memory', 'disk'])
+def test_image_source_reads_through_the_cache(kind, bucket, tmp_path):
+    cache = MemoryRenditionCache() if kind == 'memory' else DiskRenditionCache(str(tmp_path))
+    source = ImageSource(bucket, cache)
+    blob = bucket.blob('properties/P1/medium/P1-01.jpg')
+    blob.upload_from_string(b'v1', content_type='image/jpeg')
+
+    assert source.read(blob.public_url) == b'v1'
+    # Served from the cache: Storage no longer has the object
+    stored = bucket.objects.pop(blob.name)
+    assert source.read(blob.public_url, generation=blob.generation) == b'v1'
+
+    # A replaced object has a new generation and is read again
+    bucket.objects[blob.name] = stored
+    replacement = bucket.blob(blob.name)
+    replacement.upload_from_string(b'v2', content_type='image/jpeg')
+    assert source.read(blob.name) == b'v2'
+
+def test_remembered_uploads_skip_storage(bucket):
+    source = ImageSource(bucket, MemoryRenditionCache())
+    source.remember('https://storage.googleapis.com/test-bucket/a/1.jpg', b'bytes', 7)
+
+    assert source.read('a/1.jpg', generation=7) == b'bytes'
+    with pytest.raises(ValueError, match='not in bucket'):
+        source.read('https://storage.googleapis.com/other-bucket/a/1.jpg')
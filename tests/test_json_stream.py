@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from app.utils.json_stream import JSONArrayStream
+
+ITEMS = [{'version': 'a', 'title': 'One, "two"'}, {'version': 'b', 'title': '[three]'}]
+
+def _feed(text, size):
+    parser = JSONArrayStream()
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return parser, items
+
+@pytest.mark.parametrize('size', [1, 3, 16, 1000])
+def test_items_are_returned_as_they_complete(size):
+    parser, items = _feed(json.dumps(ITEMS, indent=2), size)
+
+    assert items == ITEMS
+    assert parser.finished
+
+def test_item_is_returned_before_the_array_ends():
+    parser = JSONArrayStream()
+    text = json.dumps(ITEMS)
+
+    assert parser.feed(text[:text.index('}') + 1]) == [ITEMS[0]]
+    assert not parser.finished
+
+def test_code_fence_is_skipped():
+    parser, items = _feed('```json\n' + json.dumps(ITEMS) + '\n```', 5)
+
+    assert items == ITEMS
+    assert parser.finished
+
+def test_truncated_array_is_not_finished():
+    parser, items = _feed(json.dumps(ITEMS)[:-1], 4)
+
+    assert items == ITEMS
+    assert not parser.finished
+
+def test_non_array_response_is_rejected():
+    with pytest.raises(ValueError, match='expected array'):
+        JSONArrayStream().feed('{"version": "a"}')
@@ -0,0 +1,86 @@
+import types
+
+import pytest
+
+from app.services.prompts import PROMPT_VERSIONS, PromptLibrary, TokenCounter, compact_json
+
+class FakeModels:
+    def __init__(self, tokens=None, error=None):
+        self.tokens = tokens
+        self.error = error
+        self.calls = 0
+
+    def count_tokens(self, model, contents):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return types.SimpleNamespace(total_tokens=self.tokens)
+
+def _counter(mode, **models):
+    return TokenCounter(types.SimpleNamespace(models=FakeModels(**models)), 'model', mode)
+
+def test_compact_json_has_no_whitespace_and_keeps_unicode():
+    assert compact_json({'town': 'Málaga', 'rooms': [1, 2]}) == '{"town":"Málaga","rooms":[1,2]}'
+
+def test_shipped_templates_load():
+    library = PromptLibrary()
+
+    assert set(library.templates) == set(PROMPT_VERSIONS)
+    assert library.version('image_caption') == f"image_caption.{PROMPT_VERSIONS['image_caption']}"
+
+def test_render_requires_every_placeholder(tmp_path):
+    (tmp_path / 'greeting.v2.txt').write_text('Hello $owner from $town\n')
+    library = PromptLibrary(str(tmp_path), {'greeting': 'v2'})
+
+    assert library.render('greeting', owner='Ana', town='Nerja') == 'Hello Ana from Nerja'
+    with pytest.raises(ValueError, match=r"greeting.v2 is missing values: \['town'\]"):
+        library.render('greeting', owner='Ana')
+
+def test_braced_and_escaped_placeholders(tmp_path):
+    (tmp_path / 'greeting.v1.txt').write_text('${owner}s pay $$5 in $town')
+    library = PromptLibrary(str(tmp_path), {'greeting': 'v1'})
+
+    assert library.templates['greeting'].fields == {'owner', 'town'}
+    assert library.render('greeting', owner='Ana', town='Nerja') == 'Anas pay $5 in Nerja'
+
+def test_missing_template_fails_at_load(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        PromptLibrary(str(tmp_path), {'greeting': 'v1'})
+
+def test_invalid_placeholder_fails_at_load(tmp_path):
+    (tmp_path / 'greeting.v1.txt').write_text('Costs $5')
+
+    with pytest.raises(ValueError, match='Invalid placeholder'):
+        PromptLibrary(str(tmp_path), {'greeting': 'v1'})
+
+def test_estimate_rounds_up_to_whole_tokens():
+    counter = _counter('estimate')
+
+    assert counter.count('abcde') == (2, 'estimate')
+    assert counter.client.models.calls == 0
+
+def test_counting_can_be_turned_off():
+    assert _counter('off').count('abcde') == (None, 'off')
+
+def test_api_counts_are_remembered_per_prompt():
+    counter = _counter('api', tokens=7)
+
+    assert counter.count('prompt') == (7, 'api')
+    assert counter.count('prompt') == (7, 'api')
+    assert counter.client.models.calls == 1
+
+def test_api_failure_falls_back_to_the_estimate():
+    counter = _counter('api', error=RuntimeError('unavailable'))
+
+    assert counter.count('abcdefgh') == (2, 'estimate')
+    # Failures are not remembered
+    counter.count('abcdefgh')
+    assert counter.client.models.calls == 2
+
+def test_remembered_counts_are_bounded(monkeypatch):
+    monkeypatch.setattr(TokenCounter, 'MAX_REMEMBERED', 2)
+    counter = _counter('api', tokens=3)
+    for text in ('a', 'b', 'c'):
+        counter.count(text)
+
+    assert list(counter._counts) == ['b', 'c']
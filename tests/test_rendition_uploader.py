@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from app.services.rendition_uploader import UploadBatch
+from benchmarks.fake_storage import FakeBlob, FakeBucket
+
+class FlakyBlob(FakeBlob):
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        if self.name in self.bucket.failing:
+            raise IOError('upload failed')
+        if self.bucket.gate is not None:
+            self.bucket.gate.wait(5)
+        super().upload_from_string(data, content_type=content_type, **kwargs)
+
+class FlakyBucket(FakeBucket):
+    """Uploads of the failing names raise; others wait for gate if set"""
+
+    def __init__(self, failing, gate=None):
+        super().__init__('test-bucket')
+        self.failing = set(failing)
+        self.gate = gate
+
+    def blob(self, name, generation=None):
+        blob = FlakyBlob(self, name)
+        blob.generation = generation
+        return blob
+
+def test_uploads_carry_metadata_and_generations(bucket):
+    with UploadBatch(bucket, max_workers=2) as uploads:
+        url = uploads.submit('a/1.jpg', b'one', content_type='image/jpeg',
+                             cache_control='public, max-age=60')
+        uploads.submit('a/2.webp', b'two', content_type='image/webp')
+        uploads.wait()
+
+    stored = bucket.objects['a/1.jpg']
+    assert stored['content_type'] == 'image/jpeg'
+    assert stored['cache_control'] == 'public, max-age=60'
+    assert bucket.objects['a/2.webp']['data'] == b'two'
+    assert url == bucket.blob('a/1.jpg').public_url
+    assert uploads.generations[url] == stored['generation']
+
+def test_failed_upload_rolls_back_the_batch():
+    bucket = FlakyBucket(['a/bad.jpg'])
+
+    with pytest.raises(IOError):
+        with UploadBatch(bucket, max_workers=2) as uploads:
+            for i in range(5):
+                uploads.submit(f'a/{i}.jpg', b'data', content_type='image/jpeg')
+            uploads.submit('a/bad.jpg', b'data', content_type='image/jpeg')
+            uploads.wait()
+
+    assert bucket.objects == {}
+
+def test_exception_in_the_block_rolls_back(bucket):
+    with pytest.raises(ValueError):
+        with UploadBatch(bucket) as uploads:
+            uploads.submit('a/1.jpg', b'data', content_type='image/jpeg')
+            uploads.wait()
+            assert 'a/1.jpg' in bucket.objects
+            raise ValueError('commit failed')
+
+    assert bucket.objects == {}
+
+def test_in_flight_uploads_are_deleted_too():
+    gate = threading.Event()
+    bucket = FlakyBucket(['a/bad.jpg'], gate)
+
+    with pytest.raises(IOError):
+        with UploadBatch(bucket, max_workers=4) as uploads:
+            uploads.submit('a/slow.jpg', b'data', content_type='image/jpeg')
+            uploads.submit('a/bad.jpg', b'data', content_type='image/jpeg')
+            # The slow upload lands while the batch is rolling back
+            threading.Timer(0.1, gate.set).start()
+            uploads.wait()
+
+    assert bucket.objects == {}
+
+def test_submit_after_a_failure_raises():
+    bucket = FlakyBucket(['a/bad.jpg'])
+
+    with UploadBatch(bucket, max_workers=1) as uploads:
+        uploads.submit('a/bad.jpg', b'data', content_type='image/jpeg')
+        with pytest.raises(IOError):
+            uploads.wait()
+        with pytest.raises(IOError):
+            uploads.submit('a/next.jpg', b'data', content_type='image/jpeg')
+
+    assert bucket.objects == {}
+
+def test_on_stored_runs_after_each_upload(bucket):
+    stored = []
+
+    def on_stored(url, data, generation):
+        assert bucket.objects[url.rsplit('test-bucket/', 1)[1]]['generation'] == generation
+        stored.append((url, data))
+
+    def broken(url, data, generation):
+        raise KeyError('cache is full')
+
+    with UploadBatch(bucket, max_workers=2) as uploads:
+        url = uploads.submit('a/1.jpg', b'one', content_type='image/jpeg', on_stored=on_stored)
+        uploads.submit('a/2.jpg', b'two', content_type='image/jpeg', on_stored=broken)
+        uploads.submit('a/3.webp', b'three', content_type='image/webp')
+        uploads.wait()
+
+    assert stored == [(url, b'one')]
+    # A failing callback does not fail the upload
+    assert set(bucket.objects) == {'a/1.jpg', 'a/2.jpg', 'a/3.webp'}
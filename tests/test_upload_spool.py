@@ -0,0 +1,100 @@
+import hashlib
+import io
+import os
+
+import pytest
+from flask import Flask, jsonify, request
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from app.services import upload_spool
+from app.services.upload_spool import SpoolFile, SpoolingRequest, UploadSpool
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_spool, 'SPOOL_DIR', str(tmp_path))
+    return tmp_path
+
+@pytest.fixture
+def app(spool_dir):
+    app = Flask(__name__)
+    app.request_class = SpoolingRequest
+    app.config['MAX_CONTENT_LENGTH'] = 64 * 1024
+    app.config['MAX_UPLOAD_FILE_SIZE'] = 10 * 1024
+    app.spooled = []
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        try:
+            files = request.files.getlist('files')
+        except RequestEntityTooLarge as e:
+            return jsonify({'error': e.description}), 413
+        with UploadSpool() as spool:
+            for file in files:
+                app.spooled.append((type(file.stream), spool.add(file, 10 * 1024)))
+            contents = [upload.read() for upload in spool.uploads]
+        return jsonify({'sizes': [len(data) for data in contents]})
+
+    return app
+
+def _files(spool_dir):
+    return sorted(str(path.relative_to(spool_dir)) for path in spool_dir.rglob('*') if path.is_file())
+
+def test_add_streams_file_and_hashes_it(spool_dir):
+    data = os.urandom(200 * 1024)
+    with UploadSpool() as spool:
+        upload = spool.add(FileStorage(io.BytesIO(data), 'a photo.jpg', content_type='image/jpeg'), len(data))
+
+        assert upload.size == len(data)
+        assert upload.content_hash == hashlib.sha256(data).hexdigest()
+        assert upload.read() == data
+        assert os.path.basename(upload.path) == '000-a_photo.jpg'
+        assert upload.content_type == 'image/jpeg'
+
+    assert _files(spool_dir) == []
+
+def test_add_rejects_oversized_file_and_removes_partial_copy(spool_dir):
+    with UploadSpool() as spool:
+        with pytest.raises(ValueError, match='exceeds maximum size'):
+            spool.add(FileStorage(io.BytesIO(b'x' * 1001), 'big.jpg'), 1000)
+        assert spool.uploads == []
+        assert os.listdir(spool.path) == []
+
+def test_spool_file_enforces_limit_while_writing(spool_dir):
+    stream = SpoolFile('big.jpg', 100)
+    stream.write(b'x' * 100)
+    with pytest.raises(RequestEntityTooLarge):
+        stream.write(b'x')
+    assert stream.closed
+    assert _files(spool_dir) == []
+
+def test_request_files_are_moved_into_the_spool(app, spool_dir):
+    data = os.urandom(8 * 1024)
+    response = app.test_client().post('/upload', data={
+        'files': [(io.BytesIO(data), 'one.jpg'), (io.BytesIO(b'two'), 'two.jpg')]
+    })
+
+    assert response.status_code == 200
+    assert response.get_json() == {'sizes': [len(data), 3]}
+    assert [stream for stream, _ in app.spooled] == [SpoolFile, SpoolFile]
+    assert app.spooled[0][1].content_hash == hashlib.sha256(data).hexdigest()
+    # Moved, then removed with the spool: nothing is left behind
+    assert _files(spool_dir) == []
+
+def test_oversized_part_is_rejected_while_parsing(app, spool_dir):
+    response = app.test_client().post('/upload', data={
+        'files': [(io.BytesIO(b'ok'), 'ok.jpg'), (io.BytesIO(b'x' * (10 * 1024 + 1)), 'big.jpg')]
+    })
+
+    assert response.status_code == 413
+    assert response.get_json() == {'error': 'File big.jpg exceeds maximum size'}
+    assert app.spooled == []
+    assert _files(spool_dir) == []
+
+def test_request_body_limit(app, spool_dir):
+    response = app.test_client().post('/upload', data={
+        'files': [(io.BytesIO(b'x' * 9 * 1024), f'{i}.jpg') for i in range(8)]
+    })
+
+    assert response.status_code == 413
+    assert _files(spool_dir) == []